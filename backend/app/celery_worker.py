@@ -1,16 +1,45 @@
 # backend/app/celery_worker.py
 
 from celery import Celery
+from celery.signals import after_setup_logger, worker_process_shutdown
+import asyncio
+import logging
 import smtplib
 from email.mime.text import MIMEText
+from typing import List
+from app import observability
 from app.config import settings # Import the application settings
+from app.services import smtp_pool
 
-# Configure Celery
+logger = logging.getLogger(__name__)
+
+# Configure Celery from the same Redis settings as the application's own client
 celery_app = Celery(
     "tasks",
-    broker="redis://localhost:6379/0",
-    backend="redis://localhost:6379/0"
+    broker=settings.CELERY_BROKER_URL or settings.REDIS_URL,
+    backend=settings.CELERY_RESULT_BACKEND or settings.REDIS_URL
 )
+# Producers (the API processes) reuse up to this many open broker connections instead of connecting per task.
+celery_app.conf.broker_pool_limit = settings.CELERY_PRODUCER_POOL_LIMIT
+
+def _build_reminder_message(recipient_email: str, task_content: str) -> MIMEText:
+    subject = f"Maya Reminder: {task_content}"
+    body = f"This is a friendly reminder for your scheduled task:\n\n'{task_content}'"
+    
+    msg = MIMEText(body)
+    msg['Subject'] = subject
+    msg['From'] = settings.MAIL_FROM
+    msg['To'] = recipient_email
+    return msg
+
+@after_setup_logger.connect
+def _configure_logging(**kwargs):
+    # Task logs use the API's format (JSON lines by default) rather than Celery's.
+    observability.configure_logging()
+
+@worker_process_shutdown.connect
+def _close_smtp_session(**kwargs):
+    smtp_pool.close_session()
 
 @celery_app.task(
     bind=True,
@@ -20,30 +49,68 @@ celery_app = Celery(
 )
 def send_reminder_email(self, recipient_email: str, task_content: str):
     """
-    A Celery task that sends a reminder email using a secure connection.
-    Includes automatic retries on failure and detailed terminal logging.
+    A Celery task that sends a reminder email over the worker's shared SMTP session.
+    Includes automatic retries on failure and structured logging of each attempt.
     """
-    # This print statement will appear as soon as the worker starts the task.
-    print(f"TASK RECEIVED: Attempting to send reminder for '{task_content}' to {recipient_email}")
-
-    subject = f"Maya Reminder: {task_content}"
-    body = f"This is a friendly reminder for your scheduled task:\n\n'{task_content}'"
-    
-    msg = MIMEText(body)
-    msg['Subject'] = subject
-    msg['From'] = settings.MAIL_FROM
-    msg['To'] = recipient_email
+    # Logged as soon as the worker starts the task.
+    logger.info("Sending reminder email", extra={"recipient": recipient_email, "task_content": task_content})
 
     try:
-        # Use a secure connection with SMTP_SSL for Gmail on port 465 for better reliability.
-        with smtplib.SMTP_SSL(settings.MAIL_SERVER, 465) as server:
-            server.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
-            server.send_message(msg)
+        # The session stays connected and logged in between tasks, so only the first email pays the handshake.
+        smtp_pool.get_session().send(_build_reminder_message(recipient_email, task_content))
         
-        # This print statement will appear in your Celery worker terminal upon success.
-        print(f"TASK SUCCEEDED: Reminder email sent to {recipient_email} for task: '{task_content}'")
+        # Logged once the mail server has accepted the email.
+        logger.info("Reminder email sent", extra={"recipient": recipient_email, "task_content": task_content})
         return f"Email sent to {recipient_email}"
     except Exception as e:
-        print(f"TASK FAILED: Could not send email. Error: {e}. Retrying if possible...")
+        logger.warning("Could not send reminder email, retrying if possible", extra={"recipient": recipient_email, "error": str(e)})
         # Re-raising the exception is what triggers Celery's automatic retry mechanism.
         raise self.retry(exc=e)
+
+@celery_app.task(bind=True, name="send_reminder_emails", ignore_result=True, max_retries=3)
+def send_reminder_emails(self, reminders: List[List[str]]):
+    """
+    Sends a batch of [recipient_email, task_content] reminders over one SMTP session, spacing
+    out emails to each recipient domain to MAIL_DOMAIN_MAX_PER_SECOND.
+    Rejected recipients are skipped; if the server is unreachable, the unsent rest is retried.
+    """
+    logger.info("Sending reminder emails", extra={"reminders": len(reminders)})
+    session = smtp_pool.get_session()
+    throttle = smtp_pool.DomainThrottle(settings.MAIL_DOMAIN_MAX_PER_SECOND)
+    pending = [tuple(reminder) for reminder in reminders]
+    sent = 0
+    for _, reminder in throttle.drain((smtp_pool.recipient_domain(reminder[0]), reminder) for reminder in pending):
+        recipient_email, task_content = reminder
+        try:
+            session.send(_build_reminder_message(recipient_email, task_content))
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as e:
+            # A problem with this one email; retrying it would fail the same way.
+            logger.warning("Reminder email was rejected", extra={"recipient": recipient_email, "error": str(e)})
+        except Exception as e:
+            logger.warning("Could not send reminder emails, retrying the unsent ones", extra={"unsent": len(pending), "error": str(e)})
+            raise self.retry(exc=e, args=[[list(r) for r in pending]], countdown=60)
+        else:
+            sent += 1
+        pending.remove(reminder)
+    logger.info("Reminder emails sent", extra={"sent": sent, "reminders": len(reminders)})
+
+# Each worker process runs async work on one long-lived event loop, so the Motor, Redis and
+# pooled provider clients (which bind to the loop they were first used on) stay usable across tasks.
+_worker_loop = None
+
+def _run_async(coro):
+    global _worker_loop
+    if _worker_loop is None:
+        _worker_loop = asyncio.new_event_loop()
+    return _worker_loop.run_until_complete(coro)
+
+@celery_app.task(name="refresh_conversation_summary", ignore_result=True)
+def refresh_conversation_summary(user_email: str):
+    """
+    Folds older chat messages into the user's rolling conversation summary.
+    Queued by the chat router every few messages so summarising never delays a reply.
+    """
+    # Imported here so the email-only worker path does not load the AI clients.
+    from app.services import context_builder
+    if _run_async(context_builder.refresh_summary(user_email)):
+        logger.info("Conversation summary refreshed", extra={"user_email": user_email})
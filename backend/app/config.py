@@ -12,6 +12,7 @@ class Settings(BaseSettings):
     GEMINI_API_KEYS: str
     COHERE_API_KEY: str
     ANTHROPIC_API_KEY: str
+    OPENAI_API_KEYS: str = ""
 
     # Email settings
     MAIL_USERNAME: str
@@ -22,6 +23,140 @@ class Settings(BaseSettings):
     MAIL_STARTTLS: bool
     MAIL_SSL_TLS: bool
 
+    # Observability: log format ("json" or "text") and level, Prometheus metrics on /metrics
+    LOG_FORMAT: str = "json"
+    LOG_LEVEL: str = "INFO"
+    METRICS_ENABLED: bool = True
+
+    # Redis: one connection pool per process, shared by the caches, rate limits, token store and scheduler
+    REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT_SECONDS: float = 5.0 # Commands wait this long for a free pooled connection
+    # Celery broker and result backend; REDIS_URL is used when left empty
+    CELERY_BROKER_URL: str = ""
+    CELERY_RESULT_BACKEND: str = ""
+    CELERY_PRODUCER_POOL_LIMIT: int = 10 # Broker connections kept open for publishing tasks
+    # Tasks queued by requests are published off the event loop, several per broker connection checkout
+    TASK_ENQUEUE_QUEUE_MAX: int = 10000
+    TASK_ENQUEUE_BATCH_SIZE: int = 100
+
+    # Reminder email delivery: one reused SMTP session per Celery worker process
+    SMTP_TIMEOUT_SECONDS: float = 30.0
+    SMTP_IDLE_CHECK_SECONDS: float = 30.0 # A session idle this long is checked with NOOP before use
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = 100
+    MAIL_DOMAIN_MAX_PER_SECOND: float = 5.0 # Batched sends to one recipient domain are spaced out to this rate
+    REMINDER_EMAIL_BATCH_SIZE: int = 100 # Due reminders per send_reminder_emails task
+
+    # Password hashing: bcrypt cost and the dedicated pool it runs on
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_MAX: int = 64 # Further logins are answered with 503 until the queue drains
+
+    # Login attempts allowed per account and per client IP within the window
+    LOGIN_RATE_LIMIT_PER_ACCOUNT: int = 10
+    LOGIN_RATE_LIMIT_PER_IP: int = 50
+    LOGIN_RATE_LIMIT_WINDOW_SECONDS: int = 300
+
+    # Verified access tokens are cached per process for at most this long (and never past their expiry)
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+
+    # Create the MongoDB indexes declared in database.INDEXES on startup
+    MONGO_ENSURE_INDEXES: bool = True
+    # Development only: explain() every find issued by the app and log collection scans
+    MONGO_QUERY_AUDIT: bool = False
+
+    # Chat logs are written behind the response in batches of up to CHAT_LOG_BATCH_SIZE records
+    CHAT_LOG_WRITE_BEHIND: bool = True
+    CHAT_LOG_BATCH_SIZE: int = 200
+    CHAT_LOG_FLUSH_INTERVAL_SECONDS: float = 0.25
+    CHAT_LOG_QUEUE_MAX: int = 10000 # Requests wait for room when this many records are pending
+
+    # Per-process cache of user profile facts; other processes invalidate it over Redis pub/sub
+    PROFILE_CACHE_TTL_SECONDS: int = 300
+    PROFILE_CACHE_MAX_ENTRIES: int = 10000
+
+    # Task reminders wait in a Redis sorted set; each API process polls for due ones and queues their emails
+    REMINDER_SCHEDULER_ENABLED: bool = True
+    REMINDER_POLL_INTERVAL_SECONDS: float = 1.0
+    REMINDER_BATCH_SIZE: int = 500
+
+    # Page sizes for the paginated list endpoints (overridable per request with `limit`)
+    HISTORY_PAGE_SIZE: int = 50
+    TASKS_PAGE_SIZE: int = 50
+    TASK_HISTORY_PAGE_SIZE: int = 10
+    PAGE_SIZE_MAX: int = 200
+
+    # Bulk task operations and NDJSON import/export
+    BULK_MAX_OPERATIONS: int = 500 # Operations accepted by one POST /chat/tasks/bulk
+    IMPORT_BATCH_SIZE: int = 500 # Imported lines written per bulk_write
+    EXPORT_BATCH_SIZE: int = 500 # Documents fetched per cursor batch while exporting
+
+    # NLU settings
+    # When enabled, general chat uses one structured LLM call for both the intent and the reply.
+    NLU_COMBINED_MODE: bool = True
+    # Local intent results below this confidence fall back to the LLM.
+    INTENT_CONFIDENCE_THRESHOLD: float = 0.8
+    # Optional path to a pickled scikit-style intent classifier.
+    INTENT_CLASSIFIER_PATH: str = ""
+
+    # Response cache settings
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_BACKEND: str = "memory" # "memory" (per process) or "redis" (shared by all workers)
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD: float = 0.92
+    # Optional local sentence-transformers model; the hashing vectorizer is used when empty.
+    RESPONSE_CACHE_EMBEDDING_MODEL: str = ""
+    # Chat replies depend on the conversation so far; enable to also reuse replies to similar messages.
+    RESPONSE_CACHE_CHAT_SEMANTIC: bool = False
+
+    # Request coalescing: identical in-flight prompts share one provider call
+    SINGLE_FLIGHT_ENABLED: bool = True
+    # A finished result also answers identical prompts arriving this long afterwards (e.g. client retries).
+    SINGLE_FLIGHT_WINDOW_SECONDS: float = 2.0
+    # Also coalesce across workers through a Redis lock and result key.
+    SINGLE_FLIGHT_DISTRIBUTED: bool = True
+    # Longest a leader may hold the Redis lock; waiters in other workers give up and call the provider after this.
+    SINGLE_FLIGHT_LOCK_SECONDS: float = 30.0
+    SINGLE_FLIGHT_POLL_SECONDS: float = 0.05
+
+    # Admission control: provider calls in flight per process, queued by priority, and per-user call rates
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_CONCURRENT: int = 32 # Further calls wait for a slot, interactive ones first
+    ADMISSION_QUEUE_MAX: int = 256 # Calls arriving while this many wait are rejected with 429
+    ADMISSION_INTERACTIVE_MAX_WAIT_SECONDS: float = 10.0 # Calls expected to wait longer are rejected up front
+    ADMISSION_BACKGROUND_MAX_WAIT_SECONDS: float = 60.0
+    ADMISSION_BACKGROUND_MAX_SHARE: float = 0.5 # Share of the slots background work (summaries) may hold
+    ADMISSION_USER_RATE_PER_MINUTE: int = 30 # LLM calls per user, shared by all workers; 0 disables
+    ADMISSION_USER_BURST: int = 10
+
+    # Provider dispatch settings
+    PROVIDER_TIMEOUT_SECONDS: float = 20.0
+    HEDGE_ENABLED: bool = True
+    HEDGE_DEFAULT_DELAY_SECONDS: float = 2.0 # Used until a provider has enough samples for a p95
+    HEDGE_MIN_DELAY_SECONDS: float = 0.5
+    HEDGE_MAX_DELAY_SECONDS: float = 5.0
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RESET_SECONDS: float = 30.0
+
+    # API key scheduling: per-key quotas (requests and tokens per minute) and cooldowns
+    GEMINI_KEY_RPM: int = 15
+    GEMINI_KEY_TPM: int = 1000000
+    OPENAI_KEY_RPM: int = 500
+    OPENAI_KEY_TPM: int = 200000
+    KEY_COOLDOWN_SECONDS: float = 60.0 # After a 429 / ResourceExhausted
+    KEY_ERROR_COOLDOWN_SECONDS: float = 10.0 # After any other error
+
+    # Context assembly: facts, summary and recent messages are packed into a token budget
+    CONTEXT_TOKEN_BUDGET: int = 1500
+    CONTEXT_FACTS_TOKEN_SHARE: float = 0.3 # Share of the budget reserved for user facts; unused tokens go to history
+    CONTEXT_MESSAGE_MAX_TOKENS: int = 300 # Longer messages are truncated
+    SUMMARY_ENABLED: bool = True
+    SUMMARY_REFRESH_EVERY_MESSAGES: int = 10 # A summary refresh is queued each time this many new messages arrive
+    SUMMARY_MAX_TOKENS: int = 250
+    SUMMARY_MAX_BATCH_MESSAGES: int = 200 # Most messages folded into the summary by one refresh
+
     model_config = SettingsConfigDict(env_file=".env")
 
 settings = Settings()
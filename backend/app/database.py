@@ -1,40 +1,95 @@
 # backend/app/database.py
 
-from pymongo import MongoClient
-from pymongo.collection import Collection
+import logging
+from typing import Dict, List
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from app import observability, query_audit
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Indexes for every query the routers and services run; each one filters by `email` first.
+# They are created on startup by `ensure_indexes`, which is a no-op for indexes that already exist.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "user_profiles": [
+        # Fact saves are a single upsert by email; unique so concurrent first saves cannot create two profiles.
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "tasks": [
+        # find({"email", "status"}).sort("created_at") for pending / done task lists, in either direction;
+        # _id breaks ties for keyset pagination.
+        IndexModel([("email", ASCENDING), ("status", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], name="email_status_created_at_id"),
+    ],
+    "chat_logs": [
+        # find({"email"}).sort("timestamp") for history pages, summaries and clearing a user's log.
+        IndexModel([("email", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)], name="email_timestamp_id"),
+    ],
+}
+
 class Database:
+    """
+    Async MongoDB access built on Motor, so queries never block the event loop.
+    The client is created lazily on first use, which keeps it bound to the
+    running loop instead of whichever loop happened to import this module.
+    """
     def __init__(self):
-        self.client = MongoClient(settings.DATABASE_URL)
-        self.db = self.client["assistant_db"] 
+        self._client = None
+
+    @property
+    def client(self) -> AsyncIOMotorClient:
+        if self._client is None:
+            self._client = AsyncIOMotorClient(settings.DATABASE_URL, event_listeners=query_audit.event_listeners() + observability.mongo_listeners())
+        return self._client
+
+    @property
+    def db(self):
+        return self.client["assistant_db"]
 
-    def get_user_collection(self) -> Collection:
+    def get_user_collection(self) -> AsyncIOMotorCollection:
         return self.db.users
-        
-    def get_user_profile_collection(self) -> Collection:
+
+    def get_user_profile_collection(self) -> AsyncIOMotorCollection:
         return self.db.user_profiles
 
-    def get_chat_log_collection(self) -> Collection:
+    def get_chat_log_collection(self) -> AsyncIOMotorCollection:
         """Returns a reference to the 'chat_logs' collection."""
         return self.db.chat_logs
 
-    def get_tasks_collection(self) -> Collection:
+    def get_tasks_collection(self) -> AsyncIOMotorCollection:
         """Returns a reference to the 'tasks' collection."""
         return self.db.tasks
 
+    async def ensure_indexes(self):
+        """Creates the declared indexes; run on startup. Conflicting existing indexes are reported, not dropped."""
+        for collection_name, indexes in INDEXES.items():
+            try:
+                await self.db[collection_name].create_indexes(indexes)
+            except OperationFailure as e:
+                logger.error("Could not create indexes", extra={"collection": collection_name, "error": str(e)})
+
+    def close(self):
+        """Closes the underlying client; called on application shutdown."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
 db_client = Database()
 
-def get_user_collection() -> Collection:
+def get_user_collection() -> AsyncIOMotorCollection:
     return db_client.get_user_collection()
 
-def get_user_profile_collection() -> Collection:
+def get_user_profile_collection() -> AsyncIOMotorCollection:
     return db_client.get_user_profile_collection()
 
-def get_chat_log_collection() -> Collection:
+def get_chat_log_collection() -> AsyncIOMotorCollection:
     """Dependency function for chat logs."""
     return db_client.get_chat_log_collection()
 
-def get_tasks_collection() -> Collection:
+def get_tasks_collection() -> AsyncIOMotorCollection:
     """Dependency function for tasks."""
     return db_client.get_tasks_collection()
@@ -1,10 +1,61 @@
 # backend/app/main.py
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from app import observability, security
+from app.config import settings
 from app.routers import auth, chat
+from app.database import db_client
+from app.services import (
+    admission, chat_log_writer, dispatcher, intent_engine, key_scheduler, pagination, profile_cache, provider_pool,
+    redis_cache, reminder_scheduler, response_cache, single_flight, task_queue,
+)
+
+observability.configure_logging()
+
+# The services' own counters, exported on /metrics next to the latency histograms.
+for _name, _source in {
+    "dispatcher": dispatcher.get_stats,
+    "key_scheduler": key_scheduler.get_stats,
+    "intent_engine": intent_engine.get_stats,
+    "response_cache": response_cache.get_stats,
+    "single_flight": single_flight.get_stats,
+    "admission": admission.get_stats,
+    "profile_cache": lambda: profile_cache.stats,
+    "auth": lambda: security.auth_stats,
+    "password_hasher": security.password_hasher.get_stats,
+    "chat_log_writer": lambda: chat_log_writer.writer.stats,
+    "task_enqueuer": lambda: task_queue.enqueuer.stats,
+    "reminder_scheduler": lambda: reminder_scheduler.stats,
+}.items():
+    observability.stats_collector.register(_name, _source)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Opens the shared async clients on startup and releases them on shutdown."""
+    await redis_cache.check_connection()
+    if settings.MONGO_ENSURE_INDEXES:
+        await db_client.ensure_indexes()
+    if settings.CHAT_LOG_WRITE_BEHIND:
+        chat_log_writer.writer.start()
+    task_queue.enqueuer.start()
+    profile_cache.start()
+    security.start_revocation_listener()
+    reminder_scheduler.start()
+    yield
+    await reminder_scheduler.close()
+    await security.stop_revocation_listener()
+    security.password_hasher.close()
+    await profile_cache.close()
+    await chat_log_writer.writer.close()
+    await task_queue.enqueuer.close()
+    await provider_pool.close()
+    await redis_cache.close()
+    db_client.close()
 
-app = FastAPI(title="Personal AI Assistant API")
+app = FastAPI(title="Personal AI Assistant API", lifespan=lifespan)
 
 # --- CORS Configuration ---
 # This is the crucial part to fix the "Network Error".
@@ -21,8 +72,22 @@ app.add_middleware(
     allow_credentials=True, # Allows cookies/tokens to be sent
     allow_methods=["*"],    # Allows all request methods (POST, GET, etc.)
     allow_headers=["*"],    # Allows all request headers
+    expose_headers=[pagination.BEFORE_CURSOR_HEADER, pagination.AFTER_CURSOR_HEADER], # Lets the frontend read page cursors
 )
 
+# Added last so it is the outermost middleware and times the whole request, CORS included.
+if settings.METRICS_ENABLED:
+    app.add_middleware(observability.MetricsMiddleware)
+
+
+@app.exception_handler(admission.Rejected)
+async def admission_rejected(request: Request, exc: admission.Rejected):
+    """LLM work shed by admission control is answered with 429 and when to retry, from whichever route it came."""
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 # Include the application routers
 app.include_router(auth.router)
@@ -32,3 +97,8 @@ app.include_router(chat.router)
 def read_root():
     """A simple endpoint to confirm the API is running."""
     return {"status": "API is running"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus metrics: request, stage, provider, Mongo and Redis latencies plus the services' counters."""
+    return Response(observability.render_metrics(), media_type=observability.METRICS_CONTENT_TYPE)
@@ -0,0 +1,227 @@
+# backend/app/observability.py
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import monitoring
+from app.config import settings
+
+# Metrics, spans and structured logs for the request pipeline.
+# Prometheus histograms record where a slow /chat/ request spent its time: per HTTP route, per
+# pipeline stage (spans), per LLM provider and key, per Mongo command and per Redis command.
+# Every log line carries the id of the request it belongs to, so a slow request found on /metrics
+# can be followed through the logs. With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR so
+# /metrics aggregates all of them.
+
+# --- Metrics ---
+# Latency buckets from 1ms to 30s: Redis calls sit at the low end, LLM calls at the high end.
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"], buckets=_BUCKETS)
+STAGE_LATENCY = Histogram("pipeline_stage_duration_seconds", "Latency of a pipeline stage (span)", ["stage"], buckets=_BUCKETS)
+PROVIDER_LATENCY = Histogram("llm_provider_duration_seconds", "LLM provider call latency by provider and API key index", ["provider", "key_index", "outcome"], buckets=_BUCKETS)
+MONGO_LATENCY = Histogram("mongo_command_duration_seconds", "MongoDB command latency", ["command", "collection"], buckets=_BUCKETS)
+REDIS_LATENCY = Histogram("redis_command_duration_seconds", "Redis command (or pipeline) latency", ["command"], buckets=_BUCKETS)
+LLM_FALLBACKS = Counter("llm_fallbacks_total", "Times a provider failed and the next provider was tried", ["provider"])
+NLU_PARSE_FAILURES = Counter("nlu_parse_failures_total", "LLM NLU responses that could not be parsed", ["mode"])
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by cache and result", ["cache", "result"])
+TASKS_ENQUEUED = Counter("celery_tasks_enqueued_total", "Celery tasks published to the broker", ["task"])
+COALESCED_REQUESTS = Counter("llm_coalesced_requests_total", "LLM calls answered by another caller's identical call", ["source"])
+COALESCED_GROUP_SIZE = Histogram("llm_coalesced_group_size", "Callers sharing one LLM call, the leader included", buckets=(1, 2, 3, 5, 10, 25, 50, 100))
+ADMISSION_DECISIONS = Counter("llm_admission_total", "Admission decisions for LLM calls by priority and outcome", ["priority", "outcome"])
+ADMISSION_WAIT = Histogram("llm_admission_wait_seconds", "Time queued LLM calls waited for a provider slot", ["priority"], buckets=_BUCKETS)
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+@contextmanager
+def span(stage: str, **fields):
+    """Times a pipeline stage into STAGE_LATENCY and logs it at DEBUG with the request id."""
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage).observe(duration)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("span", extra={"span": stage, "duration_ms": round(duration * 1000, 3), "error": error, **fields})
+
+@contextmanager
+def provider_call(provider: str, key_index=0):
+    """Times one LLM provider attempt into PROVIDER_LATENCY, labelled ok, error or cancelled (e.g. a losing hedge)."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except (asyncio.CancelledError, GeneratorExit):
+        outcome = "cancelled"
+        raise
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        PROVIDER_LATENCY.labels(provider, str(key_index), outcome).observe(time.perf_counter() - start)
+
+def cache_result(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+class StatsCollector:
+    """
+    Exposes the services' existing in-process stats dicts (key scheduler, dispatcher, caches, writers)
+    as gauges, e.g. maya_dispatcher_hedges_fired. Sources are read only when /metrics is scraped.
+    """
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], Dict]] = {}
+
+    def register(self, name: str, source: Callable[[], Dict]):
+        self._sources[name] = source
+
+    def collect(self):
+        for name, source in self._sources.items():
+            try:
+                values = source()
+            except Exception:
+                continue
+            for key, value in _flatten(values):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metric = GaugeMetricFamily(f"maya_{name}_{key}", f"{name} stat {key}")
+                    metric.add_metric([], value)
+                    yield metric
+
+def _flatten(values: Dict, prefix: str = ""):
+    for key, value in values.items():
+        name = f"{prefix}{key}".replace("-", "_").replace(".", "_")
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}_")
+        else:
+            yield name, value
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+def render_metrics() -> bytes:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# --- Mongo ---
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Records the latency of every command the driver sends, labelled by command and collection."""
+    def __init__(self):
+        self._started: Dict = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._started[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+    def _finish(self, event):
+        collection = self._started.pop((event.connection_id, event.request_id), "")
+        MONGO_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+def mongo_listeners() -> List[monitoring.CommandListener]:
+    return [MongoCommandMetrics()] if settings.METRICS_ENABLED else []
+
+# --- HTTP ---
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: gives each request an id (the caller's X-Request-ID, or a new one) for the logs
+    and the response header, and records its latency under the route template, not the raw path.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = dict(scope.get("headers", [])).get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            duration = time.perf_counter() - start
+            # FastAPI records the matched route in the scope; unmatched paths share one label.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(duration)
+            logger.info("request", extra={"method": scope["method"], "route": route, "status": status, "duration_ms": round(duration * 1000, 3)})
+            request_id_var.reset(token)
+
+# --- Logging ---
+
+# Attributes every LogRecord has; anything else was passed with `extra=` and becomes a field.
+_RECORD_ATTRIBUTES = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName"}
+
+def _fields(record: logging.LogRecord) -> Dict:
+    fields = {key: value for key, value in record.__dict__.items() if key not in _RECORD_ATTRIBUTES}
+    request_id = request_id_var.get()
+    if request_id:
+        fields["request_id"] = request_id
+    return fields
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _fields(record)
+        return line + ("  " + " ".join(f"{key}={value}" for key, value in fields.items()) if fields else "")
+
+def configure_logging():
+    """Sends the application's logs to stderr as JSON lines (LOG_FORMAT=json) or readable text."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+    app_logger = logging.getLogger("app")
+    app_logger.handlers[:] = [handler]
+    app_logger.setLevel(settings.LOG_LEVEL.upper())
+    app_logger.propagate = False
+
+logger = logging.getLogger(__name__)
@@ -0,0 +1,103 @@
+# backend/app/query_audit.py
+
+import logging
+import threading
+from typing import Dict, List, Optional, Set
+
+from pymongo import MongoClient, monitoring
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Development-time query plan checks.
+# `plan_stages` / `find_problems` inspect explain() output for collection scans and in-memory sorts.
+# With MONGO_QUERY_AUDIT enabled, `QueryAuditListener` is attached to the Motor client: every
+# distinct find/count/delete shape the app issues is explained once (on a separate synchronous
+# client, from the driver thread) and problems are logged and kept in `findings`.
+# Never enable it in production: each new query shape costs an extra explain round trip.
+
+# Stages that mean the query did not use an index for filtering or ordering.
+PROBLEM_STAGES = {"COLLSCAN": "collection scan", "SORT": "in-memory sort"}
+_AUDITED_COMMANDS = {"find", "count", "delete"}
+
+findings: List[Dict] = []
+
+def plan_stages(explain_output: Dict) -> Set[str]:
+    """Returns every stage name in the winning plan, for both classic and slot-based (SBE) plans."""
+    planner = explain_output.get("queryPlanner", {})
+    plan = planner.get("winningPlan", {})
+    plan = plan.get("queryPlan", plan)
+    stages, pending = set(), [plan]
+    while pending:
+        node = pending.pop()
+        if not isinstance(node, dict):
+            continue
+        if "stage" in node:
+            stages.add(node["stage"])
+        pending.extend(node.get("inputStages", []))
+        if "inputStage" in node:
+            pending.append(node["inputStage"])
+    return stages
+
+def find_problems(explain_output: Dict) -> List[str]:
+    stages = plan_stages(explain_output)
+    return [description for stage, description in PROBLEM_STAGES.items() if stage in stages]
+
+def _shape(value):
+    """Replaces the values of a filter with their type, so queries differing only in values match."""
+    if isinstance(value, dict):
+        return tuple((key, _shape(inner)) for key, inner in value.items())
+    if isinstance(value, list):
+        return tuple(_shape(inner) for inner in value)
+    return type(value).__name__
+
+class QueryAuditListener(monitoring.CommandListener):
+    def __init__(self, database_url: str):
+        self.database_url = database_url
+        self._client: Optional[MongoClient] = None
+        self._seen: Set = set()
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name not in _AUDITED_COMMANDS:
+            return
+        command = event.command
+        collection = command[event.command_name]
+        if event.command_name == "delete":
+            # Each delete statement carries its own filter.
+            statements = [{"filter": statement.get("q", {})} for statement in command.get("deletes", [])]
+        else:
+            statements = [{"filter": command.get("filter", command.get("query", {})), "sort": command.get("sort")}]
+        for statement in statements:
+            key = (event.database_name, collection, event.command_name, _shape(statement["filter"]), _shape(statement.get("sort") or {}))
+            with self._lock:
+                if key in self._seen:
+                    continue
+                self._seen.add(key)
+            self._audit(event.database_name, collection, statement["filter"], statement.get("sort"))
+
+    def _audit(self, database: str, collection: str, query: Dict, sort: Optional[Dict]):
+        try:
+            if self._client is None:
+                self._client = MongoClient(self.database_url)
+            cursor = self._client[database][collection].find(query)
+            if sort:
+                cursor = cursor.sort(list(sort.items()))
+            problems = find_problems(cursor.explain())
+        except Exception as e:
+            logger.warning("Query audit could not explain a query", extra={"collection": collection, "error": str(e)})
+            return
+        if problems:
+            finding = {"collection": collection, "filter": query, "sort": sort, "problems": problems}
+            findings.append(finding)
+            logger.warning("Query audit found a slow query plan", extra={"problems": problems, "collection": collection, "filter": query, "sort": sort})
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        pass
+
+def event_listeners() -> List[monitoring.CommandListener]:
+    """Listeners to attach to the Mongo client: the audit listener in development, none otherwise."""
+    return [QueryAuditListener(settings.DATABASE_URL)] if settings.MONGO_QUERY_AUDIT else []
@@ -1,17 +1,34 @@
 # backend/app/routers/auth.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordRequestForm
-from pymongo.collection import Collection
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from motor.motor_asyncio import AsyncIOMotorCollection as Collection
 from bson import ObjectId
 
 from app import models, security
+from app.config import settings
 from app.database import get_user_collection
+from app.services import rate_limit
 
 router = APIRouter(
     prefix="/auth",
     tags=["Authentication"]
 )
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+
+def _too_many_attempts(retry_after: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many login attempts, please try again later",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="The server is busy, please try again shortly",
+        headers={"Retry-After": "1"},
+    )
 
 @router.post("/register", response_model=models.UserPublic, status_code=status.HTTP_201_CREATED)
 async def register_user(
@@ -24,21 +41,24 @@ async def register_user(
     - Hashes the password.
     - Inserts the new user into the 'users' collection.
     """
-    existing_user = users.find_one({"email": user_in.email})
+    existing_user = await users.find_one({"email": user_in.email})
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered",
         )
     
-    hashed_password = security.get_password_hash(user_in.password)
+    try:
+        hashed_password = await security.hash_password(user_in.password)
+    except security.PasswordHasherBusy:
+        raise _hashing_busy()
     
     new_user_data = {
         "email": user_in.email,
         "hashed_password": hashed_password
     }
     
-    result = users.insert_one(new_user_data)
+    result = await users.insert_one(new_user_data)
     
     return {
         "id": str(result.inserted_id),
@@ -48,29 +68,70 @@ async def register_user(
 
 @router.post("/login", response_model=models.Token)
 async def login_for_access_token(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     users: Collection = Depends(get_user_collection)
 ):
     """
     Handles user login with a real database.
+    - Rejects the attempt with 429 once the client IP or the account is over its login rate limit.
     - Retrieves the user from the database.
-    - Verifies username (email) and password.
+    - Verifies username (email) and password on the password hashing pool.
     - Creates and returns new access and refresh tokens.
     """
-    user = users.find_one({"email": form_data.username})
-    if not user or not security.verify_password(form_data.password, user["hashed_password"]):
+    # Limits are checked before bcrypt runs, so floods of guesses cost one Redis round trip each.
+    window = settings.LOGIN_RATE_LIMIT_WINDOW_SECONDS
+    client_ip = request.client.host if request.client else "unknown"
+    allowed, retry_after = await rate_limit.hit("login-ip", client_ip, settings.LOGIN_RATE_LIMIT_PER_IP, window)
+    if allowed:
+        allowed, retry_after = await rate_limit.hit("login-account", form_data.username.lower(), settings.LOGIN_RATE_LIMIT_PER_ACCOUNT, window)
+    if not allowed:
+        raise _too_many_attempts(retry_after)
+
+    user = await users.find_one({"email": form_data.username})
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await security.check_password(form_data.password, user["hashed_password"])
+        except security.PasswordHasherBusy:
+            raise _hashing_busy()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # The stored hash predates the current BCRYPT_ROUNDS; upgrade it while the password is at hand.
+        await users.update_one({"_id": user["_id"]}, {"$set": {"hashed_password": new_hash}})
+    await rate_limit.reset("login-account", form_data.username.lower())
     
-    token_data = {"sub": user["email"]}
-    access_token = security.create_access_token(data=token_data)
-    refresh_token = security.create_refresh_token(data=token_data)
+    return await security.start_session(user["email"])
 
-    return {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
-        "token_type": "bearer",
-    }
+
+@router.post("/refresh", response_model=models.Token)
+async def refresh_access_token(body: models.TokenRefresh):
+    """
+    Exchanges a refresh token for a new access token and a new refresh token, without a password.
+    Each refresh token works once; presenting one that was already exchanged ends the session.
+    """
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired refresh token", headers={"WWW-Authenticate": "Bearer"})
+    return await security.refresh_session(body.refresh_token, credentials_exception)
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(everywhere: bool = False, token: str = Depends(oauth2_scheme)):
+    """
+    Ends the session of the presented access token (its refresh token stops working too), or with
+    `everywhere=true` every session of the user so far.
+    Revoked tokens are rejected by every worker immediately, not only once they expire.
+    """
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
+    token_data = await security.authenticate(token, credentials_exception)
+    if everywhere:
+        await security.revoke_all_tokens(token_data.username)
+        return
+    claims = security.decode_token(token, credentials_exception)
+    await security.revoke_token(token, claims)
+    if claims.get("fam"):
+        await security.end_session(claims["fam"])
@@ -1,17 +1,23 @@
 # backend/app/routers/chat.py
 
-from fastapi import APIRouter, Depends, status, Response
-from pydantic import BaseModel
-from pymongo.collection import Collection
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Response, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
+from motor.motor_asyncio import AsyncIOMotorCollection as Collection
 from bson import ObjectId, errors
-from app import security
-from app.services import ai_service, redis_cache, nlu
+from pymongo import ReturnDocument
+from app import observability, security
+from app.config import settings
+from app.services import admission, ai_service, chat_log_writer, context_builder, pagination, profile_cache, redis_cache, reminder_scheduler, task_bulk, task_queue, nlu
 from app.database import get_user_profile_collection, get_chat_log_collection, get_tasks_collection
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime
-from app.celery_worker import celery_app
 import dateparser
-from typing import Optional
+import json
+from contextlib import aclosing
+from collections import Counter
+from typing import List, Literal, Optional
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
@@ -27,98 +33,254 @@ class TaskCreate(BaseModel):
     content: str
     due_date: str
 
+class TaskOperation(BaseModel):
+    op: Literal["create", "update", "done", "delete"]
+    id: Optional[str] = None # Required for everything but create
+    content: Optional[str] = None
+    due_date: Optional[str] = None
+
+class TaskBulkRequest(BaseModel):
+    operations: List[TaskOperation] = Field(min_length=1, max_length=settings.BULK_MAX_OPERATIONS)
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
-    from fastapi import HTTPException
     credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
-    return security.verify_token(token, credentials_exception)
+    return await security.authenticate(token, credentials_exception)
 
-@router.post("/")
-async def handle_chat_message(
-    chat_message: ChatMessage, 
-    current_user: security.TokenData = Depends(get_current_user),
-    user_profiles: Collection = Depends(get_user_profile_collection),
-    chat_logs: Collection = Depends(get_chat_log_collection),
-    tasks: Collection = Depends(get_tasks_collection)
-):
-    # ... (This logic is unchanged)
-    user_email = current_user.username
-    user_message = chat_message.message
-    ai_response = ""
-    nlu_result = nlu.get_structured_intent(user_message)
+async def _load_chat_context(user_email: str, user_profiles: Collection):
+    """Returns the user's facts and conversation (summary plus recent messages), packed into the prompt token budget."""
+    with observability.span("context"):
+        return await context_builder.build_context(user_email, user_profiles)
+
+def _build_chat_prompt(user_facts: str, history_formatted: str, user_message: str) -> str:
+    return f"""You are a helpful and friendly personal assistant named Maya. <user_facts>{user_facts if user_facts else "You do not yet know any facts about the user."}</user_facts> <conversation_history>{history_formatted if history_formatted else "This is the beginning of the conversation."}</conversation_history> Based on all the information above, respond to the user's message. User Message: "{user_message}" Your Response:"""
+
+async def _sync_reminder(task: dict) -> bool:
+    """Schedules, moves or cancels a task's reminder to match the task as stored. Returns True if one is scheduled."""
+    due_date = task_bulk.reminder_due(task)
+    if due_date:
+        await reminder_scheduler.schedule(str(task["_id"]), task["email"], task["content"], due_date)
+        return True
+    await reminder_scheduler.cancel(str(task["_id"]))
+    return False
+
+async def _handle_action(nlu_result: dict, user_email: str, user_profiles: Collection, tasks: Collection) -> Optional[str]:
+    """Carries out a task/fact action and returns the reply, or None when the message is general chat."""
     action = nlu_result.get("action")
     if action == "create_task":
         task_data = nlu_result.get("data", {})
         task_title = task_data.get("title")
         task_datetime_str = task_data.get("datetime")
         if not task_title or not task_datetime_str:
-            ai_response = "I'm sorry, I couldn't understand all the details for that task. Could you please try rephrasing it?"
-        else:
-            due_date = dateparser.parse(task_datetime_str)
-            if due_date:
-                formatted_due_date = due_date.strftime('%Y-%m-%d %H:%M')
-                tasks.insert_one({"email": user_email, "content": task_title, "due_date_str": formatted_due_date, "status": "pending", "created_at": datetime.utcnow()})
-                delay = (due_date - datetime.now()).total_seconds()
-                if delay > 0:
-                    celery_app.send_task("send_reminder_email", args=[user_email, task_title], countdown=delay)
-                    ai_response = f"Okay, I've scheduled it: '{task_title}' for {formatted_due_date}. I will send you an email reminder then."
-                else:
-                    ai_response = f"Okay, I've scheduled it: '{task_title}' for {formatted_due_date}. Since that time is in the past, I won't send an email reminder."
-            else:
-                ai_response = f"Okay, I've scheduled the task '{task_title}', but I couldn't set an email reminder due to an issue with the date format."
-    elif action == "fetch_tasks":
+            return "I'm sorry, I couldn't understand all the details for that task. Could you please try rephrasing it?"
+        due_date = dateparser.parse(task_datetime_str)
+        if not due_date:
+            return f"Okay, I've scheduled the task '{task_title}', but I couldn't set an email reminder due to an issue with the date format."
+        formatted_due_date = due_date.strftime('%Y-%m-%d %H:%M')
+        result = await tasks.insert_one({"email": user_email, "content": task_title, "due_date_str": formatted_due_date, "status": "pending", "created_at": datetime.utcnow()})
+        if due_date > datetime.now():
+            await reminder_scheduler.schedule(str(result.inserted_id), user_email, task_title, due_date)
+            return f"Okay, I've scheduled it: '{task_title}' for {formatted_due_date}. I will send you an email reminder then."
+        return f"Okay, I've scheduled it: '{task_title}' for {formatted_due_date}. Since that time is in the past, I won't send an email reminder."
+    if action == "fetch_tasks":
         task_cursor = tasks.find({"email": user_email, "status": "pending"}).sort("created_at", 1)
-        task_list = [f"- {t['content']} (Due: {t['due_date_str']})" for t in task_cursor]
-        ai_response = "Here are your upcoming tasks:\n" + "\n".join(task_list) if task_list else "You have no pending tasks."
-    elif action == "save_fact":
+        task_list = [f"- {t['content']} (Due: {t['due_date_str']})" async for t in task_cursor]
+        return "Here are your upcoming tasks:\n" + "\n".join(task_list) if task_list else "You have no pending tasks."
+    if action == "save_fact":
         fact_data = nlu_result.get("data", {})
         fact_key = fact_data.get("key", "").lower().replace("_", " ")
         fact_value = fact_data.get("value")
-        if fact_key and fact_value:
-            user_profiles.update_one({"email": user_email, "facts.key": fact_key}, {"$set": {"facts.$.value": fact_value}}, upsert=False)
-            if user_profiles.find_one({"email": user_email, "facts.key": fact_key}) is None:
-                 user_profiles.update_one({"email": user_email}, {"$push": {"facts": {"key": fact_key, "value": fact_value}}, "$setOnInsert": {"email": user_email}}, upsert=True)
-            ai_response = f"Got it. I'll remember that your {fact_key} is {fact_value}."
-        else:
-            ai_response = "I couldn't quite understand that fact. Could you try rephrasing?"
-    else:
-        profile = user_profiles.find_one({"email": user_email})
-        user_facts = "\n".join([f"- {fact['key']}: {fact['value']}" for fact in profile.get("facts", [])]) if profile else ""
-        conversation_history = redis_cache.get_conversation_context(user_email)
-        history_formatted = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history])
-        prompt = f"""You are a helpful and friendly personal assistant named Maya. <user_facts>{user_facts if user_facts else "You do not yet know any facts about the user."}</user_facts> <conversation_history>{history_formatted if history_formatted else "This is the beginning of the conversation."}</conversation_history> Based on all the information above, respond to the user's message. User Message: "{user_message}" Your Response:"""
-        ai_response = ai_service.generate_ai_response(prompt=prompt)
-    chat_logs.insert_one({"email": user_email, "sender": "user", "text": user_message, "timestamp": datetime.utcnow()})
-    chat_logs.insert_one({"email": user_email, "sender": "assistant", "text": ai_response, "timestamp": datetime.utcnow()})
-    redis_cache.set_conversation_context(user_email, {"role": "user", "content": user_message})
-    redis_cache.set_conversation_context(user_email, {"role": "assistant", "content": ai_response})
+        if not fact_key or not fact_value:
+            return "I couldn't quite understand that fact. Could you try rephrasing?"
+        await profile_cache.save_fact(user_email, fact_key, fact_value, user_profiles)
+        return f"Got it. I'll remember that your {fact_key} is {fact_value}."
+    return None
+
+async def _persist_turn(user_email: str, user_message: str, ai_response: str, chat_logs: Collection):
+    """Writes both sides of a finished turn to the chat log and the Redis conversation context."""
+    with observability.span("persist"):
+        # Queued for the batched writer; both records get ordered timestamps now, at the end of the turn.
+        await chat_log_writer.writer.write(
+            {"email": user_email, "sender": "user", "text": user_message},
+            {"email": user_email, "sender": "assistant", "text": ai_response},
+            chat_logs=chat_logs,
+        )
+        message_count = await redis_cache.append_conversation_context(user_email, {"role": "user", "content": user_message}, {"role": "assistant", "content": ai_response})
+        if context_builder.summary_due(message_count, 2):
+            # Summarising costs an LLM call, so it happens in the worker rather than before the reply.
+            await task_queue.enqueuer.enqueue("refresh_conversation_summary", [user_email])
+
+@router.post("/")
+async def handle_chat_message(
+    chat_message: ChatMessage, 
+    current_user: security.TokenData = Depends(get_current_user),
+    user_profiles: Collection = Depends(get_user_profile_collection),
+    chat_logs: Collection = Depends(get_chat_log_collection),
+    tasks: Collection = Depends(get_tasks_collection)
+):
+    user_email = current_user.username
+    user_message = chat_message.message
+    chat_context = None
+    nlu_result = nlu.quick_intent(user_message)
+    if nlu_result is None and settings.NLU_COMBINED_MODE:
+        # One LLM call classifies the message and, for general chat, also writes the reply.
+        chat_context = await _load_chat_context(user_email, user_profiles)
+        nlu_result = await nlu.get_intent_and_reply(user_message, *chat_context, cache_scope=user_email, user=user_email)
+    elif nlu_result is None:
+        nlu_result = await nlu.get_structured_intent(user_message, user=user_email)
+    with observability.span("action", action=nlu_result.get("action")):
+        ai_response = await _handle_action(nlu_result, user_email, user_profiles, tasks)
+    if ai_response is None and nlu_result.get("reply"):
+        ai_response = nlu_result["reply"]
+    elif ai_response is None:
+        user_facts, history_formatted = chat_context or await _load_chat_context(user_email, user_profiles)
+        with observability.span("reply"):
+            ai_response = await ai_service.generate_ai_response(
+                prompt=_build_chat_prompt(user_facts, history_formatted, user_message),
+                cache_namespace="chat",
+                cache_scope=user_email,
+                cache_text=user_message if settings.RESPONSE_CACHE_CHAT_SEMANTIC else None,
+                user=user_email,
+            )
+    await _persist_turn(user_email, user_message, ai_response, chat_logs)
     return {"response": ai_response}
 
+def _sse_event(payload: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+@router.post("/stream")
+async def stream_chat_message(
+    chat_message: ChatMessage,
+    request: Request,
+    current_user: security.TokenData = Depends(get_current_user),
+    user_profiles: Collection = Depends(get_user_profile_collection),
+    chat_logs: Collection = Depends(get_chat_log_collection),
+    tasks: Collection = Depends(get_tasks_collection)
+):
+    """
+    Streaming variant of POST /chat/ using Server-Sent Events.
+    Each `data:` event carries a {"token": ...} chunk; a final `done` event carries the full response.
+    The turn is persisted only once the stream completes, and a client disconnect closes the
+    upstream provider stream so no further tokens are generated.
+    """
+    user_email = current_user.username
+    user_message = chat_message.message
+    # The combined intent+reply call returns JSON, which cannot be streamed, so intent is resolved on its own.
+    nlu_result = nlu.quick_intent(user_message) or await nlu.get_structured_intent(user_message, user=user_email)
+    with observability.span("action", action=nlu_result.get("action")):
+        action_response = await _handle_action(nlu_result, user_email, user_profiles, tasks)
+    # The provider slot is taken before the response starts, so a shed request still gets a 429.
+    slot = await admission.admit(user_email) if action_response is None else None
+
+    # Async, so the BackgroundTask below releases on the event loop rather than in a thread.
+    async def release_slot():
+        if slot:
+            slot.release()
+
+    async def event_stream():
+        if action_response is not None:
+            ai_response = action_response
+            yield _sse_event({"token": ai_response})
+        else:
+            tokens = []
+            try:
+                user_facts, history_formatted = await _load_chat_context(user_email, user_profiles)
+                prompt = _build_chat_prompt(user_facts, history_formatted, user_message)
+                async with aclosing(ai_service.stream_ai_response(
+                    prompt,
+                    cache_namespace="chat",
+                    cache_scope=user_email,
+                    cache_text=user_message if settings.RESPONSE_CACHE_CHAT_SEMANTIC else None,
+                )) as token_stream:
+                    async for token in token_stream:
+                        if await request.is_disconnected():
+                            # Leaving the block closes the provider stream; nothing is persisted.
+                            return
+                        tokens.append(token)
+                        yield _sse_event({"token": token})
+            finally:
+                await release_slot()
+            ai_response = "".join(tokens)
+        await _persist_turn(user_email, user_message, ai_response, chat_logs)
+        yield _sse_event({"response": ai_response}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also releases the slot when the client went away before the stream started.
+        background=BackgroundTask(release_slot),
+    )
+
+def _page_params(default_size: int):
+    """Query parameters shared by the paginated list endpoints."""
+    def params(
+        limit: int = Query(default_size, ge=1, le=settings.PAGE_SIZE_MAX),
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ):
+        return {"limit": limit, "before": before, "after": after}
+    return params
+
+async def _fetch_page(response: Response, collection: Collection, query: dict, field: str, page: dict, projection: dict, newest_first: bool = False):
+    """Fetches one keyset page and returns the cursors for the neighbouring pages in response headers."""
+    try:
+        documents, before_cursor, after_cursor = await pagination.fetch_page(collection, query, field, projection=projection, newest_first=newest_first, **page)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if before_cursor:
+        response.headers[pagination.BEFORE_CURSOR_HEADER] = before_cursor
+    if after_cursor:
+        response.headers[pagination.AFTER_CURSOR_HEADER] = after_cursor
+    return documents
+
+_TASK_PROJECTION = {"content": 1, "due_date_str": 1, "created_at": 1}
+
 @router.get("/history")
-async def get_chat_history(current_user: security.TokenData = Depends(get_current_user), chat_logs: Collection = Depends(get_chat_log_collection)):
+async def get_chat_history(
+    response: Response,
+    page: dict = Depends(_page_params(settings.HISTORY_PAGE_SIZE)),
+    current_user: security.TokenData = Depends(get_current_user),
+    chat_logs: Collection = Depends(get_chat_log_collection)
+):
+    """
+    Returns the most recent messages, oldest first. Pass the X-Before-Cursor header value as
+    `before` to load older messages, or X-After-Cursor as `after` to fetch newer ones.
+    """
     user_email = current_user.username
-    history_cursor = chat_logs.find({"email": user_email}).sort("timestamp", 1).limit(50)
-    history = [{"sender": msg["sender"], "text": msg["text"]} for msg in history_cursor]
-    return history
+    messages = await _fetch_page(response, chat_logs, {"email": user_email}, "timestamp", page, {"sender": 1, "text": 1, "timestamp": 1})
+    return [{"sender": msg["sender"], "text": msg["text"]} for msg in messages]
 
 @router.get("/tasks")
-async def get_tasks(current_user: security.TokenData = Depends(get_current_user), tasks: Collection = Depends(get_tasks_collection)):
+async def get_tasks(
+    response: Response,
+    page: dict = Depends(_page_params(settings.TASKS_PAGE_SIZE)),
+    current_user: security.TokenData = Depends(get_current_user),
+    tasks: Collection = Depends(get_tasks_collection)
+):
+    """Returns pending tasks, newest first; `before` pages towards older tasks."""
     user_email = current_user.username
-    task_cursor = tasks.find({"email": user_email, "status": "pending"}).sort("created_at", -1)
-    task_list = [{"id": str(task["_id"]), "content": task.get("content"), "due_date": task.get("due_date_str")} for task in task_cursor]
-    return task_list
+    task_docs = await _fetch_page(response, tasks, {"email": user_email, "status": "pending"}, "created_at", page, _TASK_PROJECTION, newest_first=True)
+    return [{"id": str(task["_id"]), "content": task.get("content"), "due_date": task.get("due_date_str")} for task in task_docs]
 
 @router.get("/tasks/history")
-async def get_task_history(current_user: security.TokenData = Depends(get_current_user), tasks: Collection = Depends(get_tasks_collection)):
+async def get_task_history(
+    response: Response,
+    page: dict = Depends(_page_params(settings.TASK_HISTORY_PAGE_SIZE)),
+    current_user: security.TokenData = Depends(get_current_user),
+    tasks: Collection = Depends(get_tasks_collection)
+):
+    """Returns completed tasks, newest first; `before` pages towards older tasks."""
     user_email = current_user.username
-    task_cursor = tasks.find({"email": user_email, "status": "done"}).sort("created_at", -1).limit(10)
-    task_list = [{"id": str(task["_id"]), "content": task.get("content"), "due_date": task.get("due_date_str")} for task in task_cursor]
-    return task_list
+    task_docs = await _fetch_page(response, tasks, {"email": user_email, "status": "done"}, "created_at", page, _TASK_PROJECTION, newest_first=True)
+    return [{"id": str(task["_id"]), "content": task.get("content"), "due_date": task.get("due_date_str")} for task in task_docs]
 
 @router.post("/tasks")
 async def create_task(task_create: TaskCreate, current_user: security.TokenData = Depends(get_current_user), tasks: Collection = Depends(get_tasks_collection)):
     user_email = current_user.username
     new_task = {"email": user_email, "content": task_create.content, "due_date_str": task_create.due_date, "status": "pending", "created_at": datetime.utcnow()}
-    result = tasks.insert_one(new_task)
+    result = await tasks.insert_one(new_task)
+    await _sync_reminder(new_task)
     return {"status": "success", "message": "Task created.", "task_id": str(result.inserted_id)}
 
 @router.put("/tasks/{task_id}")
@@ -140,12 +302,16 @@ async def update_task(
         raise HTTPException(status_code=400, detail="No update data provided.")
 
     try:
-        result = tasks.update_one(
+        task = await tasks.find_one_and_update(
             {"_id": ObjectId(task_id), "email": user_email},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection={"email": 1, "content": 1, "due_date_str": 1, "status": 1},
+            return_document=ReturnDocument.AFTER,
         )
-        if result.matched_count == 0:
+        if task is None:
             raise HTTPException(status_code=404, detail="Task not found.")
+        # A new due date moves the reminder and new content changes its text.
+        await _sync_reminder(task)
         return {"status": "success"}
     except errors.InvalidId:
         raise HTTPException(status_code=400, detail="Invalid task ID.")
@@ -154,17 +320,58 @@ async def update_task(
 async def mark_task_as_done(task_id: str, current_user: security.TokenData = Depends(get_current_user), tasks: Collection = Depends(get_tasks_collection)):
     user_email = current_user.username
     try:
-        result = tasks.update_one({"_id": ObjectId(task_id), "email": user_email}, {"$set": {"status": "done"}})
+        result = await tasks.update_one({"_id": ObjectId(task_id), "email": user_email}, {"$set": {"status": "done"}})
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Task not found.")
+        await reminder_scheduler.cancel(task_id)
         return {"status": "success"}
     except errors.InvalidId:
         raise HTTPException(status_code=400, detail="Invalid task ID.")
 
+@router.post("/tasks/bulk")
+async def bulk_task_operations(request_body: TaskBulkRequest, current_user: security.TokenData = Depends(get_current_user), tasks: Collection = Depends(get_tasks_collection)):
+    """
+    Creates, updates, completes and deletes many tasks in one call, with one bulk_write and one
+    reminder update for all of them. Every operation gets its own result, in request order; a
+    failed operation does not stop the others, and each task may appear only once per call.
+    """
+    results = await task_bulk.apply([operation.model_dump() for operation in request_body.operations], current_user.username, tasks)
+    return {"results": results, "summary": dict(Counter(result["status"] for result in results))}
+
+def _ndjson_download(lines, filename: str) -> StreamingResponse:
+    return StreamingResponse(lines, media_type="application/x-ndjson", headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@router.get("/tasks/export")
+async def export_tasks(current_user: security.TokenData = Depends(get_current_user), tasks: Collection = Depends(get_tasks_collection)):
+    """Streams all of the user's tasks, pending and done, as NDJSON (one JSON object per line)."""
+    return _ndjson_download(task_bulk.export_tasks(current_user.username, tasks), "tasks.ndjson")
+
+@router.post("/tasks/import")
+async def import_tasks(request: Request, current_user: security.TokenData = Depends(get_current_user), tasks: Collection = Depends(get_tasks_collection)):
+    """
+    Creates tasks from an NDJSON request body in the export format and schedules their reminders.
+    The body is read and written in batches as it arrives; lines that cannot be imported are
+    reported by line number and skipped.
+    """
+    return await task_bulk.import_tasks(request.stream(), current_user.username, tasks)
+
+@router.get("/history/export")
+async def export_chat_history(current_user: security.TokenData = Depends(get_current_user), chat_logs: Collection = Depends(get_chat_log_collection)):
+    """Streams the user's whole chat log, oldest first, as NDJSON."""
+    # Messages still queued for the batched writer would be missing from the export.
+    await chat_log_writer.writer.flush()
+    return _ndjson_download(task_bulk.export_chat_logs(current_user.username, chat_logs), "chat_history.ndjson")
+
+@router.post("/history/import")
+async def import_chat_history(request: Request, current_user: security.TokenData = Depends(get_current_user), chat_logs: Collection = Depends(get_chat_log_collection)):
+    """Adds messages from an NDJSON request body in the export format to the user's chat log."""
+    return await task_bulk.import_chat_logs(request.stream(), current_user.username, chat_logs)
+
 @router.delete("/history/clear")
 async def clear_chat_history(current_user: security.TokenData = Depends(get_current_user), chat_logs: Collection = Depends(get_chat_log_collection)):
     user_email = current_user.username
-    result = chat_logs.delete_many({"email": user_email})
-    if redis_cache.redis_client:
-        redis_cache.redis_client.delete(user_email)
+    # Queued records would otherwise be written after the delete and reappear.
+    await chat_log_writer.writer.flush()
+    result = await chat_logs.delete_many({"email": user_email})
+    await redis_cache.clear_conversation_context(user_email)
     return {"status": "success", "message": f"Deleted {result.deleted_count} messages."}
@@ -1,14 +1,27 @@
 # backend/app/security.py
 
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, Optional, Tuple
+from app import observability
 from app.config import settings # Import the settings object
+from app.database import get_user_collection
+from app.services import redis_cache
+
+logger = logging.getLogger(__name__)
 
 # --- Password Hashing ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with a different BCRYPT_ROUNDS are reported by verify_and_update and re-hashed on login.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -16,30 +29,337 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+class PasswordHasherBusy(Exception):
+    """Raised when PASSWORD_HASH_QUEUE_MAX hashing jobs are already waiting."""
+
+class PasswordHasher:
+    """
+    Runs bcrypt (100-300ms of CPU per call) on a dedicated, size-limited thread pool instead of the
+    event loop; bcrypt releases the GIL while hashing, so chat requests keep being served.
+    Jobs beyond the pool size queue up to PASSWORD_HASH_QUEUE_MAX, after which callers are turned away.
+    """
+    def __init__(self, workers: int, queue_max: int):
+        self.workers = workers
+        self.queue_max = queue_max
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.in_flight = 0 # Jobs running or waiting for a pool thread
+        self.stats = {"jobs": 0, "rejected": 0, "max_queue_depth": 0, "wait_seconds_total": 0.0, "run_seconds_total": 0.0}
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.in_flight - self.workers, 0)
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "in_flight": self.in_flight, "queue_depth": self.queue_depth, "workers": self.workers}
+
+    async def run(self, func, *args):
+        if self.queue_depth >= self.queue_max:
+            self.stats["rejected"] += 1
+            raise PasswordHasherBusy()
+        self.in_flight += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue_depth)
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self.stats["wait_seconds_total"] += started - submitted
+                self.stats["run_seconds_total"] += time.perf_counter() - started
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self.in_flight -= 1
+            self.stats["jobs"] += 1
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_MAX)
+
+async def hash_password(password: str) -> str:
+    """Async get_password_hash, run on the password hashing pool."""
+    return await password_hasher.run(pwd_context.hash, password)
+
+async def check_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Async password check on the hashing pool. Returns (valid, new_hash), where new_hash is set
+    when the stored hash uses outdated settings (e.g. a changed BCRYPT_ROUNDS) and should be saved.
+    """
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
 # --- JWT Token Handling ---
 class TokenData(BaseModel):
     username: Optional[str] = None
 
-def create_access_token(data: dict) -> str:
+def _issue_token(data: dict, token_type: str, lifetime: timedelta) -> str:
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    # `jti` identifies the token on the denylist; `iat` lets "log out everywhere" revoke older tokens.
+    # `iat` keeps sub-second precision so a login right after such a revocation is not caught by it.
+    to_encode.update({"exp": now + lifetime, "iat": now.timestamp(), "type": token_type})
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def create_access_token(data: dict) -> str:
+    return _issue_token(data, "access", timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES))
+
 def create_refresh_token(data: dict) -> str:
-    to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
+    return _issue_token(data, "refresh", timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS))
 
-def verify_token(token: str, credentials_exception) -> TokenData:
+def decode_token(token: str, credentials_exception, token_type: str = "access") -> Dict:
+    """Verifies the signature and expiry and returns the claims. Tokens issued before `type` existed count as access tokens."""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        return TokenData(username=username)
     except JWTError:
         raise credentials_exception
+    if payload.get("sub") is None or payload.get("type", "access") != token_type:
+        raise credentials_exception
+    return payload
+
+def verify_token(token: str, credentials_exception) -> TokenData:
+    return TokenData(username=decode_token(token, credentials_exception)["sub"])
+
+# --- Authenticated user resolution ---
+# Verified access tokens are kept in a bounded LRU keyed by a hash of the token, so repeat requests
+# skip the JWT decode, the denylist lookup and the user lookup. An entry lives until the token's
+# `exp` or AUTH_CACHE_TTL_SECONDS, whichever is sooner. Revocations are written to Redis
+# (O(1) key lookups on a cache miss) and broadcast over pub/sub so every process evicts the token.
+
+DENYLIST_PREFIX = "auth:denied"
+REVOKED_BEFORE_PREFIX = "auth:revoked-before"
+FAMILY_PREFIX = "auth:family"
+REVOCATION_CHANNEL = "auth-revoke"
+
+_verified: "OrderedDict[str, Tuple[float, TokenData, Dict]]" = OrderedDict()
+_revocation_listener: Optional[asyncio.Task] = None
+auth_stats = {"cache_hits": 0, "cache_misses": 0, "rejected": 0, "revoked": 0, "refreshed": 0, "refresh_reused": 0}
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def _is_revoked(claims: Dict) -> bool:
+    """
+    One MGET: the token's own denylist entry, the user's "revoked before" cut-off and, for tokens
+    issued with a session family, whether that family still exists.
+    """
+    if not redis_cache.redis_client:
+        return False
+    keys = [f"{DENYLIST_PREFIX}:{claims.get('jti')}", f"{REVOKED_BEFORE_PREFIX}:{claims['sub']}"]
+    if claims.get("fam"):
+        keys.append(f"{FAMILY_PREFIX}:{claims['fam']}")
+    denied, revoked_before, *family = await redis_cache.redis_client.mget(*keys)
+    if denied and claims.get("jti"):
+        return True
+    if family and family[0] is None:
+        # The session was logged out or its refresh token was reused.
+        return True
+    return bool(revoked_before) and claims.get("iat", 0) < float(revoked_before)
+
+async def authenticate(token: str, credentials_exception, token_type: str = "access") -> TokenData:
+    """
+    Resolves a bearer token to its user: valid signature and expiry, right token type, not revoked,
+    and the user still exists. Successful access-token checks are cached.
+    """
+    key = _token_key(token)
+    entry = _verified.get(key) if token_type == "access" else None
+    if entry is not None:
+        if entry[0] > time.time():
+            _verified.move_to_end(key)
+            auth_stats["cache_hits"] += 1
+            observability.cache_result("auth", True)
+            return entry[1]
+        del _verified[key]
+    auth_stats["cache_misses"] += 1
+    observability.cache_result("auth", False)
+    claims = decode_token(token, credentials_exception, token_type)
+    try:
+        revoked = await _is_revoked(claims)
+    except Exception as e:
+        # Rejecting every request while Redis is down would take the whole API down with it.
+        logger.warning("Could not check token revocation in Redis, allowing the token", extra={"error": str(e)})
+        revoked = False
+    if revoked or await get_user_collection().find_one({"email": claims["sub"]}, {"_id": 1}) is None:
+        auth_stats["rejected"] += 1
+        raise credentials_exception
+    token_data = TokenData(username=claims["sub"])
+    if token_type == "access":
+        _verified[key] = (min(claims["exp"], time.time() + settings.AUTH_CACHE_TTL_SECONDS), token_data, claims)
+        while len(_verified) > settings.AUTH_CACHE_MAX_ENTRIES:
+            _verified.popitem(last=False)
+    return token_data
+
+def _evict(token_key: Optional[str] = None, username: Optional[str] = None, family: Optional[str] = None):
+    if token_key:
+        _verified.pop(token_key, None)
+    if username:
+        for key in [key for key, (_, token_data, _) in _verified.items() if token_data.username == username]:
+            del _verified[key]
+    if family:
+        for key in [key for key, (_, _, claims) in _verified.items() if claims.get("fam") == family]:
+            del _verified[key]
+
+async def revoke_token(token: str, claims: Dict):
+    """Denylists one token until it would have expired anyway."""
+    auth_stats["revoked"] += 1
+    key = _token_key(token)
+    _evict(token_key=key)
+    if not redis_cache.redis_client or not claims.get("jti"):
+        return
+    ttl = max(int(claims["exp"] - time.time()), 1)
+    await redis_cache.redis_client.set(f"{DENYLIST_PREFIX}:{claims['jti']}", 1, ex=ttl)
+    await redis_cache.redis_client.publish(REVOCATION_CHANNEL, f"token:{key}")
+
+async def revoke_all_tokens(username: str):
+    """Revokes every token issued to the user so far, e.g. "log out everywhere" or a password change."""
+    auth_stats["revoked"] += 1
+    _evict(username=username)
+    if not redis_cache.redis_client:
+        return
+    # No token issued before now can outlive the longest token lifetime.
+    ttl = int(timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS).total_seconds())
+    await redis_cache.redis_client.set(f"{REVOKED_BEFORE_PREFIX}:{username}", time.time(), ex=ttl)
+    await redis_cache.redis_client.publish(REVOCATION_CHANNEL, f"user:{username}")
+
+# --- Refresh sessions ---
+# Every login starts a token family: one Redis key, auth:family:<id>, holding the jti of the only
+# refresh token of that family that may still be used, with the refresh lifetime as its TTL.
+# Access and refresh tokens carry the family id in `fam`. Refreshing swaps in a new jti in one
+# atomic script call, so renewing a session costs one round trip and no bcrypt. Presenting a refresh
+# token that was already rotated means it was copied: the whole family is ended, which also
+# rejects every access token issued to it.
+
+# KEYS: the family key, the user's "revoked before" key. ARGV: presented jti, new jti, presented iat, TTL.
+_ROTATE_SCRIPT = """
+local revoked_before = tonumber(redis.call('GET', KEYS[2]))
+if revoked_before and tonumber(ARGV[3]) < revoked_before then
+    redis.call('DEL', KEYS[1])
+    return 'revoked'
+end
+local current = redis.call('GET', KEYS[1])
+if not current then
+    return 'unknown'
+end
+if current ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 'reused'
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[4])
+return 'rotated'
+"""
+_rotate_script = None
+_rotate_script_client = None
+
+def _refresh_ttl() -> int:
+    return int(timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS).total_seconds())
+
+def _token_pair(username: str, family: Optional[str], refresh_jti: str) -> Dict:
+    data = {"sub": username, **({"fam": family} if family else {})}
+    return {
+        "access_token": create_access_token(data),
+        "refresh_token": create_refresh_token({**data, "jti": refresh_jti}),
+        "token_type": "bearer",
+    }
+
+async def start_session(username: str) -> Dict:
+    """Issues the access and refresh tokens of a new token family, e.g. on login."""
+    family, refresh_jti = uuid.uuid4().hex, uuid.uuid4().hex
+    try:
+        if not redis_cache.redis_client:
+            raise RuntimeError("Redis is not connected")
+        await redis_cache.redis_client.set(f"{FAMILY_PREFIX}:{family}", refresh_jti, ex=_refresh_ttl())
+    except Exception as e:
+        # Without the family record the tokens still work; refreshing them starts a family later.
+        logger.warning("Could not store the refresh token family, issuing tokens without one", extra={"error": str(e)})
+        family = None
+    return _token_pair(username, family, refresh_jti)
+
+async def refresh_session(refresh_token: str, credentials_exception) -> Dict:
+    """
+    Exchanges a refresh token for a new access and refresh token of the same family.
+    The presented refresh token cannot be used again; reusing it ends the family.
+    """
+    global _rotate_script, _rotate_script_client
+    claims = decode_token(refresh_token, credentials_exception, token_type="refresh")
+    family = claims.get("fam")
+    client = redis_cache.redis_client
+    if not family or not client:
+        # Tokens issued before families existed (or while Redis was away) take the full check once,
+        # are made single-use through the denylist and are replaced by a new family.
+        await authenticate(refresh_token, credentials_exception, token_type="refresh")
+        await revoke_token(refresh_token, claims)
+        auth_stats["refreshed"] += 1
+        return await start_session(claims["sub"])
+
+    if await get_user_collection().find_one({"email": claims["sub"]}, {"_id": 1}) is None:
+        # The account was deleted; its session ends instead of living on until the family expires.
+        auth_stats["rejected"] += 1
+        await end_session(family)
+        raise credentials_exception
+
+    new_jti = uuid.uuid4().hex
+    try:
+        if _rotate_script_client is not client:
+            _rotate_script, _rotate_script_client = client.register_script(_ROTATE_SCRIPT), client
+        outcome = await _rotate_script(
+            keys=[f"{FAMILY_PREFIX}:{family}", f"{REVOKED_BEFORE_PREFIX}:{claims['sub']}"],
+            args=[claims.get("jti", ""), new_jti, claims.get("iat", 0), _refresh_ttl()])
+    except Exception as e:
+        # Unlike access checks this fails closed: the client can still log in with its password.
+        logger.warning("Could not rotate the refresh token in Redis", extra={"error": str(e)})
+        raise credentials_exception
+    outcome = outcome.decode() if isinstance(outcome, bytes) else outcome
+    if outcome == "reused":
+        auth_stats["refresh_reused"] += 1
+        logger.warning("Refresh token reuse detected, ending its session", extra={"user_email": claims["sub"], "family": family})
+        await end_session(family)
+    if outcome != "rotated":
+        auth_stats["rejected"] += 1
+        raise credentials_exception
+    auth_stats["refreshed"] += 1
+    return _token_pair(claims["sub"], family, new_jti)
+
+async def end_session(family: str):
+    """Ends a token family: its refresh token stops working and so do the access tokens issued with it."""
+    _evict(family=family)
+    if not redis_cache.redis_client:
+        return
+    await redis_cache.redis_client.delete(f"{FAMILY_PREFIX}:{family}")
+    await redis_cache.redis_client.publish(REVOCATION_CHANNEL, f"family:{family}")
+
+async def _listen_for_revocations():
+    pubsub = redis_cache.redis_client.pubsub()
+    try:
+        await pubsub.subscribe(REVOCATION_CHANNEL)
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            kind, _, value = message["data"].partition(":")
+            argument = {"token": "token_key", "user": "username", "family": "family"}.get(kind)
+            if argument:
+                _evict(**{argument: value})
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error("Token revocation listener stopped; cached tokens now expire by AUTH_CACHE_TTL_SECONDS only", extra={"error": str(e)})
+    finally:
+        await pubsub.aclose()
+
+def start_revocation_listener():
+    """Subscribes to revocations made by other processes; called on application startup."""
+    global _revocation_listener
+    if redis_cache.redis_client and (_revocation_listener is None or _revocation_listener.done()):
+        _revocation_listener = asyncio.create_task(_listen_for_revocations())
+
+async def stop_revocation_listener():
+    global _revocation_listener
+    if _revocation_listener is not None:
+        _revocation_listener.cancel()
+        try:
+            await _revocation_listener
+        except asyncio.CancelledError:
+            pass
+        _revocation_listener = None
@@ -0,0 +1,351 @@
+# backend/app/services/admission.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from app import observability
+from app.config import settings
+from app.services import redis_cache
+
+logger = logging.getLogger(__name__)
+
+# Admission control in front of the LLM providers.
+# Every call that reaches a provider first takes one of ADMISSION_MAX_CONCURRENT slots in this
+# process. When they are all taken, calls wait in a priority queue: interactive work (a user
+# waiting on a chat reply) is always granted a free slot before background work (conversation
+# summaries), and background work never holds more than ADMISSION_BACKGROUND_MAX_SHARE of the
+# slots, so a burst of summaries cannot crowd out chat.
+# Load is shed early rather than queued without bound: a call is rejected straight away when the
+# queue is full or its expected wait already exceeds the longest its class may wait, and a queued
+# call that waits that long gives up. Rejections carry a Retry-After estimate and become 429s.
+# Each user also has a token bucket of LLM calls (ADMISSION_USER_RATE_PER_MINUTE, bursts of
+# ADMISSION_USER_BURST), shared by all workers through Redis, so one user cannot take every slot.
+# Summaries run in the Celery worker, whose controller never sees the API's chat traffic, so the
+# priority split is also enforced through Redis: every granted slot holds a lease there, and
+# background work waits until the leases of all processes leave room under ADMISSION_MAX_CONCURRENT
+# and its share. Without Redis each process falls back to its own slots.
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+# Lower rank is served first.
+PRIORITIES = {INTERACTIVE: 0, BACKGROUND: 1}
+
+KEY_PREFIX = "admission:user"
+
+# Refills the user's bucket and takes one token, in one atomic round trip against the Redis clock.
+# KEYS: the user's bucket hash. ARGV: tokens per second, burst, state TTL.
+# Returns {1 if allowed else 0, seconds until a token is available}.
+_TAKE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = math.min(burst, (tonumber(state[1]) or burst) + (now - (tonumber(state[2]) or now)) * rate)
+local allowed, wait = 0, 0
+if tokens >= 1 then
+    tokens, allowed = tokens - 1, 1
+else
+    wait = (1 - tokens) / rate
+end
+local fmt = '%.17g'
+redis.call('HSET', KEYS[1], 'tokens', string.format(fmt, tokens), 'ts', string.format(fmt, now))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+return {allowed, tostring(wait)}
+"""
+
+LEASE_KEYS = {INTERACTIVE: "admission:leases:interactive", BACKGROUND: "admission:leases:background"}
+
+# Drops expired leases and adds one, in one atomic round trip against the Redis clock. Interactive
+# leases are always added (the API's own controller has already admitted the call); a background
+# lease only when the slots leased by every process leave room for it.
+# KEYS: interactive leases, background leases (sorted sets scored by expiry).
+# ARGV: priority, lease id, TTL, max concurrent, background limit. Returns 1 if the lease was added.
+_LEASE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local target = KEYS[1]
+if ARGV[1] == 'background' then
+    local background = redis.call('ZCARD', KEYS[2])
+    if background >= tonumber(ARGV[5]) or redis.call('ZCARD', KEYS[1]) + background >= tonumber(ARGV[4]) then
+        return 0
+    end
+    target = KEYS[2]
+end
+redis.call('ZADD', target, now + tonumber(ARGV[3]), ARGV[2])
+redis.call('EXPIRE', target, tonumber(ARGV[3]))
+return 1
+"""
+
+# A lease outlives any provider call; the TTL only matters for a process that died holding one.
+_LEASE_TTL_SECONDS = 300
+# How often background work waiting on the shared leases asks again.
+_LEASE_POLL_SECONDS = 0.2
+
+# Starting estimate of how long a provider call holds its slot, until real calls have been timed.
+_INITIAL_HOLD_SECONDS = 1.0
+_HOLD_SMOOTHING = 0.1
+
+class Rejected(Exception):
+    """Raised when a call is shed; `retry_after` is the suggested wait in whole seconds."""
+    def __init__(self, reason: str, retry_after: float):
+        messages = {
+            "user_rate": "You are sending messages too quickly, please slow down",
+            "queue_full": "The assistant is busy, please try again shortly",
+            "overloaded": "The assistant is busy, please try again shortly",
+            "timeout": "The assistant is busy, please try again shortly",
+        }
+        super().__init__(messages[reason])
+        self.reason = reason
+        self.retry_after = max(math.ceil(retry_after), 1)
+
+class Slot:
+    """A granted provider slot; release it when the call finishes. Releasing twice is harmless."""
+    def __init__(self, controller: "AdmissionController", priority: str):
+        self._controller = controller
+        self.priority = priority
+        self.granted_at = time.monotonic()
+        self.released = False
+        self.lease: Optional[str] = None
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._controller._release(self)
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int, queue_max: int, background_max_share: float):
+        self.max_concurrent = max_concurrent
+        self.queue_max = queue_max
+        self.limits = {INTERACTIVE: max_concurrent, BACKGROUND: max(int(max_concurrent * background_max_share), 1)}
+        self.in_use = dict.fromkeys(PRIORITIES, 0)
+        # (rank, arrival order, priority, future resolved with the Slot)
+        self._waiters: List[Tuple[int, int, str, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._hold_seconds = _INITIAL_HOLD_SECONDS
+        self.stats = {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_overloaded": 0, "timed_out": 0, "max_queue_depth": 0, "shared_waits": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    def _has_room(self, priority: str) -> bool:
+        return sum(self.in_use.values()) < self.max_concurrent and self.in_use[priority] < self.limits[priority]
+
+    def _waiting_ahead(self, rank: int) -> int:
+        return sum(1 for waiter_rank, *_, future in self._waiters if waiter_rank <= rank and not future.done())
+
+    def estimated_wait(self, priority: str) -> float:
+        """Seconds a call of this priority arriving now would likely wait for a slot."""
+        ahead = self._waiting_ahead(PRIORITIES[priority])
+        return (ahead + 1) * self._hold_seconds / self.limits[priority]
+
+    def _grant(self, priority: str) -> Slot:
+        self.in_use[priority] += 1
+        self.stats["admitted"] += 1
+        return Slot(self, priority)
+
+    async def acquire(self, priority: str = INTERACTIVE) -> Slot:
+        """Waits for a provider slot; raises Rejected when the call should be shed instead."""
+        # Background work waits for room among the slots of every process before taking a local one.
+        lease = await self._wait_for_lease() if priority == BACKGROUND else None
+        try:
+            slot = await self._acquire_local(priority)
+        except BaseException:
+            _drop_lease(BACKGROUND, lease)
+            raise
+        if priority == INTERACTIVE:
+            _, lease = await _take_lease(INTERACTIVE, self.max_concurrent, self.limits[BACKGROUND])
+        slot.lease = lease
+        return slot
+
+    async def _wait_for_lease(self) -> Optional[str]:
+        deadline = time.monotonic() + settings.ADMISSION_BACKGROUND_MAX_WAIT_SECONDS
+        waited = False
+        while True:
+            granted, lease = await _take_lease(BACKGROUND, self.max_concurrent, self.limits[BACKGROUND])
+            if granted:
+                return lease
+            if not waited:
+                waited = True
+                self.stats["shared_waits"] += 1
+            if time.monotonic() >= deadline:
+                self.stats["timed_out"] += 1
+                observability.ADMISSION_DECISIONS.labels(BACKGROUND, "timeout").inc()
+                raise Rejected("timeout", self._hold_seconds)
+            await asyncio.sleep(_LEASE_POLL_SECONDS)
+
+    async def _acquire_local(self, priority: str) -> Slot:
+        rank = PRIORITIES[priority]
+        if not self._waiting_ahead(rank) and self._has_room(priority):
+            observability.ADMISSION_DECISIONS.labels(priority, "admitted").inc()
+            return self._grant(priority)
+        max_wait = settings.ADMISSION_INTERACTIVE_MAX_WAIT_SECONDS if priority == INTERACTIVE else settings.ADMISSION_BACKGROUND_MAX_WAIT_SECONDS
+        expected = self.estimated_wait(priority)
+        if self.queue_depth >= self.queue_max:
+            self._shed(priority, "queue_full")
+            raise Rejected("queue_full", expected)
+        if expected > max_wait:
+            self._shed(priority, "overloaded")
+            raise Rejected("overloaded", expected)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (rank, next(self._order), priority, future))
+        self.stats["queued"] += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue_depth)
+        queued_at = time.monotonic()
+        try:
+            slot = await asyncio.wait_for(future, max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as this caller gave up.
+                future.result().release()
+            future.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.stats["timed_out"] += 1
+            observability.ADMISSION_DECISIONS.labels(priority, "timeout").inc()
+            raise Rejected("timeout", self.estimated_wait(priority))
+        observability.ADMISSION_WAIT.labels(priority).observe(time.monotonic() - queued_at)
+        observability.ADMISSION_DECISIONS.labels(priority, "queued").inc()
+        return slot
+
+    def _shed(self, priority: str, reason: str):
+        self.stats[f"shed_{reason}"] += 1
+        observability.ADMISSION_DECISIONS.labels(priority, reason).inc()
+
+    def _release(self, slot: Slot):
+        _drop_lease(slot.priority, slot.lease)
+        self.in_use[slot.priority] -= 1
+        held = time.monotonic() - slot.granted_at
+        self._hold_seconds += _HOLD_SMOOTHING * (held - self._hold_seconds)
+        # Hands free slots to waiters in priority order, skipping those that gave up.
+        while self._waiters:
+            _, _, priority, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._has_room(priority):
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(self._grant(priority))
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "in_use": dict(self.in_use),
+            "queue_depth": self.queue_depth,
+            "max_concurrent": self.max_concurrent,
+            "hold_seconds": round(self._hold_seconds, 3),
+        }
+
+controller = AdmissionController(settings.ADMISSION_MAX_CONCURRENT, settings.ADMISSION_QUEUE_MAX, settings.ADMISSION_BACKGROUND_MAX_SHARE)
+
+# --- Slot leases shared by all processes ---
+
+_lease_script = None
+_lease_script_client = None
+_lease_drops = set() # Keeps pending lease deletions referenced until they finish
+lease_stats = {"redis_errors": 0}
+
+async def _take_lease(priority: str, max_concurrent: int, background_limit: int) -> Tuple[bool, Optional[str]]:
+    """Returns (granted, lease id); without Redis every lease is granted and none is recorded."""
+    global _lease_script, _lease_script_client
+    client = redis_cache.redis_client
+    if not client:
+        return True, None
+    lease = uuid.uuid4().hex
+    try:
+        if _lease_script_client is not client:
+            _lease_script, _lease_script_client = client.register_script(_LEASE_SCRIPT), client
+        granted = await _lease_script(keys=[LEASE_KEYS[INTERACTIVE], LEASE_KEYS[BACKGROUND]],
+                                      args=[priority, lease, _LEASE_TTL_SECONDS, max_concurrent, background_limit])
+    except Exception as e:
+        lease_stats["redis_errors"] += 1
+        logger.warning("Admission control could not reach Redis, using this process's slots only", extra={"error": str(e)})
+        return True, None
+    return bool(int(granted)), (lease if int(granted) else None)
+
+async def _delete_lease(client, priority: str, lease: str):
+    try:
+        await client.zrem(LEASE_KEYS[priority], lease)
+    except Exception:
+        # The lease expires on its own.
+        lease_stats["redis_errors"] += 1
+
+def _drop_lease(priority: str, lease: Optional[str]):
+    """Deletes a lease in the background, so releasing a slot never waits on Redis."""
+    client = redis_cache.redis_client
+    if not lease or not client:
+        return
+    try:
+        task = asyncio.get_running_loop().create_task(_delete_lease(client, priority, lease))
+    except RuntimeError:
+        # No event loop to run on; the lease expires on its own.
+        return
+    _lease_drops.add(task)
+    task.add_done_callback(_lease_drops.discard)
+
+# --- Per-user token buckets ---
+
+_local_buckets: Dict[str, Tuple[float, float]] = {} # user -> (tokens, monotonic timestamp)
+_take_script = None
+_take_script_client = None
+user_stats = {"allowed": 0, "shed": 0, "redis_errors": 0}
+
+def _take_local(user: str, rate: float, burst: float) -> Tuple[bool, float]:
+    now = time.monotonic()
+    # Buckets that have refilled completely carry no state, so they are dropped to bound the table.
+    for stale in [stale for stale, (tokens, ts) in _local_buckets.items() if tokens + (now - ts) * rate >= burst]:
+        del _local_buckets[stale]
+    tokens, ts = _local_buckets.get(user, (burst, now))
+    tokens = min(burst, tokens + (now - ts) * rate)
+    if tokens >= 1:
+        _local_buckets[user] = (tokens - 1, now)
+        return True, 0.0
+    _local_buckets[user] = (tokens, now)
+    return False, (1 - tokens) / rate
+
+async def charge_user(user: Optional[str]):
+    """Takes one LLM call from the user's token bucket; raises Rejected when it is empty."""
+    if not user or settings.ADMISSION_USER_RATE_PER_MINUTE <= 0:
+        return
+    global _take_script, _take_script_client
+    rate, burst = settings.ADMISSION_USER_RATE_PER_MINUTE / 60, max(settings.ADMISSION_USER_BURST, 1)
+    client = redis_cache.redis_client
+    result = None
+    if client:
+        try:
+            if _take_script_client is not client:
+                _take_script, _take_script_client = client.register_script(_TAKE_SCRIPT), client
+            allowed, wait = await _take_script(keys=[f"{KEY_PREFIX}:{user}"], args=[rate, burst, math.ceil(burst / rate) + 1])
+            result = bool(int(allowed)), float(wait)
+        except Exception as e:
+            user_stats["redis_errors"] += 1
+            logger.warning("Admission control could not reach Redis, using local buckets", extra={"error": str(e)})
+    allowed, wait = result or _take_local(user, rate, burst)
+    if not allowed:
+        user_stats["shed"] += 1
+        observability.ADMISSION_DECISIONS.labels(INTERACTIVE, "user_rate").inc()
+        raise Rejected("user_rate", wait)
+    user_stats["allowed"] += 1
+
+async def admit(user: Optional[str] = None, priority: str = INTERACTIVE) -> Optional[Slot]:
+    """
+    Charges the user's bucket and takes a provider slot; returns None when admission control is off.
+    Raises Rejected when the call is shed.
+    """
+    if not settings.ADMISSION_ENABLED:
+        return None
+    await charge_user(user)
+    return await controller.acquire(priority)
+
+def get_stats() -> Dict:
+    return {**controller.get_stats(), "users": dict(user_stats), "leases": dict(lease_stats)}
@@ -1,81 +1,221 @@
 # backend/app/services/ai_service.py
 
-import google.generativeai as genai
 import cohere
 import anthropic
+import logging
+import time
+from typing import AsyncIterator, Callable, Optional
+from google.api_core import exceptions
+from app import observability
 from app.config import settings
+from app.services import admission, dispatcher, key_scheduler, provider_pool, response_cache, single_flight
 
-# --- Client Initialization ---
-gemini_keys = [key.strip() for key in settings.GEMINI_API_KEYS.split(',')]
-cohere_client = cohere.Client(settings.COHERE_API_KEY)
-anthropic_client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+logger = logging.getLogger(__name__)
 
-# --- Global State for Key Rotation ---
-current_gemini_key_index = 0
+# --- Client Initialization ---
+# Async clients, so a slow provider only suspends the calling request instead of the whole event loop.
+# They live for the whole process and keep their HTTP connections alive between requests.
+# Gemini models are pooled per key in provider_pool, and keys are handed out by key_scheduler.
+cohere_client = cohere.AsyncClient(settings.COHERE_API_KEY)
+anthropic_client = anthropic.AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
 
-def _try_gemini(prompt: str):
-    """Attempts to get a response from Gemini, rotating keys on failure."""
-    global current_gemini_key_index
-    if not gemini_keys or not all(gemini_keys):
-        raise ValueError("Gemini API keys are not configured.")
+ALL_SERVICES_UNAVAILABLE_MESSAGE = "I'm sorry, all of my AI services are currently unavailable. Please try again later."
 
-    start_index = current_gemini_key_index
-    while True:
+async def _try_gemini(prompt: str):
+    """
+    Gets a response from Gemini. The key scheduler hands out the least-loaded healthy key
+    up front; a key that fails is put into cooldown and the next best key is tried.
+    """
+    scheduler = key_scheduler.gemini_scheduler
+    last_error = None
+    for _ in range(len(scheduler)):
+        key_to_try = await scheduler.acquire(prompt)
+        key_index = scheduler.keys.index(key_to_try)
         try:
-            key_to_try = gemini_keys[current_gemini_key_index]
-            genai.configure(api_key=key_to_try)
-            model = genai.GenerativeModel('gemini-1.5-flash-latest')
-            response = model.generate_content(prompt)
-            return response.text
+            with observability.provider_call("gemini", key_index):
+                model = provider_pool.get_gemini_model(key_to_try)
+                response = await model.generate_content_async(prompt)
+                return response.text
         except Exception as e:
-            print(f"Gemini key at index {current_gemini_key_index} failed. Error: {e}")
-            current_gemini_key_index = (current_gemini_key_index + 1) % len(gemini_keys)
-            if current_gemini_key_index == start_index:
-                print("All Gemini keys failed.")
-                raise  # Re-raise the last exception if all keys have been tried
+            logger.warning("Gemini key failed", extra={"key_index": key_index, "error": str(e)})
+            await scheduler.report_failure(key_to_try, rate_limited=isinstance(e, exceptions.ResourceExhausted))
+            last_error = e
+    logger.warning("All Gemini keys failed")
+    raise last_error or ValueError("Gemini API keys are not configured.")
 
-def _try_cohere(prompt: str):
+async def _try_cohere(prompt: str):
     """Gets a response from Cohere."""
     try:
-        response = cohere_client.chat(message=prompt, model="command-r")
+        with observability.provider_call("cohere"):
+            response = await cohere_client.chat(message=prompt, model="command-r")
         return response.text
     except Exception as e:
-        print(f"Cohere API failed. Error: {e}")
+        logger.warning("Cohere API failed", extra={"error": str(e)})
         raise
 
-def _try_anthropic(prompt: str):
+async def _try_anthropic(prompt: str):
     """Gets a response from Anthropic (Claude)."""
     try:
-        message = anthropic_client.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=1024,
-            messages=[{"role": "user", "content": prompt}]
-        )
+        with observability.provider_call("anthropic"):
+            message = await anthropic_client.messages.create(
+                model="claude-3-haiku-20240307",
+                max_tokens=1024,
+                messages=[{"role": "user", "content": prompt}]
+            )
         return message.content[0].text
     except Exception as e:
-        print(f"Anthropic API failed. Error: {e}")
+        logger.warning("Anthropic API failed", extra={"error": str(e)})
+        raise
+
+# --- Streaming Adapters ---
+# Each adapter is an async generator of text chunks. Closing the generator (e.g. when the
+# client disconnects) closes the underlying HTTP stream, so the provider stops generating.
+
+async def _stream_gemini(prompt: str) -> AsyncIterator[str]:
+    """Streams from Gemini, moving to another key only while no chunk has been produced yet."""
+    scheduler = key_scheduler.gemini_scheduler
+    last_error = None
+    for _ in range(len(scheduler)):
+        key_to_try = await scheduler.acquire(prompt)
+        key_index = scheduler.keys.index(key_to_try)
+        started = False
+        try:
+            with observability.provider_call("gemini_stream", key_index):
+                model = provider_pool.get_gemini_model(key_to_try)
+                response = await model.generate_content_async(prompt, stream=True)
+                async for chunk in response:
+                    if chunk.text:
+                        started = True
+                        yield chunk.text
+            return
+        except Exception as e:
+            if started:
+                raise
+            logger.warning("Gemini key failed to stream", extra={"key_index": key_index, "error": str(e)})
+            await scheduler.report_failure(key_to_try, rate_limited=isinstance(e, exceptions.ResourceExhausted))
+            last_error = e
+    logger.warning("All Gemini keys failed")
+    raise last_error or ValueError("Gemini API keys are not configured.")
+
+async def _stream_cohere(prompt: str) -> AsyncIterator[str]:
+    """Streams text-generation events from Cohere."""
+    try:
+        with observability.provider_call("cohere_stream"):
+            async for event in cohere_client.chat_stream(message=prompt, model="command-r"):
+                if event.event_type == "text-generation":
+                    yield event.text
+    except Exception as e:
+        logger.warning("Cohere streaming failed", extra={"error": str(e)})
+        raise
+
+async def _stream_anthropic(prompt: str) -> AsyncIterator[str]:
+    """Streams text deltas from Anthropic (Claude)."""
+    try:
+        with observability.provider_call("anthropic_stream"):
+            async with anthropic_client.messages.stream(
+                model="claude-3-haiku-20240307",
+                max_tokens=1024,
+                messages=[{"role": "user", "content": prompt}]
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield text
+    except Exception as e:
+        logger.warning("Anthropic streaming failed", extra={"error": str(e)})
         raise
 
 # --- Unified Generation Function ---
 # This is the only function our routers will need to call.
-def generate_ai_response(prompt: str) -> str:
+async def generate_ai_response(
+    prompt: str,
+    cache_namespace: Optional[str] = None,
+    cache_scope: str = "global",
+    cache_text: Optional[str] = None,
+    should_cache: Optional[Callable[[str], bool]] = None,
+    coalesce_key: Optional[str] = None,
+    user: Optional[str] = None,
+    priority: str = admission.INTERACTIVE,
+) -> str:
     """
     Tries to generate a response using a prioritized list of AI services.
     It will always try Gemini first.
+    Passing `cache_namespace` enables the response cache for this call: `cache_scope` is the
+    user email or "global", `cache_text` enables the similarity tier, and `should_cache`
+    can veto storing responses that are only valid right now.
+    Identical concurrent calls share one provider call (see single_flight). They are identified by
+    the prompt, or by `coalesce_key` for prompts that differ only in parts such as a timestamp;
+    the response cache is keyed the same way.
+    Calls that reach a provider go through admission control: each one is charged to `user`'s
+    rate, and the shared call waits for a provider slot at `priority`. Shed calls raise
+    admission.Rejected.
     """
-    # Prioritized list of generation functions
-    service_fallbacks = [_try_gemini, _try_cohere, _try_anthropic]
+    request_key = coalesce_key or prompt
+    if cache_namespace:
+        cached = await response_cache.lookup(cache_namespace, cache_scope, request_key, cache_text)
+        if cached is not None:
+            return cached
+
+    # Prioritized list of generation functions; the dispatcher hedges and falls back between them.
+    service_fallbacks = [("gemini", _try_gemini), ("cohere", _try_cohere), ("anthropic", _try_anthropic)]
 
-    for service_func in service_fallbacks:
+    async def generate() -> str:
+        slot = await admission.controller.acquire(priority) if settings.ADMISSION_ENABLED else None
         try:
-            # Attempt to get a response from the current service in the list
-            response = service_func(prompt)
-            # If successful, return the response immediately
-            return response
+            _, response = await dispatcher.dispatch(prompt, service_fallbacks)
         except Exception:
-            # If the service fails for any reason (rate limit, invalid key, etc.),
-            # the loop will simply continue to the next service.
+            # Every service failed (rate limit, invalid key, open circuit, etc.).
+            return ALL_SERVICES_UNAVAILABLE_MESSAGE
+        finally:
+            if slot:
+                slot.release()
+        if cache_namespace and (should_cache is None or should_cache(response)):
+            await response_cache.store(cache_namespace, cache_scope, request_key, response, cache_text)
+        return response
+
+    if settings.ADMISSION_ENABLED:
+        await admission.charge_user(user)
+    key = response_cache.prompt_digest(f"{cache_namespace}:{cache_scope}:{request_key}")
+    # Callers already waiting share a failure too, but it is not kept for later callers.
+    return await single_flight.run(key, generate, share=lambda response: response != ALL_SERVICES_UNAVAILABLE_MESSAGE)
+
+async def stream_ai_response(
+    prompt: str,
+    cache_namespace: Optional[str] = None,
+    cache_scope: str = "global",
+    cache_text: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of generate_ai_response, yielding text chunks as they arrive.
+    A provider is skipped only if it fails before its first chunk; a failure mid-stream
+    is raised, because the chunks already sent cannot be taken back.
+    The complete response is cached once the stream finishes.
+    Callers take the admission slot (admission.admit) before starting the response, so a shed
+    request can still be answered with a 429.
+    """
+    if cache_namespace:
+        cached = await response_cache.lookup(cache_namespace, cache_scope, prompt, cache_text)
+        if cached is not None:
+            yield cached
+            return
+
+    # Streams cannot be hedged, but they share the dispatcher's circuit breakers and metrics.
+    for name, stream_func in [("gemini", _stream_gemini), ("cohere", _stream_cohere), ("anthropic", _stream_anthropic)]:
+        if not dispatcher.is_available(name):
+            continue
+        chunks = []
+        start = time.monotonic()
+        try:
+            async for chunk in stream_func(prompt):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            dispatcher.record_outcome(name, None, e)
+            if chunks:
+                raise
+            observability.LLM_FALLBACKS.labels(name).inc()
             continue
-    
-    # If all services fail, return a final error message.
-    return "I'm sorry, all of my AI services are currently unavailable. Please try again later."
+        dispatcher.record_outcome(name, time.monotonic() - start)
+        if cache_namespace:
+            await response_cache.store(cache_namespace, cache_scope, prompt, "".join(chunks), cache_text)
+        return
+
+    yield ALL_SERVICES_UNAVAILABLE_MESSAGE
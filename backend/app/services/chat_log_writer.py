@@ -0,0 +1,134 @@
+# backend/app/services/chat_log_writer.py
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import BulkWriteError
+from app.config import settings
+from app.database import get_chat_log_collection
+
+logger = logging.getLogger(__name__)
+
+# Write-behind persistence for chat logs.
+# Requests hand their records to an in-process queue and return; a background task writes them
+# with one insert_many per batch, flushing when CHAT_LOG_BATCH_SIZE records are waiting or
+# CHAT_LOG_FLUSH_INTERVAL_SECONDS have passed. The queue is bounded: when Mongo falls behind,
+# `write` waits for room instead of letting memory grow (back-pressure on the request).
+# Until `start` is called (e.g. in the Celery worker or scripts), records are inserted directly.
+
+# Mongo stores datetimes with millisecond precision, so that is the step between ordered timestamps.
+_TIMESTAMP_STEP = timedelta(milliseconds=1)
+_INSERT_ATTEMPTS = 3
+DUPLICATE_KEY_ERROR = 11000
+
+class ChatLogWriter:
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_timestamp = datetime.min
+        self.stats = {"records": 0, "batches": 0, "failed_records": 0, "queue_full_waits": 0}
+
+    def _next_timestamp(self) -> datetime:
+        # Strictly increasing, so a turn's messages (and turns from this process) keep their order.
+        now = datetime.utcnow()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        self._last_timestamp = max(now, self._last_timestamp + _TIMESTAMP_STEP)
+        return self._last_timestamp
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Starts the background flusher; called on application startup."""
+        if not self.running:
+            self._queue = asyncio.Queue(maxsize=settings.CHAT_LOG_QUEUE_MAX)
+            self._task = asyncio.create_task(self._run())
+
+    async def write(self, *records: Dict, chat_logs: Optional[AsyncIOMotorCollection] = None):
+        """
+        Stamps the records with ordered timestamps and queues them for the next batch.
+        Without a running flusher they are inserted right away into `chat_logs`.
+        """
+        for record in records:
+            record["timestamp"] = self._next_timestamp()
+        if not self.running:
+            await (chat_logs if chat_logs is not None else get_chat_log_collection()).insert_many(list(records))
+            return
+        for record in records:
+            if self._queue.full():
+                self.stats["queue_full_waits"] += 1
+            await self._queue.put(record)
+
+    async def flush(self):
+        """Waits until everything queued so far is written, e.g. before deleting a user's history."""
+        if not self.running:
+            return
+        done = asyncio.get_running_loop().create_future()
+        await self._queue.put(done)
+        await done
+
+    async def _run(self):
+        while True:
+            batch: List[Dict] = []
+            waiters: List[asyncio.Future] = []
+            item = await self._queue.get()
+            deadline = asyncio.get_running_loop().time() + settings.CHAT_LOG_FLUSH_INTERVAL_SECONDS
+            while True:
+                if isinstance(item, asyncio.Future):
+                    waiters.append(item)
+                    break
+                if item is None:
+                    # Shutdown sentinel: write what is left and stop.
+                    await self._insert(batch)
+                    return
+                batch.append(item)
+                if len(batch) >= settings.CHAT_LOG_BATCH_SIZE:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=max(deadline - asyncio.get_running_loop().time(), 0))
+                except asyncio.TimeoutError:
+                    break
+            await self._insert(batch)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    async def _insert(self, batch: List[Dict]):
+        if not batch:
+            return
+        for attempt in range(1, _INSERT_ATTEMPTS + 1):
+            try:
+                # Reads sort by timestamp, so the batch can be written unordered.
+                await get_chat_log_collection().insert_many(batch, ordered=False)
+                error = None
+            except BulkWriteError as e:
+                # insert_many sets each record's _id, so records written before a retry come back as
+                # duplicate key errors; they are already stored.
+                only_duplicates = not e.details.get("writeConcernErrors") and all(
+                    write_error.get("code") == DUPLICATE_KEY_ERROR for write_error in e.details.get("writeErrors", []))
+                error = None if only_duplicates else e
+            except Exception as e:
+                error = e
+            if error is None:
+                self.stats["records"] += len(batch)
+                self.stats["batches"] += 1
+                return
+            if attempt == _INSERT_ATTEMPTS:
+                self.stats["failed_records"] += len(batch)
+                logger.error("Could not write chat log records, dropping them", extra={"records": len(batch), "error": str(error)})
+                return
+            await asyncio.sleep(0.5 * attempt)
+
+    async def close(self):
+        """Flushes the queue and stops the flusher; called on application shutdown."""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+writer = ChatLogWriter()
@@ -0,0 +1,126 @@
+# backend/app/services/context_builder.py
+
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from app.config import settings
+from app.database import get_chat_log_collection
+from app.services import admission, ai_service, profile_cache, redis_cache
+
+logger = logging.getLogger(__name__)
+
+# Assembles the facts and conversation history that go into chat prompts within a fixed token budget.
+# Recent messages are kept verbatim (newest first until the budget runs out); everything older is
+# represented by a rolling summary that a Celery task refreshes in the background, so prompt size
+# stays flat however long the conversation gets.
+
+_encoding = None
+
+def _load_encoding():
+    """Loads tiktoken's cl100k_base encoding when installed; otherwise tokens are estimated."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    encoding = _load_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    # Roughly four characters per token for English text.
+    return (len(text) + 3) // 4
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _load_encoding()
+    if encoding:
+        return encoding.decode(encoding.encode(text)[:max_tokens]) + "..."
+    return text[:max_tokens * 4] + "..."
+
+def _pack(lines: List[str], budget: int) -> Tuple[List[str], int]:
+    """Takes lines in order while they fit in `budget`; returns them and the tokens used."""
+    packed, used = [], 0
+    for line in lines:
+        # Each line also costs its newline.
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            break
+        packed.append(line)
+        used += cost
+    return packed, used
+
+async def build_context(user_email: str, user_profiles: AsyncIOMotorCollection) -> Tuple[str, str]:
+    """
+    Returns (user_facts, history_formatted) for an LLM prompt, together at most CONTEXT_TOKEN_BUDGET
+    tokens. Facts get up to CONTEXT_FACTS_TOKEN_SHARE of the budget; the summary of older turns
+    and as many recent messages as fit share the rest.
+    """
+    budget = settings.CONTEXT_TOKEN_BUDGET
+    fact_lines = [f"- {fact['key']}: {fact['value']}" for fact in await profile_cache.get_facts(user_email, user_profiles)]
+    facts, facts_used = _pack(fact_lines, int(budget * settings.CONTEXT_FACTS_TOKEN_SHARE))
+    budget -= facts_used
+
+    history: List[str] = []
+    summary = await redis_cache.get_conversation_summary(user_email) if settings.SUMMARY_ENABLED else {}
+    if summary:
+        summary_line = f"summary of earlier conversation: {truncate_to_tokens(summary['text'], settings.SUMMARY_MAX_TOKENS)}"
+        history, summary_used = _pack([summary_line], budget)
+        budget -= summary_used
+
+    message_lines = [
+        f"{msg['role']}: {truncate_to_tokens(msg['content'], settings.CONTEXT_MESSAGE_MAX_TOKENS)}"
+        for msg in await redis_cache.get_conversation_context(user_email)
+    ]
+    recent, _ = _pack(list(reversed(message_lines)), budget)
+    history.extend(reversed(recent))
+    return "\n".join(facts), "\n".join(history)
+
+def summary_due(message_count: int, new_messages: int) -> bool:
+    """True when the latest append crossed a multiple of SUMMARY_REFRESH_EVERY_MESSAGES."""
+    every = settings.SUMMARY_REFRESH_EVERY_MESSAGES
+    return settings.SUMMARY_ENABLED and every > 0 and message_count // every > (message_count - new_messages) // every
+
+def _build_summary_prompt(current_summary: str, messages: List[Dict]) -> str:
+    transcript = "\n".join(f"{msg['sender']}: {truncate_to_tokens(msg['text'], settings.CONTEXT_MESSAGE_MAX_TOKENS)}" for msg in messages)
+    max_words = int(settings.SUMMARY_MAX_TOKENS * 0.75)
+    return f"""You maintain a running summary of a conversation between a user and their personal assistant Maya. <current_summary>{current_summary if current_summary else "There is no summary yet."}</current_summary> <new_messages>{transcript}</new_messages> Rewrite the summary so that it also covers the new messages. Keep facts about the user, their preferences, open questions and anything Maya promised; drop greetings and small talk. Use at most {max_words} words and reply with the summary only."""
+
+async def refresh_summary(user_email: str, chat_logs: Optional[AsyncIOMotorCollection] = None) -> bool:
+    """
+    Folds the messages that have left the raw context window into the user's rolling summary.
+    Runs in the Celery worker, never on the request path. Returns True if the summary changed.
+    """
+    chat_logs = chat_logs if chat_logs is not None else get_chat_log_collection()
+    summary = await redis_cache.get_conversation_summary(user_email)
+    query = {"email": user_email}
+    if summary.get("through"):
+        query["timestamp"] = {"$gt": datetime.fromisoformat(summary["through"])}
+    # Oldest first, so a backlog longer than one batch is folded in order over several refreshes.
+    # The newest messages are still in the raw context, so the last CONTEXT_MAX_MESSAGES fetched are
+    # held back; when the batch is full they are simply the start of the next refresh.
+    limit = settings.SUMMARY_MAX_BATCH_MESSAGES + redis_cache.CONTEXT_MAX_MESSAGES
+    cursor = chat_logs.find(query, {"_id": 0, "sender": 1, "text": 1, "timestamp": 1}).sort("timestamp", 1).limit(limit)
+    messages = await cursor.to_list(length=limit)
+    to_fold = messages[:-redis_cache.CONTEXT_MAX_MESSAGES]
+    if not to_fold:
+        return False
+
+    try:
+        text = await ai_service.generate_ai_response(_build_summary_prompt(summary.get("text", ""), to_fold), priority=admission.BACKGROUND)
+    except admission.Rejected:
+        # Interactive chat has the providers' capacity; the next refresh picks these messages up again.
+        logger.info("Summary refresh shed by admission control", extra={"user_email": user_email})
+        return False
+    if text == ai_service.ALL_SERVICES_UNAVAILABLE_MESSAGE:
+        # Leave the summary as it is; the next refresh picks these messages up again.
+        return False
+    await redis_cache.set_conversation_summary(
+        user_email, truncate_to_tokens(text.strip(), settings.SUMMARY_MAX_TOKENS), to_fold[-1]["timestamp"].isoformat())
+    return True
@@ -0,0 +1,199 @@
+# backend/app/services/dispatcher.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app import observability
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Concurrent provider dispatch for ai_service.
+# Providers are tried in priority order, but instead of waiting for a slow provider to time out,
+# a backup is fired once the primary has taken longer than its recent p95 latency ("hedging"),
+# and the first good answer wins. A per-provider circuit breaker stops sending traffic to a
+# provider that keeps failing until a probe request succeeds again.
+
+ProviderFunc = Callable[[str], Awaitable[str]]
+
+LATENCY_WINDOW = 200 # Recent successful calls kept per provider for the p95 estimate
+MIN_SAMPLES_FOR_P95 = 20
+
+class CircuitBreaker:
+    """
+    closed: traffic flows. open: the provider is skipped until the reset timeout passes.
+    half-open: one probe request is let through; success closes the circuit, failure re-opens it.
+    """
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> bool:
+        """Returns True when this failure opened the circuit."""
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            opened = self.state != "open"
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            return opened
+        return False
+
+    def release_probe(self):
+        """Called when a probe is cancelled without an outcome, so another request may probe."""
+        self._probe_in_flight = False
+
+class ProviderState:
+    def __init__(self, name: str):
+        self.name = name
+        self.breaker = CircuitBreaker(settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_SECONDS)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {"calls": 0, "successes": 0, "failures": 0, "timeouts": 0, "cancelled": 0, "short_circuited": 0, "circuit_opened": 0}
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < MIN_SAMPLES_FOR_P95:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def hedge_delay(self) -> float:
+        p95 = self.p95()
+        if p95 is None:
+            return settings.HEDGE_DEFAULT_DELAY_SECONDS
+        return min(max(p95, settings.HEDGE_MIN_DELAY_SECONDS), settings.HEDGE_MAX_DELAY_SECONDS)
+
+_providers: Dict[str, ProviderState] = {}
+stats = {"dispatches": 0, "hedges_fired": 0, "hedge_wins": 0, "fallbacks": 0, "all_failed": 0}
+
+def get_provider_state(name: str) -> ProviderState:
+    if name not in _providers:
+        _providers[name] = ProviderState(name)
+    return _providers[name]
+
+def get_stats() -> Dict:
+    """Returns dispatch counters plus, per provider, its counters, circuit state and latency p95."""
+    return {
+        **stats,
+        "providers": {
+            name: {**state.counters, "circuit": state.breaker.state, "p95_seconds": state.p95()}
+            for name, state in _providers.items()
+        },
+    }
+
+def is_available(name: str) -> bool:
+    """Checks the provider's circuit; used by callers that cannot hedge, such as streaming."""
+    state = get_provider_state(name)
+    if state.breaker.allow():
+        return True
+    state.counters["short_circuited"] += 1
+    return False
+
+def record_outcome(name: str, seconds: Optional[float], error: Optional[BaseException] = None):
+    """Records the result of a call made outside dispatch() against the provider's metrics and circuit."""
+    state = get_provider_state(name)
+    state.counters["calls"] += 1
+    if error is None:
+        state.counters["successes"] += 1
+        state.latencies.append(seconds)
+        state.breaker.record_success()
+        return
+    state.counters["timeouts" if isinstance(error, asyncio.TimeoutError) else "failures"] += 1
+    if state.breaker.record_failure():
+        state.counters["circuit_opened"] += 1
+        logger.warning("Circuit opened for provider", extra={"provider": name, "consecutive_failures": state.breaker.consecutive_failures})
+
+async def _call(state: ProviderState, func: ProviderFunc, prompt: str) -> str:
+    start = time.monotonic()
+    try:
+        result = await asyncio.wait_for(func(prompt), timeout=settings.PROVIDER_TIMEOUT_SECONDS)
+    except asyncio.CancelledError:
+        # Lost a hedge race: this says nothing about the provider's health.
+        state.counters["cancelled"] += 1
+        state.breaker.release_probe()
+        raise
+    except Exception as e:
+        record_outcome(state.name, None, e)
+        raise
+    record_outcome(state.name, time.monotonic() - start)
+    return result
+
+async def dispatch(prompt: str, providers: List[Tuple[str, ProviderFunc]]) -> Tuple[str, str]:
+    """
+    Runs the prompt against the providers (in priority order) and returns (provider_name, response).
+    The next provider is started when the current one fails, or, with hedging enabled, when it
+    is slower than its hedge delay. Raises the last error if every provider fails.
+    """
+    stats["dispatches"] += 1
+    candidates = []
+    for name, func in providers:
+        if is_available(name):
+            candidates.append((get_provider_state(name), func))
+    if not candidates:
+        stats["all_failed"] += 1
+        raise RuntimeError("Every AI provider circuit is open.")
+
+    pending: Dict[asyncio.Task, Tuple[ProviderState, str]] = {}
+    next_index = 0
+    last_error: Optional[BaseException] = None
+
+    def launch(reason: str):
+        nonlocal next_index
+        state, func = candidates[next_index]
+        next_index += 1
+        pending[asyncio.create_task(_call(state, func, prompt))] = (state, reason)
+
+    launch("primary")
+    try:
+        while pending:
+            can_hedge = settings.HEDGE_ENABLED and next_index < len(candidates)
+            # Hedge relative to the most recently started provider.
+            timeout = candidates[next_index - 1][0].hedge_delay() if can_hedge else None
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                stats["hedges_fired"] += 1
+                launch("hedge")
+                continue
+            for task in done:
+                state, reason = pending.pop(task)
+                if task.exception() is None:
+                    if reason == "hedge":
+                        stats["hedge_wins"] += 1
+                    elif reason == "fallback":
+                        stats["fallbacks"] += 1
+                    return state.name, task.result()
+                last_error = task.exception()
+                observability.LLM_FALLBACKS.labels(state.name).inc()
+            # A provider failed outright: move on immediately rather than waiting for a hedge delay.
+            if next_index < len(candidates):
+                launch("fallback")
+    finally:
+        for task in pending:
+            task.cancel()
+        # Half-open providers that were admitted but never started must not keep their probe slot.
+        for state, _ in candidates[next_index:]:
+            state.breaker.release_probe()
+
+    stats["all_failed"] += 1
+    raise last_error
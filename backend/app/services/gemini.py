@@ -1,47 +1,44 @@
 # backend/app/services/gemini.py
 
-import google.generativeai as genai
+import logging
 from google.api_core import exceptions
-from app.config import settings
+from app.services import key_scheduler, provider_pool
 
-# A global variable to keep track of which API key we are currently using.
-current_key_index = 0
-api_keys = settings.GEMINI_API_KEYS
+logger = logging.getLogger(__name__)
 
-def generate_ai_response(prompt: str) -> str:
+async def generate_ai_response(prompt: str) -> str:
     """
     Generates a response from the Gemini AI model.
-    If the current API key is rate-limited, it automatically switches to the next available key.
+    Keys come from the shared key scheduler, which skips keys that are rate-limited or out of quota.
     """
-    global current_key_index
-    if not api_keys:
+    scheduler = key_scheduler.gemini_scheduler
+    if not len(scheduler):
         return "Error: No Gemini API keys are configured."
 
-    # We will try each key once per request, starting from the current index.
-    start_index = current_key_index
-    
-    while True:
+    # We will try each key at most once per request.
+    for _ in range(len(scheduler)):
         try:
-            # Select the key and configure the API
-            key_to_try = api_keys[current_key_index]
-            genai.configure(api_key=key_to_try)
-            model = genai.GenerativeModel('gemini-1.5-flash-latest')
-            
+            key_to_try = await scheduler.acquire(prompt)
+        except key_scheduler.KeysExhausted:
+            logger.warning("All available Gemini API keys are rate-limited")
+            return "I'm experiencing a high volume of requests across all channels. Please try again in a little while."
+
+        try:
+            # Reuse the long-lived model bound to this key
+            model = provider_pool.get_gemini_model(key_to_try)
+
             # Attempt to generate content
-            response = model.generate_content(prompt)
+            response = await model.generate_content_async(prompt)
             return response.text
 
-        except exceptions.ResourceExhausted as e:
-            print(f"API key at index {current_key_index} is rate-limited. Trying next key.")
-            
-            # Move to the next key in the list, wrapping around if necessary
-            current_key_index = (current_key_index + 1) % len(api_keys)
-            
-            # If we have tried all keys and are back where we started, all keys are exhausted.
-            if current_key_index == start_index:
-                print("All available API keys are rate-limited.")
-                return "I'm experiencing a high volume of requests across all channels. Please try again in a little while."
-        
+        except exceptions.ResourceExhausted:
+            logger.info("Gemini API key is rate-limited, trying the next key", extra={"key_index": scheduler.keys.index(key_to_try)})
+            # Cool the key down for every worker, then let the scheduler pick the next one.
+            await scheduler.report_failure(key_to_try, rate_limited=True)
+
         except Exception as e:
-            print(f"An error occurred while generating AI response: {e}")
+            logger.warning("Gemini request failed", extra={"error": str(e)})
             return "Sorry, I'm having trouble connecting to my brain right now. Please try again later."
+
+    logger.warning("All available Gemini API keys are rate-limited")
+    return "I'm experiencing a high volume of requests across all channels. Please try again in a little while."
@@ -0,0 +1,290 @@
+# backend/app/services/intent_engine.py
+
+# An offline intent engine that runs in front of nlu.get_structured_intent.
+# Stage 1 is compiled regex rules with dateparser doing datetime extraction; stage 2 is an
+# optional scikit-style classifier. Results use the LLM prompt's JSON schema, and anything
+# below INTENT_CONFIDENCE_THRESHOLD is left to the LLM.
+
+import logging
+import pickle
+import re
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import dateparser
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# --- Rules ---
+
+_FETCH_TASKS_RULES = [
+    re.compile(r"^\s*(what|which|show|list|display|get|tell me)\b.*\b(my|pending|upcoming)\s+(tasks|reminders|to-?dos)\b\W*$", re.IGNORECASE),
+    re.compile(r"^\s*(what|anything)\b.*\b(on my|in my)\s+(schedule|agenda|to-?do list|list)\b\W*$", re.IGNORECASE),
+    re.compile(r"^\s*(do i have|have i got)\s+(any\s+)?(tasks|reminders|to-?dos)\b.*$", re.IGNORECASE),
+    re.compile(r"^\s*(what|which)\s+(tasks|reminders|to-?dos)\s+(do i have|are (pending|due|left))\b.*$", re.IGNORECASE),
+    re.compile(r"^\s*(my\s+)?(tasks|reminders|to-?dos)\W*$", re.IGNORECASE),
+]
+
+# Each create_task rule captures the task text as `rest`, which still contains the date expression.
+# The `when` group captures a date expression placed before the task ("remind me tomorrow to ...").
+# The flag says whether the rule is an explicit request for a task and may be answered locally.
+_CREATE_TASK_RULES = [
+    (re.compile(r"^\s*(?:please\s+)?remind me (?P<when>(?:on |at |in |tomorrow|today|tonight|next |this ).*?) to (?P<rest>.+?)\W*$", re.IGNORECASE), True),
+    (re.compile(r"^\s*(?:please\s+|can you\s+|could you\s+)?remind me (?:to|about|that i need to|that i have to) (?P<rest>.+?)\W*$", re.IGNORECASE), True),
+    (re.compile(r"^\s*(?:please\s+)?(?:add|create|set|make|schedule) (?:a |an |me a )?(?:new )?(?:task|reminder|to-?do)(?: to| for| about|:)? (?P<rest>.+?)\W*$", re.IGNORECASE), True),
+    (re.compile(r"^\s*(?:please\s+)?schedule (?P<rest>.+?)\W*$", re.IGNORECASE), True),
+    # "I have to go to work tomorrow" or "I need to tell you something at 3" is as often a remark as
+    # a request, so this rule only drafts a result and leaves the decision to the LLM.
+    (re.compile(r"^\s*(?:i need to|i have to|don't let me forget to) (?P<rest>.+\b(?:tomorrow|today|tonight|at \d|on \w+day|in \d+ \w+)\b.*?)\W*$", re.IGNORECASE), False),
+]
+
+# save_fact rules capture `value` and optionally `key`; a fixed key, when given, is formatted with the captured groups.
+_SAVE_FACT_RULES = [
+    (re.compile(r"^\s*my (?P<key>[a-z][a-z' ]{0,40}?) (?:is|are) (?:called|named) (?P<value>[^?]+?)[.!]*$", re.IGNORECASE), "{key}'s name"),
+    (re.compile(r"^\s*my (?P<key>[a-z][a-z' ]{0,40}?) (?:is|are) (?P<value>[^?]+?)[.!]*$", re.IGNORECASE), None),
+    (re.compile(r"^\s*(?:call me|you can call me) (?P<value>[^?]+?)[.!]*$", re.IGNORECASE), "name"),
+    (re.compile(r"^\s*i(?: am|'m) (?P<value>\d{1,3}) years? old[.!]*$", re.IGNORECASE), "age"),
+    (re.compile(r"^\s*i live in (?P<value>[^?]+?)[.!]*$", re.IGNORECASE), "location"),
+    (re.compile(r"^\s*i work (?:at|for) (?P<value>[^?]+?)[.!]*$", re.IGNORECASE), "workplace"),
+    (re.compile(r"^\s*i(?: am|'m) allergic to (?P<value>[^?]+?)[.!]*$", re.IGNORECASE), "allergy"),
+]
+
+# Keys the catch-all "my X is Y" rule may save on its own. Any other key ("my code is not working",
+# "my flight is delayed") is usually a remark rather than a fact, so it is left to the LLM.
+_FACT_KEYS = re.compile(
+    r"^(?:(?:full |first |last |middle |nick)?name|birthday|date of birth|age|email(?: address)?|phone number|address|"
+    r"hometown|home town|job(?: title)?|occupation|profession|blood type|pronouns|(?:zodiac|star) sign|"
+    r"favou?rite [a-z ]+|[a-z ]+'s (?:name|birthday|age))$"
+)
+
+# Keys that look like facts but are really requests about the app's own data.
+_NON_FACT_KEYS = {"task", "tasks", "reminder", "reminders", "todo", "todos", "to-do", "to-dos", "schedule", "question"}
+
+# Values that are not facts: negations ("my name is not important") and pronouns or reflexives
+# ("I work for myself"), which name nothing that could be saved.
+_NON_FACT_VALUE = re.compile(
+    r"^(?:not|no|never|none)\b|n't\b|\b(?:me|myself|you|yourself|yourselves|it|itself|this|that|him|himself|her|herself|"
+    r"them|themselves|us|ourselves|someone|somebody|something|nobody|nothing|anyone|anything|everyone|everything)\b",
+    re.IGNORECASE,
+)
+
+# Idioms that match a fixed-key rule but rarely state the fact ("call me maybe", "I live in fear").
+_IDIOM_VALUES = {
+    "name": {"maybe", "crazy", "later", "back", "anytime", "whatever", "old-fashioned", "old fashioned"},
+    "location": {"fear", "hope", "denial", "peace", "dread", "sin", "luxury", "poverty", "harmony", "a bubble",
+                 "the moment", "the past", "the present", "the now", "my head", "a dream world"},
+    "workplace": {"a living", "money", "food", "free", "peanuts", "the weekend", "the man"},
+}
+
+# Words that may start a trailing date expression inside the task text.
+_DATE_BOUNDARY = re.compile(
+    r"\b(?:on|at|by|in|this|next|tomorrow|today|tonight|monday|tuesday|wednesday|thursday|friday|saturday|sunday|"
+    r"january|february|march|april|may|june|july|august|september|october|november|december|\d)",
+    re.IGNORECASE,
+)
+
+# Rewrites for phrases dateparser does not understand on its own.
+_DATE_NORMALISATIONS = [
+    (re.compile(r"\bnext (monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b", re.IGNORECASE), r"\1"),
+    (re.compile(r"\btonight at (\d{1,2})\b(?!\s*(?::|am|pm|a\.m|p\.m))", re.IGNORECASE), r"today at \1pm"),
+    (re.compile(r"\btonight\b", re.IGNORECASE), "today at 8pm"),
+    (re.compile(r"\bthis (morning|afternoon|evening)\b", re.IGNORECASE), r"today \1"),
+    (re.compile(r"\b(\w+) morning\b", re.IGNORECASE), r"\1 at 9am"),
+    (re.compile(r"\b(\w+) afternoon\b", re.IGNORECASE), r"\1 at 3pm"),
+    (re.compile(r"\b(\w+) evening\b", re.IGNORECASE), r"\1 at 6pm"),
+    (re.compile(r"\bat (\d{1,2})\b(?!\s*(?::|am|pm|a\.m|p\.m))", re.IGNORECASE), r"at \1:00"),
+    (re.compile(r"^(?:on|by)\s+", re.IGNORECASE), ""),
+]
+
+_ORDINAL_DAY = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)\b", re.IGNORECASE)
+_EXPLICIT_TIME = re.compile(r"\d{1,2}:\d{2}|\d\s*(?:am|pm|a\.m|p\.m)|\bnoon\b|\bmidnight\b|\bin \S+ (?:minute|hour)", re.IGNORECASE)
+_TRAILING_CONNECTORS = re.compile(r"\s+(?:on|at|by|in|for|this|next)$", re.IGNORECASE)
+_HIGH_PRIORITY = re.compile(r"\b(urgent|urgently|important|asap|high priority)\b", re.IGNORECASE)
+_LOW_PRIORITY = re.compile(r"\b(low priority|whenever|no rush)\b", re.IGNORECASE)
+_WORK_WORDS = re.compile(r"\b(meeting|report|client|boss|presentation|deadline|email|office|project|standup)\b", re.IGNORECASE)
+_PERSONAL_WORDS = re.compile(r"\b(mom|dad|mum|family|birthday|doctor|dentist|gym|groceries|milk|rent|friend|wife|husband|kids?)\b", re.IGNORECASE)
+
+DEFAULT_HOUR = 9 # Used when the user gives a date but no time of day
+
+# --- Stats ---
+
+stats = {"requests": 0, "rule_hits": 0, "classifier_hits": 0, "llm_fallbacks": 0}
+_stage_latency = {"rules": [0, 0.0], "classifier": [0, 0.0], "llm": [0, 0.0]}
+
+def record_stage(stage: str, seconds: float):
+    """Adds one timing sample for a pipeline stage ("rules", "classifier" or "llm")."""
+    sample = _stage_latency.setdefault(stage, [0, 0.0])
+    sample[0] += 1
+    sample[1] += seconds
+
+def get_stats() -> Dict:
+    """Returns the local hit rate and the mean latency in milliseconds of every stage."""
+    requests = stats["requests"]
+    local_hits = stats["rule_hits"] + stats["classifier_hits"]
+    return {
+        **stats,
+        "hit_rate": local_hits / requests if requests else 0.0,
+        "mean_latency_ms": {stage: (total / count * 1000 if count else 0.0) for stage, (count, total) in _stage_latency.items()},
+    }
+
+# --- Datetime extraction ---
+
+def _parse_when(expression: str, now: datetime) -> Optional[datetime]:
+    normalised = expression.strip()
+    for pattern, replacement in _DATE_NORMALISATIONS:
+        normalised = pattern.sub(replacement, normalised)
+    parsed = dateparser.parse(
+        normalised,
+        languages=["en"],
+        settings={"PREFER_DATES_FROM": "future", "RELATIVE_BASE": now, "RETURN_AS_TIMEZONE_AWARE": False},
+    )
+    if parsed and not _EXPLICIT_TIME.search(normalised) and parsed.hour == 0 and parsed.minute == 0:
+        parsed = parsed.replace(hour=DEFAULT_HOUR)
+    return parsed
+
+def extract_datetime(text: str, now: Optional[datetime] = None):
+    """
+    Splits a trailing date expression off the task text.
+    Returns (title, datetime) or (text, None) when no date expression is found.
+    The longest parseable suffix wins, so "call Anna at the cafe at 5pm" keeps "at the cafe".
+    """
+    now = now or datetime.now()
+    for match in _DATE_BOUNDARY.finditer(text):
+        if match.start() == 0:
+            continue
+        parsed = _parse_when(text[match.start():], now)
+        if parsed:
+            title = _TRAILING_CONNECTORS.sub("", text[:match.start()].strip())
+            return title, parsed
+    return text, None
+
+# --- Optional classifier ---
+
+_classifier = None
+
+def set_classifier(model):
+    """
+    Installs a scikit-style classifier, i.e. any object with `classes_` and
+    `predict_proba(list_of_messages)`. Pass None to disable the stage.
+    """
+    global _classifier
+    _classifier = model
+
+def load_classifier(path: str):
+    """Loads a pickled classifier, e.g. the pipeline returned by train_classifier."""
+    with open(path, "rb") as f:
+        set_classifier(pickle.load(f))
+
+def train_classifier(messages: List[str], labels: List[str]):
+    """Trains a small TF-IDF + logistic regression pipeline. Requires scikit-learn."""
+    try:
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+    except ImportError as e:
+        raise RuntimeError("scikit-learn is required to train the intent classifier.") from e
+    model = make_pipeline(TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True), LogisticRegression(max_iter=1000))
+    model.fit(messages, labels)
+    return model
+
+if settings.INTENT_CLASSIFIER_PATH:
+    try:
+        load_classifier(settings.INTENT_CLASSIFIER_PATH)
+    except Exception as e:
+        logger.warning("Intent classifier could not be loaded", extra={"path": settings.INTENT_CLASSIFIER_PATH, "error": str(e)})
+
+# --- Classification ---
+
+def _match_rules(user_message: str, now: datetime):
+    """Returns (result, confidence) from the regex rules, or (None, 0.0)."""
+    for rule in _FETCH_TASKS_RULES:
+        if rule.match(user_message):
+            return {"action": "fetch_tasks"}, 1.0
+
+    if user_message.rstrip().endswith("?"):
+        return None, 0.0
+
+    for rule, explicit in _CREATE_TASK_RULES:
+        match = rule.match(user_message)
+        if not match:
+            continue
+        rest = match.group("rest")
+        when = match.groupdict().get("when")
+        if when:
+            title, due = rest, _parse_when(when, now)
+        else:
+            title, due = extract_datetime(rest, now)
+        # dateparser reads a lone ordinal ("on the 1st") as a month, so a date that misses the day
+        # of the month the user named is as unreliable as none at all.
+        named_days = {int(day) for day in _ORDINAL_DAY.findall(user_message)}
+        if due and named_days and due.day not in named_days:
+            due = None
+        priority = "high" if _HIGH_PRIORITY.search(user_message) else "low" if _LOW_PRIORITY.search(user_message) else "medium"
+        category = "work" if _WORK_WORDS.search(title) else "personal" if _PERSONAL_WORDS.search(title) else "general"
+        data = {
+            "title": title.strip(),
+            "datetime": due.strftime("%Y-%m-%d %H:%M") if due else None,
+            "priority": priority,
+            "category": category,
+            "notes": "",
+        }
+        # Without a parseable date the LLM gets the chance to resolve it.
+        return {"action": "create_task", "data": data}, (0.95 if explicit and due and data["title"] else 0.4)
+
+    for rule, fixed_key in _SAVE_FACT_RULES:
+        match = rule.match(user_message)
+        if not match:
+            continue
+        key = (fixed_key.format(key=match.groupdict().get("key")) if fixed_key else match.group("key")).strip().lower()
+        if key in _NON_FACT_KEYS:
+            return None, 0.0
+        value = match.group("value").strip()
+        if _NON_FACT_VALUE.search(value):
+            return None, 0.0
+        # Long values usually mean the sentence carries more than one fact, which the LLM splits better.
+        confident = (len(value.split()) <= 4 and (fixed_key is not None or _FACT_KEYS.match(key))
+                     and value.lower() not in _IDIOM_VALUES.get(key, ()))
+        return {"action": "save_fact", "data": {"key": key, "value": value}}, (0.9 if confident else 0.5)
+
+    return None, 0.0
+
+def _classify_with_model(user_message: str):
+    """Returns (result, confidence) from the optional classifier, or (None, 0.0)."""
+    if _classifier is None:
+        return None, 0.0
+    probabilities = _classifier.predict_proba([user_message])[0]
+    best = max(range(len(probabilities)), key=lambda i: probabilities[i])
+    action = _classifier.classes_[best]
+    # The classifier predicts labels only, so it can answer intents that carry no entities.
+    if action not in ("fetch_tasks", "general_chat"):
+        return None, 0.0
+    return {"action": action}, float(probabilities[best])
+
+def classify(user_message: str, now: Optional[datetime] = None) -> Optional[dict]:
+    """
+    Runs the local stages in order and returns an NLU result in the LLM's schema
+    when one of them is confident enough, otherwise None (use the LLM).
+    """
+    now = now or datetime.now()
+    threshold = settings.INTENT_CONFIDENCE_THRESHOLD
+    stats["requests"] += 1
+
+    start = time.perf_counter()
+    result, confidence = _match_rules(user_message, now)
+    record_stage("rules", time.perf_counter() - start)
+    if result and confidence >= threshold:
+        stats["rule_hits"] += 1
+        return result
+
+    if _classifier is not None:
+        start = time.perf_counter()
+        result, confidence = _classify_with_model(user_message)
+        record_stage("classifier", time.perf_counter() - start)
+        if result and confidence >= threshold:
+            stats["classifier_hits"] += 1
+            return result
+
+    stats["llm_fallbacks"] += 1
+    return None
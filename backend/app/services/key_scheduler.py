@@ -0,0 +1,180 @@
+# backend/app/services/key_scheduler.py
+
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.services import redis_cache
+
+logger = logging.getLogger(__name__)
+
+# Rate-limit-aware scheduling for pools of API keys (Gemini, OpenAI).
+# Every key has two token buckets, requests per minute and tokens per minute, and an optional
+# cooldown set after a 429 / ResourceExhausted. `acquire` picks the healthy key with the most
+# remaining capacity *before* the call is made, so requests are not wasted on exhausted keys.
+# The buckets live in Redis so every uvicorn and Celery process agrees; if Redis is unavailable
+# each process falls back to its own in-memory buckets.
+
+KEY_PREFIX = "keysched"
+STATE_TTL_SECONDS = 3600
+# Output tokens are unknown up front, so each request reserves this many on top of the prompt.
+COMPLETION_TOKEN_ALLOWANCE = 256
+
+# Refills every bucket, picks the key with the highest remaining fraction of its tightest
+# bucket, and debits it, all in one atomic round trip.
+# The script reads the Redis server clock, so every process refills against the same time and
+# a request that waited in a connection queue cannot refill a bucket with time that has not passed.
+# KEYS: one hash per API key. ARGV: rpm, tpm, tokens needed, state TTL.
+# Returns {chosen index (1-based, 0 if none), seconds until the next key frees up}.
+_ACQUIRE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local rpm, tpm, need = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local best, best_score, best_req, best_tok, soonest = 0, -1, 0, 0, -1
+for i, key in ipairs(KEYS) do
+    local state = redis.call('HMGET', key, 'req', 'tok', 'ts', 'cooldown')
+    local elapsed = now - (tonumber(state[3]) or now)
+    local req = math.min(rpm, (tonumber(state[1]) or rpm) + elapsed * rpm / 60)
+    local tok = math.min(tpm, (tonumber(state[2]) or tpm) + elapsed * tpm / 60)
+    local cooldown = tonumber(state[4]) or 0
+    if cooldown <= now and req >= 1 and tok >= need then
+        local score = math.min(req / rpm, tok / tpm)
+        if score > best_score then
+            best, best_score, best_req, best_tok = i, score, req, tok
+        end
+    else
+        local wait = math.max(cooldown - now, (1 - req) * 60 / rpm, (need - tok) * 60 / tpm, 0)
+        if soonest < 0 or wait < soonest then soonest = wait end
+    end
+end
+if best > 0 then
+    -- Formatted explicitly: tostring() keeps only 14 significant digits of the timestamp.
+    local fmt = '%.17g'
+    redis.call('HSET', KEYS[best], 'req', string.format(fmt, best_req - 1), 'tok', string.format(fmt, best_tok - need),
+        'ts', string.format(fmt, now))
+    redis.call('EXPIRE', KEYS[best], tonumber(ARGV[4]))
+end
+return {best, tostring(soonest)}
+"""
+
+# Starts a key's cooldown against the same Redis clock _ACQUIRE_SCRIPT compares it with, so clock
+# drift between the hosts reporting failures cannot lengthen, shorten or skip it.
+# KEYS: the API key's hash. ARGV: cooldown seconds, state TTL.
+_COOLDOWN_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+redis.call('HSET', KEYS[1], 'cooldown', string.format('%.17g', now + tonumber(ARGV[1])))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+return 1
+"""
+
+class KeysExhausted(Exception):
+    """Raised when every key of a provider is cooling down or out of quota."""
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"All {provider} API keys are rate-limited; next one frees up in {retry_after:.1f}s.")
+        self.retry_after = retry_after
+
+def estimate_tokens(prompt: str) -> int:
+    # Roughly four characters per token for English text.
+    return len(prompt) // 4 + COMPLETION_TOKEN_ALLOWANCE
+
+class KeyScheduler:
+    def __init__(self, provider: str, keys: List[str], rpm: int, tpm: int):
+        self.provider = provider
+        self.keys = [key for key in keys if key]
+        self.rpm = rpm
+        self.tpm = tpm
+        # Redis keys use a digest so the API keys themselves never leave the process.
+        self._redis_keys = [f"{KEY_PREFIX}:{provider}:{hashlib.sha256(key.encode()).hexdigest()[:16]}" for key in self.keys]
+        self._local: Dict[int, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._script = None
+        self._cooldown_script = None
+        self._script_client = None
+        self.stats = {"acquired": 0, "exhausted": 0, "rate_limited": 0, "errors": 0}
+
+    def __len__(self):
+        return len(self.keys)
+
+    async def acquire(self, prompt: str) -> str:
+        """Reserves capacity for one request on the least-loaded healthy key and returns that key."""
+        if not self.keys:
+            raise ValueError(f"{self.provider} API keys are not configured.")
+        need = min(estimate_tokens(prompt), self.tpm)
+        client = redis_cache.redis_client
+        index, retry_after = None, 0.0
+        if client:
+            try:
+                self._register_scripts(client)
+                chosen, soonest = await self._script(keys=self._redis_keys, args=[self.rpm, self.tpm, need, STATE_TTL_SECONDS])
+                index, retry_after = int(chosen) - 1, float(soonest)
+            except Exception as e:
+                logger.warning("Key scheduler could not reach Redis, using local buckets", extra={"error": str(e)})
+                index = None
+        if index is None:
+            index, retry_after = self._acquire_local(need)
+        if index < 0:
+            self.stats["exhausted"] += 1
+            raise KeysExhausted(self.provider, max(retry_after, 0.0))
+        self.stats["acquired"] += 1
+        return self.keys[index]
+
+    def _register_scripts(self, client):
+        if self._script_client is not client:
+            self._script = client.register_script(_ACQUIRE_SCRIPT)
+            self._cooldown_script = client.register_script(_COOLDOWN_SCRIPT)
+            self._script_client = client
+
+    def _acquire_local(self, need: int):
+        with self._lock:
+            now = time.time()
+            best, best_score, soonest = -1, -1.0, None
+            for i in range(len(self.keys)):
+                state = self._local.setdefault(i, {"req": self.rpm, "tok": self.tpm, "ts": now, "cooldown": 0.0})
+                elapsed = now - state["ts"]
+                state["req"] = min(self.rpm, state["req"] + elapsed * self.rpm / 60)
+                state["tok"] = min(self.tpm, state["tok"] + elapsed * self.tpm / 60)
+                state["ts"] = now
+                if state["cooldown"] <= now and state["req"] >= 1 and state["tok"] >= need:
+                    score = min(state["req"] / self.rpm, state["tok"] / self.tpm)
+                    if score > best_score:
+                        best, best_score = i, score
+                else:
+                    wait = max(state["cooldown"] - now, (1 - state["req"]) * 60 / self.rpm, (need - state["tok"]) * 60 / self.tpm, 0)
+                    soonest = wait if soonest is None else min(soonest, wait)
+            if best >= 0:
+                self._local[best]["req"] -= 1
+                self._local[best]["tok"] -= need
+            return best, soonest or 0.0
+
+    async def report_failure(self, key: str, rate_limited: bool, retry_after: Optional[float] = None):
+        """
+        Puts a key into cooldown after a failed call: KEY_COOLDOWN_SECONDS (or the provider's
+        retry-after) for rate limits, KEY_ERROR_COOLDOWN_SECONDS for any other error.
+        """
+        self.stats["rate_limited" if rate_limited else "errors"] += 1
+        seconds = retry_after or (settings.KEY_COOLDOWN_SECONDS if rate_limited else settings.KEY_ERROR_COOLDOWN_SECONDS)
+        index = self.keys.index(key)
+        client = redis_cache.redis_client
+        if client:
+            try:
+                self._register_scripts(client)
+                await self._cooldown_script(keys=[self._redis_keys[index]], args=[seconds, STATE_TTL_SECONDS])
+                return
+            except Exception as e:
+                logger.warning("Key scheduler could not reach Redis, cooling down locally", extra={"error": str(e)})
+        with self._lock:
+            state = self._local.setdefault(index, {"req": self.rpm, "tok": self.tpm, "ts": time.time(), "cooldown": 0.0})
+            state["cooldown"] = time.time() + seconds
+
+def _split_keys(value: str) -> List[str]:
+    return [key.strip() for key in value.split(',') if key.strip()]
+
+gemini_scheduler = KeyScheduler("gemini", _split_keys(settings.GEMINI_API_KEYS), settings.GEMINI_KEY_RPM, settings.GEMINI_KEY_TPM)
+openai_scheduler = KeyScheduler("openai", _split_keys(settings.OPENAI_API_KEYS), settings.OPENAI_KEY_RPM, settings.OPENAI_KEY_TPM)
+
+def get_stats() -> Dict:
+    return {scheduler.provider: dict(scheduler.stats) for scheduler in (gemini_scheduler, openai_scheduler)}
@@ -1,13 +1,70 @@
 # backend/app/services/nlu.py
 
-from app.services import ai_service 
+from app import observability
+from app.services import admission, ai_service, intent_engine
+from app.config import settings
 import json
+import logging
+import time
 from datetime import datetime
+from typing import Optional
 
-def get_structured_intent(user_message: str) -> dict:
+logger = logging.getLogger(__name__)
+
+# The action definitions shared by the intent-only prompt and the combined intent+reply prompt.
+ACTION_DEFINITIONS = """
+Analyze the user's message based on the following actions:
+
+1.  **create_task**: If the user wants to create a reminder or task (e.g., "Remind me to...", "Schedule...", "Add task...").
+    - **Crucially, you MUST convert all relative dates and times (like "in 3 minutes", "tomorrow at 5pm", or "next Monday") into the absolute "YYYY-MM-DD HH:MM" format based on the current time provided.**
+    - Infer priority (high, medium, low) if mentioned, otherwise default to "medium".
+    - Infer category (work, personal, general) if possible, otherwise default to "general".
+    - The JSON format MUST be:
+      {"action": "create_task", "data": {"title": "...", "datetime": "YYYY-MM-DD HH:MM", "priority": "...", "category": "...", "notes": "..."}}
+
+2.  **fetch_tasks**: If the user asks to see their tasks (e.g., "What are my tasks?").
+    - The JSON format MUST be:
+      {"action": "fetch_tasks"}
+
+3.  **save_fact**: If the user is stating a fact to be remembered (e.g., "My name is...").
+    - The JSON format MUST be:
+      {"action": "save_fact", "data": {"key": "...", "value": "..."}}
+"""
+
+def quick_intent(user_message: str):
+    """
+    Runs the offline intent engine, checked before any LLM call.
+    Returns an NLU result dict when it is confident, otherwise None.
+    """
+    return intent_engine.classify(user_message)
+
+def _parse_json_response(response_text: str) -> dict:
+    cleaned_response = response_text.strip().replace('```json', '').replace('```', '').strip()
+    return json.loads(cleaned_response)
+
+def _without_time(prompt: str, current_time: str) -> str:
+    """
+    The prompt minus the reference time line it adds itself, so identical messages sent seconds apart
+    share one LLM call and one cache entry. Dates in the user's message or history are kept.
+    Dates are resolved to the minute, and shared results are only kept for SINGLE_FLIGHT_WINDOW_SECONDS.
+    """
+    return prompt.replace(f"Current Time for reference: {current_time}", "Current Time for reference:", 1)
+
+def _is_cacheable(response_text: str) -> bool:
+    """
+    Only results without entities may be reused: create_task datetimes are resolved against
+    the current time, and a similar message ("my name is Rob") must not get another's entities.
+    """
+    try:
+        return _parse_json_response(response_text).get("action") in ("fetch_tasks", "general_chat")
+    except Exception:
+        return False
+
+async def get_structured_intent(user_message: str, user: Optional[str] = None) -> dict:
     """
     Uses the unified AI service to perform advanced NLU on the user's message,
     returning structured JSON for task management.
+    The LLM call is charged to `user`'s admission rate; admission.Rejected is raised when it is shed.
     """
     # Provide the current time to the AI for accurate date/time parsing.
     current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -18,38 +75,85 @@ Your only job is to analyze the user's message and convert it into a structured,
 **You must respond ONLY with the raw JSON object and nothing else.**
 
 Current Time for reference: {current_time}
+{ACTION_DEFINITIONS}
+4.  **general_chat**: If the message does not fit any of the above categories.
+    - The JSON format MUST be:
+      {{"action": "general_chat"}}
 
-Analyze the user's message based on the following actions:
 
-1.  **create_task**: If the user wants to create a reminder or task (e.g., "Remind me to...", "Schedule...", "Add task...").
-    - **Crucially, you MUST convert all relative dates and times (like "in 3 minutes", "tomorrow at 5pm", or "next Monday") into the absolute "YYYY-MM-DD HH:MM" format based on the current time provided.**
-    - Infer priority (high, medium, low) if mentioned, otherwise default to "medium".
-    - Infer category (work, personal, general) if possible, otherwise default to "general".
-    - The JSON format MUST be:
-      {{"action": "create_task", "data": {{"title": "...", "datetime": "YYYY-MM-DD HH:MM", "priority": "...", "category": "...", "notes": "..."}}}}
+User's message: "{user_message}"
 
-2.  **fetch_tasks**: If the user asks to see their tasks (e.g., "What are my tasks?").
-    - The JSON format MUST be:
-      {{"action": "fetch_tasks"}}
+JSON Response:
+"""
+    try:
+        start = time.perf_counter()
+        with observability.span("nlu", mode="intent"):
+            # Exact prompt matches only: the similarity tier ignores word order and negation, so
+            # "my birthday is tomorrow" would reuse the intent cached for "is my birthday tomorrow".
+            response_text = await ai_service.generate_ai_response(
+                prompt, cache_namespace="nlu", should_cache=_is_cacheable,
+                coalesce_key=_without_time(prompt, current_time), user=user,
+            )
+        intent_engine.record_stage("llm", time.perf_counter() - start)
+        result = _parse_json_response(response_text)
+        return result
+    except admission.Rejected:
+        raise
+    except (json.JSONDecodeError, Exception) as e:
+        observability.NLU_PARSE_FAILURES.labels("intent").inc()
+        logger.warning("NLU could not parse the AI response, defaulting to general_chat", extra={"mode": "intent", "error": str(e)})
+        return {"action": "general_chat"}
 
-3.  **save_fact**: If the user is stating a fact to be remembered (e.g., "My name is...").
-    - The JSON format MUST be:
-      {{"action": "save_fact", "data": {{"key": "...", "value": "..."}}}}
+async def get_intent_and_reply(user_message: str, user_facts: str, history_formatted: str, cache_scope: str = "global", user: Optional[str] = None) -> dict:
+    """
+    Combined mode: a single structured LLM call that classifies the message and,
+    for general_chat, also writes Maya's reply under the "reply" key.
+    The prompt carries the user's own facts and history, so `cache_scope` should be their email.
+    As in get_structured_intent, the call is charged to `user` and may raise admission.Rejected.
+    """
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    prompt = f"""
+You are Maya, a helpful and friendly personal assistant, and also the NLU engine of a personal productivity app.
+Analyze the user's message and respond with a single structured, machine-readable JSON object.
+**You must respond ONLY with the raw JSON object and nothing else.**
 
+Current Time for reference: {current_time}
+{ACTION_DEFINITIONS}
 4.  **general_chat**: If the message does not fit any of the above categories.
+    - Write your conversational reply to the user in the "reply" field, using the user facts and conversation history below.
     - The JSON format MUST be:
-      {{"action": "general_chat"}}
+      {{"action": "general_chat", "reply": "..."}}
 
+<user_facts>{user_facts if user_facts else "You do not yet know any facts about the user."}</user_facts>
+<conversation_history>{history_formatted if history_formatted else "This is the beginning of the conversation."}</conversation_history>
 
 User's message: "{user_message}"
 
 JSON Response:
 """
     try:
-        response_text = ai_service.generate_ai_response(prompt)
-        cleaned_response = response_text.strip().replace('```json', '').replace('```', '').strip()
-        result = json.loads(cleaned_response)
+        start = time.perf_counter()
+        with observability.span("nlu", mode="combined"):
+            response_text = await ai_service.generate_ai_response(
+                prompt,
+                # Its own namespace: these entries are JSON, and a similarity hit on the plain chat
+                # replies in "chat" must never hand that JSON to the user as a reply.
+                cache_namespace="chat_combined",
+                cache_scope=cache_scope,
+                cache_text=user_message if settings.RESPONSE_CACHE_CHAT_SEMANTIC else None,
+                should_cache=_is_cacheable,
+                coalesce_key=_without_time(prompt, current_time),
+                user=user,
+            )
+        intent_engine.record_stage("llm", time.perf_counter() - start)
+        result = _parse_json_response(response_text)
+        if not isinstance(result, dict):
+            raise ValueError("NLU response is not a JSON object.")
         return result
+    except admission.Rejected:
+        raise
     except (json.JSONDecodeError, Exception) as e:
-        print(f"NLU Error: Could not parse AI response. Defaulting to general_chat. Error: {e}")
+        observability.NLU_PARSE_FAILURES.labels("combined").inc()
+        logger.warning("NLU could not parse the combined AI response, defaulting to general_chat", extra={"mode": "combined", "error": str(e)})
         return {"action": "general_chat"}
@@ -0,0 +1,81 @@
+# backend/app/services/pagination.py
+
+import base64
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId, errors
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+# Keyset ("seek") pagination over a (sort field, _id) pair.
+# A page is fetched with a range condition on the last position seen instead of skip(),
+# so with an index on (filter fields..., sort field, _id) every page costs the same
+# however deep it is, and the server never holds more than one page in memory.
+
+BEFORE_CURSOR_HEADER = "X-Before-Cursor"
+AFTER_CURSOR_HEADER = "X-After-Cursor"
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(document: Dict, field: str) -> str:
+    position = f"{document[field].isoformat()}|{document['_id']}"
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        position = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        value, object_id = position.split("|")
+        return datetime.fromisoformat(value), ObjectId(object_id)
+    except (ValueError, UnicodeDecodeError, errors.InvalidId) as e:
+        raise InvalidCursor(f"Invalid pagination cursor: {cursor}") from e
+
+def seek_filter(field: str, cursor: str, operator: str) -> Dict:
+    """
+    Filter for documents strictly past the cursor position in (`field`, _id) order; `operator` is
+    "$lt" (older) or "$gt" (newer). The inclusive range on `field` gives the index tight bounds,
+    and the $or only has to drop the documents sharing the cursor's value.
+    """
+    value, object_id = decode_cursor(cursor)
+    inclusive = "$lte" if operator == "$lt" else "$gte"
+    return {field: {inclusive: value}, "$or": [{field: {operator: value}}, {"_id": {operator: object_id}}]}
+
+async def fetch_page(
+    collection: AsyncIOMotorCollection,
+    query: Dict,
+    field: str,
+    limit: int,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    projection: Optional[Dict] = None,
+    newest_first: bool = False,
+) -> Tuple[List[Dict], Optional[str], Optional[str]]:
+    """
+    Returns (documents, before_cursor, after_cursor) for one page ordered by (`field`, _id).
+    Without a cursor the newest `limit` documents are returned; `before` pages towards older
+    documents and `after` towards newer ones. `before_cursor` is None when there is nothing older;
+    `after_cursor` is always set for a non-empty page so clients can poll for newer documents.
+    Documents come back oldest first, or newest first with `newest_first`.
+    """
+    if before and after:
+        raise InvalidCursor("Pass either 'before' or 'after', not both.")
+    forward = after is not None
+    if before or after:
+        query = {**query, **seek_filter(field, after or before, "$gt" if forward else "$lt")}
+    direction = 1 if forward else -1
+    # One extra document tells whether another page exists without a count query.
+    cursor = collection.find(query, projection).sort([(field, direction), ("_id", direction)]).limit(limit + 1)
+    documents = await cursor.to_list(length=limit + 1)
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+    if not forward:
+        documents.reverse()
+    if not documents:
+        return [], None, None
+    # Paging forward, older documents exist by definition; paging back, `has_more` says so.
+    has_older = forward or has_more
+    before_cursor = encode_cursor(documents[0], field) if has_older else None
+    after_cursor = encode_cursor(documents[-1], field)
+    if newest_first:
+        documents.reverse()
+    return documents, before_cursor, after_cursor
@@ -0,0 +1,130 @@
+# backend/app/services/profile_cache.py
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app import observability
+from app.config import settings
+from app.services import redis_cache
+
+logger = logging.getLogger(__name__)
+
+# Per-user cache of profile facts, so building a chat prompt needs no Mongo read.
+# Fact saves are a single atomic update that returns the new fact list, which is written
+# through to this process's cache; other processes are told to drop their copy over Redis
+# pub/sub. PROFILE_CACHE_TTL_SECONDS bounds staleness if an invalidation is ever missed.
+
+INVALIDATION_CHANNEL = "profile-invalidate"
+# Identifies this process's own invalidation messages, which it can ignore.
+_PROCESS_ID = uuid.uuid4().hex
+
+_entries: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
+_listener: Optional[asyncio.Task] = None
+stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+def _remember(user_email: str, facts: List[Dict]):
+    _entries[user_email] = (time.monotonic() + settings.PROFILE_CACHE_TTL_SECONDS, facts)
+    _entries.move_to_end(user_email)
+    while len(_entries) > settings.PROFILE_CACHE_MAX_ENTRIES:
+        _entries.popitem(last=False)
+
+def invalidate(user_email: str):
+    _entries.pop(user_email, None)
+
+async def get_facts(user_email: str, user_profiles: AsyncIOMotorCollection) -> List[Dict]:
+    """Returns the user's facts as [{"key": ..., "value": ...}], reading Mongo only on a cache miss."""
+    entry = _entries.get(user_email)
+    if entry is not None and entry[0] >= time.monotonic():
+        _entries.move_to_end(user_email)
+        stats["hits"] += 1
+        observability.cache_result("profile", True)
+        return entry[1]
+    stats["misses"] += 1
+    observability.cache_result("profile", False)
+    profile = await user_profiles.find_one({"email": user_email}, {"_id": 0, "facts": 1})
+    facts = profile.get("facts", []) if profile else []
+    _remember(user_email, facts)
+    return facts
+
+def _upsert_fact_pipeline(user_email: str, fact_key: str, fact_value: str) -> List[Dict]:
+    # $literal keeps user text such as "$5 budget" from being read as a field path.
+    key = {"$literal": fact_key}
+    fact = {"key": key, "value": {"$literal": fact_value}}
+    facts = {"$ifNull": ["$facts", []]}
+    return [{"$set": {
+        "email": {"$literal": user_email},
+        "facts": {"$cond": [
+            {"$in": [key, {"$ifNull": ["$facts.key", []]}]},
+            # Replace the value in place, keeping the order of the facts.
+            {"$map": {"input": facts, "in": {"$cond": [{"$eq": ["$$this.key", key]}, fact, "$$this"]}}},
+            {"$concatArrays": [facts, [fact]]},
+        ]},
+    }}]
+
+async def save_fact(user_email: str, fact_key: str, fact_value: str, user_profiles: AsyncIOMotorCollection) -> List[Dict]:
+    """
+    Sets one fact with a single atomic pipeline update (MongoDB 4.2+), creating the profile if needed,
+    and writes the resulting fact list through to the cache. Concurrent saves of the same key
+    cannot produce duplicates because the whole read-modify-write happens inside one document update.
+    """
+    pipeline = _upsert_fact_pipeline(user_email, fact_key, fact_value)
+    try:
+        profile = await user_profiles.find_one_and_update(
+            {"email": user_email}, pipeline, projection={"_id": 0, "facts": 1}, upsert=True, return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        # Two first-ever saves raced to insert the profile; the unique email index let one win, so update it.
+        profile = await user_profiles.find_one_and_update(
+            {"email": user_email}, pipeline, projection={"_id": 0, "facts": 1}, return_document=ReturnDocument.AFTER)
+    facts = profile.get("facts", []) if profile else []
+    _remember(user_email, facts)
+    await _publish_invalidation(user_email)
+    return facts
+
+async def _publish_invalidation(user_email: str):
+    if not redis_cache.redis_client:
+        return
+    try:
+        await redis_cache.redis_client.publish(INVALIDATION_CHANNEL, f"{_PROCESS_ID}:{user_email}")
+    except Exception as e:
+        logger.warning("Could not publish profile invalidation", extra={"error": str(e)})
+
+async def _listen():
+    pubsub = redis_cache.redis_client.pubsub()
+    try:
+        await pubsub.subscribe(INVALIDATION_CHANNEL)
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            sender, _, user_email = message["data"].partition(":")
+            if sender != _PROCESS_ID:
+                invalidate(user_email)
+                stats["invalidations"] += 1
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error("Profile invalidation listener stopped; cached profiles now expire by TTL only", extra={"error": str(e)})
+    finally:
+        await pubsub.aclose()
+
+def start():
+    """Subscribes to invalidations from other processes; called on application startup."""
+    global _listener
+    if redis_cache.redis_client and (_listener is None or _listener.done()):
+        _listener = asyncio.create_task(_listen())
+
+async def close():
+    global _listener
+    if _listener is not None:
+        _listener.cancel()
+        try:
+            await _listener
+        except asyncio.CancelledError:
+            pass
+        _listener = None
@@ -0,0 +1,69 @@
+# backend/app/services/provider_pool.py
+
+import threading
+from typing import Dict
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from openai import AsyncOpenAI
+
+# Long-lived provider clients, one per API key.
+# Building a client per request pays a TCP + TLS handshake on every message, and
+# genai.configure() swaps a process-wide key that concurrent requests race on.
+# Each client here owns its own keep-alive connection pool (an HTTP/2 gRPC channel
+# for Gemini, an httpx pool for OpenAI) and is reused by every request using that key.
+
+GEMINI_MODEL_NAME = "gemini-1.5-flash-latest"
+
+_gemini_models: Dict[str, genai.GenerativeModel] = {}
+# The async clients handed to the models above, kept here so close() does not reach into the model.
+_gemini_clients: Dict[str, glm.GenerativeServiceAsyncClient] = {}
+_openai_clients: Dict[str, AsyncOpenAI] = {}
+# Creation is guarded so a client is never built twice, e.g. from Celery worker threads.
+_lock = threading.Lock()
+
+def get_gemini_model(api_key: str) -> genai.GenerativeModel:
+    """
+    Returns the GenerativeModel bound to `api_key`. The model gets its own async
+    client carrying the key, instead of reading the global genai.configure() state.
+    """
+    model = _gemini_models.get(api_key)
+    if model is None:
+        with _lock:
+            model = _gemini_models.get(api_key)
+            if model is None:
+                model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+                # The SDK has no public way to give a model its own client; it creates one lazily
+                # in `_async_client` unless one is already set. If a new SDK version stops reading
+                # that attribute, the model would quietly fall back to the global key, so fail loudly.
+                if not hasattr(model, "_async_client"):
+                    raise RuntimeError("This google-generativeai version no longer reads GenerativeModel._async_client; update provider_pool.")
+                client = glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+                model._async_client = client
+                _gemini_clients[api_key] = client
+                _gemini_models[api_key] = model
+    return model
+
+def get_openai_client(api_key: str, base_url: str = None) -> AsyncOpenAI:
+    """Returns the AsyncOpenAI client for `api_key`; `base_url` lets benchmarks point it at a local stand-in."""
+    pool_key = f"{api_key}@{base_url}" if base_url else api_key
+    client = _openai_clients.get(pool_key)
+    if client is None:
+        with _lock:
+            client = _openai_clients.get(pool_key)
+            if client is None:
+                client = AsyncOpenAI(api_key=api_key, base_url=base_url) if base_url else AsyncOpenAI(api_key=api_key)
+                _openai_clients[pool_key] = client
+    return client
+
+async def close():
+    """Closes every pooled connection; called on application shutdown."""
+    with _lock:
+        gemini_clients, clients = list(_gemini_clients.values()), list(_openai_clients.values())
+        _gemini_models.clear()
+        _gemini_clients.clear()
+        _openai_clients.clear()
+    for client in gemini_clients:
+        await client.transport.close()
+    for client in clients:
+        await client.close()
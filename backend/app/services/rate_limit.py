@@ -0,0 +1,55 @@
+# backend/app/services/rate_limit.py
+
+import logging
+import time
+from typing import Dict, Tuple
+
+from app.services import redis_cache
+
+logger = logging.getLogger(__name__)
+
+# Fixed-window attempt counters, shared by all workers through Redis.
+# Each attempt is one SET NX + INCR pipeline; without Redis each process counts on its own.
+
+KEY_PREFIX = "ratelimit"
+
+_local: Dict[str, Tuple[float, int]] = {}
+
+async def hit(name: str, identity: str, limit: int, window_seconds: int) -> Tuple[bool, int]:
+    """
+    Counts one attempt for `identity` (e.g. an email or an IP) under the `name` limit.
+    Returns (allowed, retry_after_seconds); retry_after is 0 when allowed.
+    """
+    key = f"{KEY_PREFIX}:{name}:{identity}"
+    client = redis_cache.redis_client
+    if client:
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                # SET NX starts the window on the first attempt; later attempts do not extend it.
+                pipe.set(key, 0, ex=window_seconds, nx=True)
+                pipe.incr(key)
+                pipe.ttl(key)
+                _, count, ttl = await pipe.execute()
+            return count <= limit, (max(ttl, 1) if count > limit else 0)
+        except Exception as e:
+            logger.warning("Rate limiter could not reach Redis, counting locally", extra={"error": str(e)})
+    now = time.monotonic()
+    window_end, count = _local.get(key, (0.0, 0))
+    if window_end <= now:
+        window_end, count = now + window_seconds, 0
+        # Drop finished windows so the local table cannot grow without bound.
+        for stale in [stale for stale, (end, _) in _local.items() if end <= now]:
+            del _local[stale]
+    count += 1
+    _local[key] = (window_end, count)
+    return count <= limit, (max(int(window_end - now), 1) if count > limit else 0)
+
+async def reset(name: str, identity: str):
+    """Clears the counter, e.g. an account's failed logins after a successful one."""
+    key = f"{KEY_PREFIX}:{name}:{identity}"
+    _local.pop(key, None)
+    if redis_cache.redis_client:
+        try:
+            await redis_cache.redis_client.delete(key)
+        except Exception as e:
+            logger.warning("Rate limiter could not reset a counter", extra={"key": key, "error": str(e)})
@@ -1,49 +1,142 @@
 # backend/app/services/redis_cache.py
 
-import redis
+import redis.asyncio as redis
 import json
+import logging
+import time
 from typing import List, Dict
+from redis.asyncio.client import Pipeline
+from app import observability
+from app.config import settings
+
+logger = logging.getLogger(__name__)
 
-# In a local setup without Docker, Redis typically runs on this host and port.
-REDIS_HOST = "localhost"
-REDIS_PORT = 6379
 CONTEXT_EXPIRATION_SECONDS = 3600 # 1 hour
+CONTEXT_MAX_MESSAGES = 10 # Only the most recent messages are kept to prevent the context from growing too large
+CONTEXT_KEY_PREFIX = "context"
+SUMMARY_KEY_PREFIX = "summary"
+SUMMARY_EXPIRATION_SECONDS = 7 * 24 * 3600 # Summaries outlive the raw context so returning users keep the gist
+
+class _TimedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            observability.REDIS_LATENCY.labels("MULTI" if self.is_transaction else "PIPELINE").observe(time.perf_counter() - start)
+
+class _TimedRedis(redis.Redis):
+    """Records every command's latency (pipelines as one MULTI/PIPELINE sample) in REDIS_LATENCY."""
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            observability.REDIS_LATENCY.labels(str(args[0]).upper()).observe(time.perf_counter() - start)
 
-try:
-    # Connect to the local Redis instance
-    redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
-    # Check if the connection is successful
-    redis_client.ping()
-    print("Successfully connected to Redis.")
-except redis.exceptions.ConnectionError as e:
-    print(f"Error connecting to Redis: {e}")
-    redis_client = None
-
-def get_conversation_context(session_id: str) -> List[Dict[str, str]]:
-    """Retrieves the recent conversation history for a given session ID."""
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> Pipeline:
+        return _TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+# The asyncio client connects lazily, so creating it here performs no I/O.
+# `check_connection` is awaited on application startup and disables the cache if Redis is down.
+# Every Redis user in the process goes through this client and its bounded pool; when all
+# REDIS_MAX_CONNECTIONS are busy, commands wait for one instead of opening more.
+connection_pool = redis.BlockingConnectionPool.from_url(
+    settings.REDIS_URL,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+    decode_responses=True,
+)
+redis_client = (_TimedRedis if settings.METRICS_ENABLED else redis.Redis)(connection_pool=connection_pool)
+
+async def check_connection():
+    """Pings Redis once on startup; on failure the cache is disabled for this process."""
+    global redis_client
     if not redis_client:
-        return []
+        return
     try:
-        context_json = redis_client.get(session_id)
-        if context_json:
-            return json.loads(context_json)
+        await redis_client.ping()
+        logger.info("Successfully connected to Redis")
+    except redis.ConnectionError as e:
+        logger.error("Error connecting to Redis, the cache is disabled", extra={"error": str(e)})
+        redis_client = None
+
+async def close():
+    """Releases the connection pool on application shutdown."""
+    if redis_client:
+        await redis_client.aclose()
+    await connection_pool.disconnect()
+
+def _context_key(session_id: str) -> str:
+    return f"{CONTEXT_KEY_PREFIX}:{session_id}"
+
+def _summary_key(session_id: str) -> str:
+    return f"{SUMMARY_KEY_PREFIX}:{session_id}"
+
+async def get_conversation_context(session_id: str) -> List[Dict[str, str]]:
+    """Retrieves the recent conversation history for a given session ID, oldest message first."""
+    if not redis_client:
         return []
+    try:
+        return [json.loads(message) for message in await redis_client.lrange(_context_key(session_id), 0, -1)]
     except Exception as e:
-        print(f"Error retrieving context from Redis: {e}")
+        logger.warning("Error retrieving context from Redis", extra={"error": str(e)})
         return []
 
-def set_conversation_context(session_id: str, new_message: Dict[str, str]):
-    """Adds a new message to the conversation history and resets the expiration time."""
+async def append_conversation_context(session_id: str, *messages: Dict[str, str]) -> int:
+    """
+    Appends messages to the conversation history, keeps the last CONTEXT_MAX_MESSAGES and resets
+    the expiration time. RPUSH, LTRIM and EXPIRE run as one MULTI/EXEC round trip, so the messages
+    of a turn stay together and concurrent requests for the same session never overwrite each other.
+    Returns the number of messages recorded for the session so far (used to schedule summaries).
+    """
+    if not redis_client or not messages:
+        return 0
+    key = _context_key(session_id)
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *(json.dumps(message) for message in messages))
+            pipe.ltrim(key, -CONTEXT_MAX_MESSAGES, -1)
+            pipe.expire(key, CONTEXT_EXPIRATION_SECONDS)
+            pipe.hincrby(_summary_key(session_id), "messages", len(messages))
+            pipe.expire(_summary_key(session_id), SUMMARY_EXPIRATION_SECONDS)
+            *_, message_count, _ = await pipe.execute()
+        return message_count
+    except Exception as e:
+        logger.warning("Error setting context in Redis", extra={"error": str(e)})
+        return 0
+
+async def get_conversation_summary(session_id: str) -> Dict[str, str]:
+    """
+    Returns the rolling summary of the older part of a conversation:
+    {"text": ..., "through": ISO timestamp of the last summarised message}, or {} if there is none yet.
+    """
+    if not redis_client:
+        return {}
+    try:
+        summary = await redis_client.hgetall(_summary_key(session_id))
+        return summary if summary.get("text") else {}
+    except Exception as e:
+        logger.warning("Error retrieving summary from Redis", extra={"error": str(e)})
+        return {}
+
+async def set_conversation_summary(session_id: str, text: str, through: str):
     if not redis_client:
         return
     try:
-        current_context = get_conversation_context(session_id)
-        current_context.append(new_message)
-        
-        # Keep only the last 10 messages to prevent the context from growing too large
-        updated_context = current_context[-10:]
-        
-        redis_client.set(session_id, json.dumps(updated_context), ex=CONTEXT_EXPIRATION_SECONDS)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(_summary_key(session_id), mapping={"text": text, "through": through})
+            pipe.expire(_summary_key(session_id), SUMMARY_EXPIRATION_SECONDS)
+            await pipe.execute()
     except Exception as e:
-        print(f"Error setting context in Redis: {e}")
+        logger.warning("Error setting summary in Redis", extra={"error": str(e)})
 
+async def clear_conversation_context(session_id: str):
+    """Deletes the conversation history of a session, e.g. when the user clears their chat."""
+    if not redis_client:
+        return
+    try:
+        # The bare session ID is where older versions stored the context as a JSON string.
+        await redis_client.delete(_context_key(session_id), _summary_key(session_id), session_id)
+    except Exception as e:
+        logger.warning("Error clearing context in Redis", extra={"error": str(e)})
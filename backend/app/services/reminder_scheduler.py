@@ -0,0 +1,168 @@
+# backend/app/services/reminder_scheduler.py
+
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+from app.services import redis_cache, task_queue
+
+logger = logging.getLogger(__name__)
+
+# Task reminders, kept in Redis until they are due instead of as Celery countdown (ETA) tasks.
+# A sorted set maps task ids to their due time and a hash holds each reminder's email payload,
+# so the workers hold nothing for reminders that are not due yet, however far out they are.
+# Scheduling a task id again moves its reminder; cancelling removes it. A poller in every API
+# process claims due reminders in batches with one atomic script call (so no two processes send
+# the same reminder) and hands them to the Celery worker as send_reminder_emails batches.
+# Reminders that fell due while no poller was running are sent on the next poll.
+
+DUE_KEY = "reminders:due"
+PAYLOAD_KEY = "reminders:payload"
+
+# KEYS: due set, payload hash. ARGV: now (epoch seconds), batch size.
+# Returns a flat list {task id, payload, task id, payload, ...} of reminders removed from the schedule.
+_CLAIM_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #ids == 0 then
+    return {}
+end
+redis.call('ZREM', KEYS[1], unpack(ids))
+local payloads = redis.call('HMGET', KEYS[2], unpack(ids))
+redis.call('HDEL', KEYS[2], unpack(ids))
+local claimed = {}
+for i, id in ipairs(ids) do
+    claimed[#claimed + 1] = id
+    claimed[#claimed + 1] = payloads[i] or ''
+end
+return claimed
+"""
+
+_claim_script = None
+_claim_script_client = None
+_poller: Optional[asyncio.Task] = None
+stats = {"scheduled": 0, "cancelled": 0, "dispatched": 0, "polls": 0, "dispatch_failures": 0, "fallback_countdowns": 0}
+
+def _payload(user_email: str, content: str) -> str:
+    return json.dumps({"email": user_email, "content": content}, separators=(",", ":"))
+
+async def schedule_many(reminders: Iterable[Tuple[str, str, str, datetime]]) -> int:
+    """
+    Schedules (task_id, user_email, content, due_at) reminders in one pipeline, replacing any
+    reminder already scheduled for the same task. Naive `due_at` values are local time, as produced
+    by dateparser. Returns the number scheduled.
+    """
+    reminders = list(reminders)
+    if not reminders:
+        return 0
+    client = redis_cache.redis_client
+    if not client:
+        # Without Redis the old behaviour is the best available: a countdown task that cannot be cancelled.
+        await task_queue.enqueuer.enqueue_many(
+            ("send_reminder_email", [user_email, content], {"countdown": max(due_at.timestamp() - time.time(), 0)})
+            for _, user_email, content, due_at in reminders)
+        stats["fallback_countdowns"] += len(reminders)
+        return len(reminders)
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.zadd(DUE_KEY, {task_id: due_at.timestamp() for task_id, _, _, due_at in reminders})
+        pipe.hset(PAYLOAD_KEY, mapping={task_id: _payload(user_email, content) for task_id, user_email, content, _ in reminders})
+        await pipe.execute()
+    stats["scheduled"] += len(reminders)
+    return len(reminders)
+
+async def schedule(task_id: str, user_email: str, content: str, due_at: datetime):
+    await schedule_many([(task_id, user_email, content, due_at)])
+
+async def cancel_many(task_ids: Iterable[str]) -> int:
+    """Removes the reminders of these tasks, if any are scheduled. Returns how many were removed."""
+    task_ids = list(task_ids)
+    if not task_ids or not redis_cache.redis_client:
+        return 0
+    async with redis_cache.redis_client.pipeline(transaction=True) as pipe:
+        pipe.zrem(DUE_KEY, *task_ids)
+        pipe.hdel(PAYLOAD_KEY, *task_ids)
+        removed, _ = await pipe.execute()
+    stats["cancelled"] += removed
+    return removed
+
+async def cancel(task_id: str) -> bool:
+    return await cancel_many([task_id]) > 0
+
+async def scheduled_count() -> int:
+    return await redis_cache.redis_client.zcard(DUE_KEY) if redis_cache.redis_client else 0
+
+async def claim_due(batch_size: int, now: Optional[float] = None) -> List[Dict]:
+    """Atomically removes up to `batch_size` reminders due by `now` and returns them."""
+    global _claim_script, _claim_script_client
+    client = redis_cache.redis_client
+    if _claim_script_client is not client:
+        _claim_script, _claim_script_client = client.register_script(_CLAIM_SCRIPT), client
+    flat = await _claim_script(keys=[DUE_KEY, PAYLOAD_KEY], args=[now if now is not None else time.time(), batch_size])
+    claimed = []
+    for task_id, payload in zip(flat[::2], flat[1::2]):
+        if payload:
+            claimed.append({"task_id": task_id, **json.loads(payload)})
+    return claimed
+
+def _send(reminders: List[Dict]):
+    """
+    Blocking: publishes one send_reminder_emails task per REMINDER_EMAIL_BATCH_SIZE reminders over
+    one pooled broker connection. Queued reminders are removed from `reminders`, so after an error
+    it holds only the ones still to be queued.
+    """
+    size = settings.REMINDER_EMAIL_BATCH_SIZE
+    while reminders:
+        batch = [[reminder["email"], reminder["content"]] for reminder in reminders[:size]]
+        task_queue.publish([("send_reminder_emails", [batch], {})])
+        del reminders[:size]
+
+async def dispatch_due(batch_size: Optional[int] = None, now: Optional[float] = None, send=_send) -> int:
+    """Claims one batch of due reminders and queues their emails. Returns how many were dispatched."""
+    reminders = await claim_due(batch_size or settings.REMINDER_BATCH_SIZE, now)
+    stats["polls"] += 1
+    if not reminders:
+        return 0
+    claimed = len(reminders)
+    try:
+        # Publishing to the broker is blocking I/O, so it runs off the event loop.
+        await asyncio.to_thread(send, reminders)
+    except Exception as e:
+        # Put the unqueued rest back so the next poll retries it rather than losing the reminders.
+        stats["dispatch_failures"] += 1
+        logger.warning("Could not queue reminder emails, rescheduling them", extra={"reminders": len(reminders), "error": str(e)})
+        await schedule_many((r["task_id"], r["email"], r["content"], datetime.now()) for r in reminders)
+        return 0
+    stats["dispatched"] += claimed
+    return claimed
+
+async def _poll():
+    while True:
+        try:
+            dispatched = await dispatch_due()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Reminder poll failed", extra={"error": str(e)})
+            dispatched = 0
+        # A full batch means more are probably due; otherwise wait for the next interval.
+        if dispatched < settings.REMINDER_BATCH_SIZE:
+            await asyncio.sleep(settings.REMINDER_POLL_INTERVAL_SECONDS)
+
+def start():
+    """Starts the due-reminder poller; called on application startup."""
+    global _poller
+    if settings.REMINDER_SCHEDULER_ENABLED and redis_cache.redis_client and (_poller is None or _poller.done()):
+        _poller = asyncio.create_task(_poll())
+
+async def close():
+    global _poller
+    if _poller is not None:
+        _poller.cancel()
+        try:
+            await _poller
+        except asyncio.CancelledError:
+            pass
+        _poller = None
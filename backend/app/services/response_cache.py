@@ -0,0 +1,215 @@
+# backend/app/services/response_cache.py
+
+import array
+import asyncio
+import base64
+import hashlib
+import logging
+import math
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app import observability
+from app.config import settings
+from app.services import redis_cache
+
+logger = logging.getLogger(__name__)
+
+# Two-tier cache for LLM responses.
+# Tier 1 is an exact lookup on a hash of the normalised prompt.
+# Tier 2 compares an embedding of the user's message with the entries stored in the same scope.
+
+KEY_PREFIX = "respcache"
+EMBEDDING_DIMENSIONS = 256
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0}
+
+def get_stats() -> Dict:
+    """Returns the hit/miss counters and the overall hit rate."""
+    lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+    hits = stats["exact_hits"] + stats["semantic_hits"]
+    return {**stats, "hit_rate": hits / lookups if lookups else 0.0}
+
+def normalise_prompt(prompt: str) -> str:
+    # Callers whose prompts carry the current time key the cache on a copy without it (see
+    # ai_service's `coalesce_key`); other dates in a prompt belong to the request and stay.
+    return prompt.strip()
+
+def normalise_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", _NON_WORD.sub(" ", text.lower())).strip()
+
+def prompt_digest(prompt: str) -> str:
+    return hashlib.sha256(normalise_prompt(prompt).encode("utf-8")).hexdigest()
+
+# --- Embeddings ---
+
+def _hashing_embedding(text: str) -> List[float]:
+    """
+    A network-free embedding: word unigrams and character trigrams hashed into a fixed
+    number of buckets. crc32 is used instead of hash() so every worker produces the same vector.
+    """
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    words = normalise_text(text).split()
+    features = words + [f"#{w[i:i + 3]}" for w in (f" {w} " for w in words) for i in range(len(w) - 2)]
+    for feature in features:
+        digest = zlib.crc32(feature.encode("utf-8"))
+        vector[digest % EMBEDDING_DIMENSIONS] += 1.0 if digest & 0x80000000 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector] if norm else vector
+
+_embedding_model = None
+
+def _load_embedding_model():
+    """Loads the optional local sentence-transformers model named in the settings."""
+    global _embedding_model
+    if _embedding_model is None and settings.RESPONSE_CACHE_EMBEDDING_MODEL:
+        try:
+            from sentence_transformers import SentenceTransformer
+            _embedding_model = SentenceTransformer(settings.RESPONSE_CACHE_EMBEDDING_MODEL)
+        except Exception as e:
+            logger.warning("Could not load embedding model, using the hashing vectorizer", extra={"error": str(e)})
+            settings.RESPONSE_CACHE_EMBEDDING_MODEL = ""
+    return _embedding_model
+
+async def embed(text: str) -> List[float]:
+    model = _load_embedding_model()
+    if model is None:
+        return _hashing_embedding(text)
+    vector = await asyncio.to_thread(model.encode, normalise_text(text), normalize_embeddings=True)
+    return [float(v) for v in vector]
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    # Both vectors are L2-normalised, so the dot product is the cosine similarity.
+    return sum(x * y for x, y in zip(a, b))
+
+# --- Stores ---
+
+class MemoryStore:
+    """A per-process LRU with TTL; entries of every scope share one size limit."""
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str, Optional[List[float]]]]" = OrderedDict()
+
+    async def get(self, index: str, digest: str) -> Optional[str]:
+        entry = self._entries.get((index, digest))
+        if entry is None:
+            return None
+        expires_at, response, _ = entry
+        if expires_at < time.monotonic():
+            del self._entries[(index, digest)]
+            return None
+        self._entries.move_to_end((index, digest))
+        return response
+
+    async def set(self, index: str, digest: str, response: str, vector: Optional[List[float]]):
+        self._entries[(index, digest)] = (time.monotonic() + self.ttl_seconds, response, vector)
+        self._entries.move_to_end((index, digest))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def candidates(self, index: str) -> List[Tuple[str, List[float]]]:
+        now = time.monotonic()
+        return [(digest, vector) for (entry_index, digest), (expires_at, _, vector) in self._entries.items()
+                if entry_index == index and vector is not None and expires_at >= now]
+
+class RedisStore:
+    """
+    Shares cached responses between all workers. Each scope keeps a sorted set of
+    digests scored by last use (for LRU eviction) and a hash of their embeddings.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, index: str, digest: str) -> Optional[str]:
+        client = redis_cache.redis_client
+        response = await client.get(f"{KEY_PREFIX}:{index}:{digest}")
+        if response is None:
+            return None
+        await client.zadd(f"{KEY_PREFIX}:lru:{index}", {digest: time.time()}, xx=True)
+        return response
+
+    async def set(self, index: str, digest: str, response: str, vector: Optional[List[float]]):
+        client = redis_cache.redis_client
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.set(f"{KEY_PREFIX}:{index}:{digest}", response, ex=self.ttl_seconds)
+            pipe.zadd(f"{KEY_PREFIX}:lru:{index}", {digest: time.time()})
+            if vector is not None:
+                pipe.hset(f"{KEY_PREFIX}:vec:{index}", digest, base64.b64encode(array.array("f", vector).tobytes()).decode("ascii"))
+            pipe.expire(f"{KEY_PREFIX}:lru:{index}", self.ttl_seconds)
+            pipe.expire(f"{KEY_PREFIX}:vec:{index}", self.ttl_seconds)
+            pipe.zcard(f"{KEY_PREFIX}:lru:{index}")
+            *_, size = await pipe.execute()
+        if size > self.max_entries:
+            evicted = [digest for digest, _ in await client.zpopmin(f"{KEY_PREFIX}:lru:{index}", size - self.max_entries)]
+            if evicted:
+                await client.hdel(f"{KEY_PREFIX}:vec:{index}", *evicted)
+                await client.delete(*(f"{KEY_PREFIX}:{index}:{digest}" for digest in evicted))
+
+    async def candidates(self, index: str) -> List[Tuple[str, List[float]]]:
+        encoded = await redis_cache.redis_client.hgetall(f"{KEY_PREFIX}:vec:{index}")
+        return [(digest, array.array("f", base64.b64decode(value)).tolist()) for digest, value in encoded.items()]
+
+_memory_store = MemoryStore(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_TTL_SECONDS)
+_redis_store = RedisStore(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_TTL_SECONDS)
+
+def _backend():
+    # Falls back to the in-process store whenever Redis is unavailable.
+    if settings.RESPONSE_CACHE_BACKEND == "redis" and redis_cache.redis_client:
+        return _redis_store
+    return _memory_store
+
+# --- Public API ---
+
+async def lookup(namespace: str, scope: str, prompt: str, text: Optional[str] = None) -> Optional[str]:
+    """
+    Looks up a cached response. `namespace` separates prompt families (e.g. "nlu", "chat"),
+    `scope` is a user email or "global", and `text` (usually the user's message) enables
+    the similarity tier. Returns None on a miss.
+    """
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return None
+    index = f"{namespace}:{scope}"
+    store = _backend()
+    try:
+        response = await store.get(index, prompt_digest(prompt))
+        if response is not None:
+            stats["exact_hits"] += 1
+            observability.cache_result(f"response_{namespace}", True)
+            return response
+        if text:
+            vector = await embed(text)
+            best_digest, best_score = None, settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD
+            for digest, candidate in await store.candidates(index):
+                score = _cosine(vector, candidate)
+                if score >= best_score:
+                    best_digest, best_score = digest, score
+            if best_digest:
+                response = await store.get(index, best_digest)
+                if response is not None:
+                    stats["semantic_hits"] += 1
+                    observability.cache_result(f"response_{namespace}", True)
+                    return response
+    except Exception as e:
+        logger.warning("Response cache lookup failed", extra={"error": str(e)})
+    stats["misses"] += 1
+    observability.cache_result(f"response_{namespace}", False)
+    return None
+
+async def store(namespace: str, scope: str, prompt: str, response: str, text: Optional[str] = None):
+    """Stores a response under the prompt's exact key and, when `text` is given, its embedding."""
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return
+    try:
+        vector = await embed(text) if text else None
+        await _backend().set(f"{namespace}:{scope}", prompt_digest(prompt), response, vector)
+        stats["stores"] += 1
+    except Exception as e:
+        logger.warning("Response cache store failed", extra={"error": str(e)})
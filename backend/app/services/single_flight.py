@@ -0,0 +1,149 @@
+# backend/app/services/single_flight.py
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Tuple
+
+from app import observability
+from app.config import settings
+from app.services import redis_cache
+
+logger = logging.getLogger(__name__)
+
+# Single-flight coalescing of identical LLM calls.
+# Concurrent callers with the same key share one call: the first becomes the leader and starts it
+# as a detached task, so the leader's client disconnecting does not fail everyone else, and the
+# rest await that task. A finished result is kept for SINGLE_FLIGHT_WINDOW_SECONDS to answer
+# identical calls that arrive just after, such as client retries.
+# Across workers the leader also takes a Redis lock (SET NX PX) and publishes its result under a
+# result key for the same window. A leader that finds the lock taken polls the result key instead
+# of calling the provider; if the lock goes away without a result (its holder failed, or the
+# result was not one to share), the next poller takes the lock and makes the call itself.
+
+KEY_PREFIX = "singleflight"
+
+# KEYS: lock key. ARGV: holder token. Deletes the lock only if this holder still owns it.
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_in_flight: Dict[str, asyncio.Task] = {}
+# key -> callers sharing the in-flight call, the leader included
+_group_sizes: Dict[str, int] = {}
+# key -> (expiry on the monotonic clock, result)
+_recent: Dict[str, Tuple[float, str]] = {}
+_release_script = None
+_release_script_client = None
+stats = {"leaders": 0, "coalesced": 0, "window_hits": 0, "remote_hits": 0, "remote_timeouts": 0, "redis_errors": 0}
+
+def _coalesced(source: str):
+    observability.COALESCED_REQUESTS.labels(source).inc()
+
+async def run(key: str, call: Callable[[], Awaitable[str]], share: Callable[[str], bool] = lambda result: True) -> str:
+    """
+    Returns `call()`'s result, making one call for all concurrent callers with the same `key`.
+    `share` decides whether a result may also answer later callers within the window and callers
+    in other workers; callers already waiting on the call always receive it.
+    """
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return await call()
+    recent = _recent.get(key)
+    if recent is not None:
+        if recent[0] > time.monotonic():
+            stats["window_hits"] += 1
+            _coalesced("window")
+            return recent[1]
+        del _recent[key]
+    task = _in_flight.get(key)
+    if task is None:
+        stats["leaders"] += 1
+        task = asyncio.create_task(_lead(key, call, share))
+        _in_flight[key] = task
+        _group_sizes[key] = 1
+        task.add_done_callback(lambda _: _finish(key))
+    else:
+        stats["coalesced"] += 1
+        _group_sizes[key] += 1
+        _coalesced("in_flight")
+    # A caller that is cancelled stops waiting; the shared call carries on for the others.
+    return await asyncio.shield(task)
+
+def _finish(key: str):
+    _in_flight.pop(key, None)
+    observability.COALESCED_GROUP_SIZE.observe(_group_sizes.pop(key, 1))
+
+def _remember(key: str, result: str):
+    now = time.monotonic()
+    # Drop expired results so the table cannot grow without bound.
+    for stale in [stale for stale, (expires, _) in _recent.items() if expires <= now]:
+        del _recent[stale]
+    _recent[key] = (now + settings.SINGLE_FLIGHT_WINDOW_SECONDS, result)
+
+async def _lead(key: str, call: Callable[[], Awaitable[str]], share: Callable[[str], bool]) -> str:
+    if settings.SINGLE_FLIGHT_DISTRIBUTED and redis_cache.redis_client:
+        result = await _lead_across_workers(key, call, share)
+    else:
+        result = await call()
+    if settings.SINGLE_FLIGHT_WINDOW_SECONDS > 0 and share(result):
+        _remember(key, result)
+    return result
+
+async def _lead_across_workers(key: str, call: Callable[[], Awaitable[str]], share: Callable[[str], bool]) -> str:
+    client = redis_cache.redis_client
+    lock_key, result_key = f"{KEY_PREFIX}:lock:{key}", f"{KEY_PREFIX}:result:{key}"
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_LOCK_SECONDS
+    try:
+        while True:
+            # One round trip: another worker's result, or the lock for this one.
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.get(result_key)
+                pipe.set(lock_key, token, px=int(settings.SINGLE_FLIGHT_LOCK_SECONDS * 1000), nx=True)
+                result, locked = await pipe.execute()
+            if result is not None:
+                if locked:
+                    await _release(client, lock_key, token)
+                stats["remote_hits"] += 1
+                _coalesced("remote")
+                return result
+            if locked:
+                break
+            if time.monotonic() >= deadline:
+                stats["remote_timeouts"] += 1
+                return await call()
+            await asyncio.sleep(settings.SINGLE_FLIGHT_POLL_SECONDS)
+    except Exception as e:
+        stats["redis_errors"] += 1
+        logger.warning("Single flight could not reach Redis, coalescing in this worker only", extra={"error": str(e)})
+        return await call()
+
+    try:
+        result = await call()
+        if share(result):
+            try:
+                # Kept for at least a second, so workers polling for it do not miss it.
+                await client.set(result_key, result, px=max(int(settings.SINGLE_FLIGHT_WINDOW_SECONDS * 1000), 1000))
+            except Exception as e:
+                stats["redis_errors"] += 1
+                logger.warning("Single flight could not publish a result", extra={"error": str(e)})
+        return result
+    finally:
+        try:
+            await _release(client, lock_key, token)
+        except Exception as e:
+            stats["redis_errors"] += 1
+            logger.warning("Single flight could not release its lock; it expires by itself", extra={"error": str(e)})
+
+async def _release(client, lock_key: str, token: str):
+    global _release_script, _release_script_client
+    if _release_script_client is not client:
+        _release_script, _release_script_client = client.register_script(_RELEASE_SCRIPT), client
+    await _release_script(keys=[lock_key], args=[token])
+
+def get_stats() -> Dict:
+    return {**stats, "in_flight": len(_in_flight)}
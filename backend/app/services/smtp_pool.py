@@ -0,0 +1,155 @@
+# backend/app/services/smtp_pool.py
+
+import smtplib
+import threading
+import time
+from collections import defaultdict, deque
+from email.message import Message
+from typing import Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from app.config import settings
+
+# One long-lived, logged-in SMTP connection per Celery worker process.
+# Opening a connection per email pays a TCP + TLS handshake and an AUTH exchange every time.
+# The session is reused across tasks: after SMTP_IDLE_CHECK_SECONDS without traffic it is
+# checked with NOOP before use, it is replaced after SMTP_MAX_MESSAGES_PER_CONNECTION messages
+# (providers cap messages per session), and a send that finds it dropped reconnects once and retries.
+
+class SMTPSession:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        password: str,
+        use_ssl: bool,
+        starttls: bool,
+        timeout: float,
+        idle_check_seconds: float,
+        max_messages: int,
+    ):
+        self.host, self.port = host, port
+        self.username, self.password = username, password
+        self.use_ssl, self.starttls = use_ssl, starttls
+        self.timeout = timeout
+        self.idle_check_seconds = idle_check_seconds
+        self.max_messages = max_messages
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._messages = 0
+        # Celery's threads pool can run tasks of one process concurrently; SMTP is one conversation at a time.
+        self._lock = threading.Lock()
+        self.stats = {"connects": 0, "messages": 0, "noops": 0, "reconnects": 0}
+
+    def _connect(self):
+        self.close()
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        self._server = server
+        self._messages = 0
+        self.stats["connects"] += 1
+
+    def _ensure_connected(self):
+        if self._server is None or self._messages >= self.max_messages:
+            self._connect()
+        elif time.monotonic() - self._last_used > self.idle_check_seconds:
+            # Servers drop idle sessions; find out now rather than halfway through a message.
+            self.stats["noops"] += 1
+            try:
+                healthy = self._server.noop()[0] == 250
+            except (smtplib.SMTPException, OSError):
+                healthy = False
+            if not healthy:
+                self.stats["reconnects"] += 1
+                self._connect()
+
+    def send(self, msg: Message):
+        """Sends one message over the shared session, reconnecting once if the session was lost."""
+        with self._lock:
+            self._ensure_connected()
+            try:
+                self._server.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPSenderRefused, OSError):
+                # SMTPSenderRefused is how some servers answer on a session they have timed out.
+                self.stats["reconnects"] += 1
+                self._connect()
+                self._server.send_message(msg)
+            self._messages += 1
+            self._last_used = time.monotonic()
+            self.stats["messages"] += 1
+
+    def close(self):
+        server, self._server = self._server, None
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+
+def from_settings() -> SMTPSession:
+    return SMTPSession(
+        settings.MAIL_SERVER,
+        settings.MAIL_PORT,
+        settings.MAIL_USERNAME,
+        settings.MAIL_PASSWORD,
+        use_ssl=settings.MAIL_SSL_TLS,
+        starttls=settings.MAIL_STARTTLS,
+        timeout=settings.SMTP_TIMEOUT_SECONDS,
+        idle_check_seconds=settings.SMTP_IDLE_CHECK_SECONDS,
+        max_messages=settings.SMTP_MAX_MESSAGES_PER_CONNECTION,
+    )
+
+_session: Optional[SMTPSession] = None
+_session_lock = threading.Lock()
+
+def get_session() -> SMTPSession:
+    """Returns this process's shared session, created on first use (after the Celery worker has forked)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = from_settings()
+    return _session
+
+def close_session():
+    global _session
+    if _session is not None:
+        _session.close()
+        _session = None
+
+class DomainThrottle:
+    """
+    Spaces out sends to each recipient domain to at most `per_second`, so a batch of reminders for
+    one provider does not trip its rate limits. Different domains do not wait for each other.
+    """
+    def __init__(self, per_second: float, clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self.clock, self.sleep = clock, sleep
+        self._next_allowed: Dict[str, float] = {}
+
+    def drain(self, items: Iterable[Tuple[str, object]]):
+        """
+        Yields (domain, item) pairs from `items` in a throttled order: whichever domain may send
+        soonest goes next, and the generator sleeps only when every waiting domain is throttled.
+        """
+        queues: Dict[str, Deque] = defaultdict(deque)
+        for domain, item in items:
+            queues[domain.lower()].append(item)
+        while queues:
+            domain = min(queues, key=lambda d: self._next_allowed.get(d, 0.0))
+            wait = self._next_allowed.get(domain, 0.0) - self.clock()
+            if wait > 0:
+                self.sleep(wait)
+            self._next_allowed[domain] = max(self.clock(), self._next_allowed.get(domain, 0.0)) + self.interval
+            yield domain, queues[domain].popleft()
+            if not queues[domain]:
+                del queues[domain]
+
+def recipient_domain(address: str) -> str:
+    return address.rpartition("@")[2]
@@ -0,0 +1,299 @@
+# backend/app/services/task_bulk.py
+
+import json
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import dateparser
+from bson import ObjectId, errors
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.config import settings
+from app.services import reminder_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Bulk task operations and NDJSON import/export for clients that sync whole task lists.
+# A bulk request is checked item by item against one find() of the tasks it names, written with
+# one unordered bulk_write (a failed item does not stop the rest), and every touched task's
+# reminder is scheduled or cancelled in one Redis pipeline each. Each item gets its own result.
+# Exports stream a user's documents from a cursor as NDJSON; imports read NDJSON from the request
+# body line by line and write IMPORT_BATCH_SIZE lines per round trip, so neither side ever holds
+# the whole data set in memory.
+
+DUE_DATE_FORMAT = "%Y-%m-%d %H:%M"
+MAX_LINE_BYTES = 64 * 1024
+MAX_REPORTED_ERRORS = 100
+
+_RESULT_STATUS = {"create": "created", "update": "updated", "done": "done", "delete": "deleted"}
+_REMINDER_PROJECTION = {"email": 1, "content": 1, "due_date_str": 1, "status": 1}
+
+def parse_due_date(value: Optional[str]) -> Optional[datetime]:
+    """Parses a stored due date; the usual "YYYY-MM-DD HH:MM" form skips dateparser, which is far slower."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, DUE_DATE_FORMAT)
+    except ValueError:
+        return dateparser.parse(value)
+
+def reminder_due(task: dict) -> Optional[datetime]:
+    """When the task's reminder should go out, or None when it should have none (done, undated or past)."""
+    if task.get("status") != "pending":
+        return None
+    due_date = parse_due_date(task.get("due_date_str"))
+    return due_date if due_date and due_date > datetime.now() else None
+
+async def sync_reminders(tasks: Iterable[dict], removed_ids: Iterable[str] = ()):
+    """
+    Schedules, moves or cancels the reminders of `tasks` to match them as stored, and cancels those
+    of `removed_ids`, with one schedule and one cancel pipeline for all of them.
+    """
+    scheduled, cancelled = [], list(removed_ids)
+    for task in tasks:
+        due_date = reminder_due(task)
+        if due_date:
+            scheduled.append((str(task["_id"]), task["email"], task["content"], due_date))
+        else:
+            cancelled.append(str(task["_id"]))
+    await reminder_scheduler.schedule_many(scheduled)
+    await reminder_scheduler.cancel_many(cancelled)
+
+def _failed(index: int, message: str, task_id: Optional[str] = None) -> Dict:
+    return {"index": index, "id": task_id, "status": "error", "error": message}
+
+async def apply(operations: List[Dict], user_email: str, tasks: AsyncIOMotorCollection) -> List[Dict]:
+    """
+    Applies create / update / done / delete operations to the user's tasks and returns one result
+    per operation, in order: {"index", "id", "status"} where status is created, updated, done,
+    deleted or error (with an "error" message). A task may appear only once per request.
+    """
+    results: List[Optional[Dict]] = [None] * len(operations)
+    targets: Dict[int, ObjectId] = {}
+    for index, operation in enumerate(operations):
+        if operation["op"] == "create":
+            continue
+        try:
+            task_id = ObjectId(operation.get("id"))
+        except (errors.InvalidId, TypeError):
+            results[index] = _failed(index, "Invalid task ID.", operation.get("id"))
+            continue
+        if task_id in targets.values():
+            # Unordered writes may run in any order, so two operations on one task would race.
+            results[index] = _failed(index, "The task appears more than once in this request.", str(task_id))
+            continue
+        targets[index] = task_id
+
+    # The user's tasks named in the request, with what their reminders need, in one query.
+    existing = {}
+    if targets:
+        cursor = tasks.find({"_id": {"$in": list(targets.values())}, "email": user_email}, _REMINDER_PROJECTION)
+        existing = {task["_id"]: task async for task in cursor}
+
+    # (operation index, task id, task as it will be stored, or None once deleted), one per write.
+    planned: List[Tuple[int, ObjectId, Optional[Dict]]] = []
+    writes = []
+    now = datetime.utcnow()
+    for index, operation in enumerate(operations):
+        if results[index] is not None:
+            continue
+        kind = operation["op"]
+        if kind == "create":
+            if not operation.get("content") or not operation.get("due_date"):
+                results[index] = _failed(index, "A new task needs content and a due_date.")
+                continue
+            task = {"_id": ObjectId(), "email": user_email, "content": operation["content"], "due_date_str": operation["due_date"], "status": "pending", "created_at": now}
+            writes.append(InsertOne(task))
+            planned.append((index, task["_id"], task))
+            continue
+        task = existing.get(targets[index])
+        if task is None:
+            results[index] = _failed(index, "Task not found.", str(targets[index]))
+            continue
+        selector = {"_id": task["_id"], "email": user_email}
+        if kind == "update":
+            changes = {field: operation[key] for key, field in (("content", "content"), ("due_date", "due_date_str")) if operation.get(key) is not None}
+            if not changes:
+                results[index] = _failed(index, "No update data provided.", str(task["_id"]))
+                continue
+            writes.append(UpdateOne(selector, {"$set": changes}))
+            planned.append((index, task["_id"], {**task, **changes}))
+        elif kind == "done":
+            writes.append(UpdateOne(selector, {"$set": {"status": "done"}}))
+            planned.append((index, task["_id"], {**task, "status": "done"}))
+        else:
+            writes.append(DeleteOne(selector))
+            planned.append((index, task["_id"], None))
+
+    write_errors: Dict[int, str] = {}
+    if writes:
+        try:
+            await tasks.bulk_write(writes, ordered=False)
+        except BulkWriteError as e:
+            write_errors = {error["index"]: error.get("errmsg", "The write failed.") for error in e.details.get("writeErrors", [])}
+            logger.warning("Bulk task write partly failed", extra={"writes": len(writes), "failed": len(write_errors)})
+
+    stored, removed_ids = [], []
+    for position, (index, task_id, task) in enumerate(planned):
+        if position in write_errors:
+            results[index] = _failed(index, write_errors[position], str(task_id))
+            continue
+        results[index] = {"index": index, "id": str(task_id), "status": _RESULT_STATUS[operations[index]["op"]]}
+        if task is None:
+            removed_ids.append(str(task_id))
+        else:
+            stored.append(task)
+    await sync_reminders(stored, removed_ids)
+    return results
+
+# --- NDJSON export ---
+
+def _line(record: Dict) -> bytes:
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode()
+
+def _isoformat(value) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else None
+
+async def export_tasks(user_email: str, tasks: AsyncIOMotorCollection) -> AsyncIterator[bytes]:
+    """Yields the user's tasks, done and pending, as NDJSON lines in the format import_tasks reads."""
+    # Sorted along the (email, status, created_at, _id) index, so the export needs no in-memory sort.
+    cursor = (tasks.find({"email": user_email}, {"content": 1, "due_date_str": 1, "status": 1, "created_at": 1})
+              .sort([("status", 1), ("created_at", 1), ("_id", 1)]).batch_size(settings.EXPORT_BATCH_SIZE))
+    async for task in cursor:
+        yield _line({"id": str(task["_id"]), "content": task.get("content"), "due_date": task.get("due_date_str"),
+                     "status": task.get("status"), "created_at": _isoformat(task.get("created_at"))})
+
+async def export_chat_logs(user_email: str, chat_logs: AsyncIOMotorCollection) -> AsyncIterator[bytes]:
+    """Yields the user's chat log, oldest first, as NDJSON lines in the format import_chat_logs reads."""
+    cursor = (chat_logs.find({"email": user_email}, {"sender": 1, "text": 1, "timestamp": 1})
+              .sort([("timestamp", 1), ("_id", 1)]).batch_size(settings.EXPORT_BATCH_SIZE))
+    async for message in cursor:
+        yield _line({"sender": message.get("sender"), "text": message.get("text"), "timestamp": _isoformat(message.get("timestamp"))})
+
+# --- NDJSON import ---
+
+class InvalidRecord(ValueError):
+    """An import line that is valid JSON but not a valid record; it is reported and skipped."""
+
+async def _records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """Splits a byte stream into NDJSON records: yields (line number, record or None, error or None). Blank lines are skipped."""
+    buffer = b""
+    line_number = 0
+
+    def parse(raw: bytes):
+        try:
+            record = json.loads(raw)
+        except ValueError:
+            return None, "Not valid JSON."
+        return (record, None) if isinstance(record, dict) else (None, "Each line must be a JSON object.")
+
+    too_long = f"Lines may be at most {MAX_LINE_BYTES} bytes."
+    skipping = False
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for raw in lines:
+            line_number += 1
+            if skipping:
+                # The end of an over-long line; its start was already dropped.
+                skipping = False
+                yield line_number, None, too_long
+            elif raw.strip():
+                yield (line_number, *parse(raw))
+        if len(buffer) > MAX_LINE_BYTES:
+            buffer, skipping = b"", True
+    if skipping:
+        yield line_number + 1, None, too_long
+    elif buffer.strip():
+        yield (line_number + 1, *parse(buffer))
+
+def _timestamp(value, default: datetime) -> datetime:
+    """Reads an ISO 8601 timestamp as the naive UTC datetime the collections store."""
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        raise InvalidRecord("Timestamps must be ISO 8601 strings.")
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidRecord("Timestamps must be ISO 8601 strings.")
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+def _text(record: Dict, field: str) -> str:
+    value = record.get(field)
+    if not isinstance(value, str) or not value:
+        raise InvalidRecord(f'"{field}" must be a non-empty string.')
+    return value
+
+def _task_from(record: Dict, user_email: str, now: datetime) -> Dict:
+    status = record.get("status", "pending")
+    if status not in ("pending", "done"):
+        raise InvalidRecord('"status" must be "pending" or "done".')
+    return {"_id": ObjectId(), "email": user_email, "content": _text(record, "content"), "due_date_str": _text(record, "due_date"),
+            "status": status, "created_at": _timestamp(record.get("created_at"), now)}
+
+def _message_from(record: Dict, user_email: str, now: datetime) -> Dict:
+    if record.get("sender") not in ("user", "assistant"):
+        raise InvalidRecord('"sender" must be "user" or "assistant".')
+    return {"email": user_email, "sender": record["sender"], "text": _text(record, "text"), "timestamp": _timestamp(record.get("timestamp"), now)}
+
+async def _import(chunks: AsyncIterator[bytes], user_email: str, collection: AsyncIOMotorCollection, build, on_written=None) -> Dict:
+    summary = {"imported": 0, "failed": 0, "errors": []}
+    batch: List[Tuple[int, Dict]] = []
+
+    def fail(line: int, message: str):
+        summary["failed"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"line": line, "error": message})
+
+    async def write():
+        documents = [document for _, document in batch]
+        failed = {}
+        try:
+            await collection.bulk_write([InsertOne(document) for document in documents], ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"]: error.get("errmsg", "The write failed.") for error in e.details.get("writeErrors", [])}
+        for position, (line, _) in enumerate(batch):
+            if position in failed:
+                fail(line, failed[position])
+        summary["imported"] += len(batch) - len(failed)
+        if on_written:
+            await on_written([document for position, document in enumerate(documents) if position not in failed])
+        batch.clear()
+
+    now = datetime.utcnow()
+    async for line, record, error in _records(chunks):
+        if error:
+            fail(line, error)
+            continue
+        try:
+            batch.append((line, build(record, user_email, now)))
+        except InvalidRecord as e:
+            fail(line, str(e))
+            continue
+        if len(batch) >= settings.IMPORT_BATCH_SIZE:
+            await write()
+    if batch:
+        await write()
+    return summary
+
+async def import_tasks(chunks: AsyncIterator[bytes], user_email: str, tasks: AsyncIOMotorCollection) -> Dict:
+    """
+    Creates a task for every NDJSON line ({"content", "due_date", optional "status" and "created_at"},
+    as written by export_tasks; an "id" is ignored, imports always create new tasks) and schedules
+    the reminders of pending ones. Returns {"imported", "failed", "errors": [{"line", "error"}]}.
+    """
+    async def schedule(written: List[Dict]):
+        await reminder_scheduler.schedule_many(
+            (str(task["_id"]), task["email"], task["content"], due_date) for task in written if (due_date := reminder_due(task)))
+    return await _import(chunks, user_email, tasks, _task_from, schedule)
+
+async def import_chat_logs(chunks: AsyncIterator[bytes], user_email: str, chat_logs: AsyncIOMotorCollection) -> Dict:
+    """
+    Adds a chat log record for every NDJSON line ({"sender", "text", optional "timestamp"}, as written
+    by export_chat_logs). The Redis conversation context is left as it is. Returns the same summary as import_tasks.
+    """
+    return await _import(chunks, user_email, chat_logs, _message_from)
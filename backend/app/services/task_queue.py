@@ -0,0 +1,109 @@
+# backend/app/services/task_queue.py
+
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app import observability
+from app.celery_worker import celery_app
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Publishes Celery tasks for request handlers without blocking the event loop.
+# `send_task` is blocking network I/O against the broker, so requests only put the task on an
+# in-process queue and return; a background task drains it and publishes everything waiting
+# (up to TASK_ENQUEUE_BATCH_SIZE) from a worker thread over one pooled producer connection.
+# Until `start` is called (e.g. in scripts or the Celery worker), tasks are published right away
+# from a worker thread instead.
+
+# (task name, positional args, send_task options such as countdown)
+TaskMessage = Tuple[str, List, Dict]
+
+_PUBLISH_ATTEMPTS = 3
+
+def publish(messages: List[TaskMessage]):
+    """
+    Blocking: publishes the tasks in order over one producer connection from the pool.
+    Published tasks are removed from `messages`, so after an error it holds only the unpublished
+    ones and a retry does not send any task twice.
+    """
+    with observability.span("celery_publish", tasks=len(messages)), celery_app.producer_or_acquire() as producer:
+        while messages:
+            name, args, options = messages[0]
+            celery_app.send_task(name, args=args, producer=producer, **options)
+            observability.TASKS_ENQUEUED.labels(name).inc()
+            del messages[0]
+
+class TaskEnqueuer:
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"tasks": 0, "batches": 0, "failed_tasks": 0, "queue_full_waits": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Starts the background publisher; called on application startup."""
+        if not self.running:
+            self._queue = asyncio.Queue(maxsize=settings.TASK_ENQUEUE_QUEUE_MAX)
+            self._task = asyncio.create_task(self._run())
+
+    async def enqueue_many(self, messages: Iterable[TaskMessage]):
+        """Queues several tasks at once, e.g. everything one chat message triggers; they are published together."""
+        messages = list(messages)
+        if not messages:
+            return
+        if not self.running:
+            await self._publish(messages)
+            return
+        for message in messages:
+            if self._queue.full():
+                self.stats["queue_full_waits"] += 1
+            await self._queue.put(message)
+
+    async def enqueue(self, name: str, args: Optional[List] = None, **options):
+        """Queues one task for publishing; `options` are passed to send_task (e.g. countdown)."""
+        await self.enqueue_many([(name, list(args or []), options)])
+
+    async def _run(self):
+        while True:
+            batch: List[TaskMessage] = [await self._queue.get()]
+            # Everything that queued up while the last batch was being published goes out together.
+            while batch[-1] is not None and len(batch) < settings.TASK_ENQUEUE_BATCH_SIZE and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if batch[-1] is None:
+                # Shutdown sentinel: publish what is left and stop.
+                await self._publish(batch[:-1])
+                return
+            await self._publish(batch)
+
+    async def _publish(self, batch: List[TaskMessage]):
+        if not batch:
+            return
+        size = len(batch)
+        for attempt in range(1, _PUBLISH_ATTEMPTS + 1):
+            try:
+                await asyncio.to_thread(publish, batch)
+                self.stats["tasks"] += size
+                self.stats["batches"] += 1
+                return
+            except Exception as e:
+                if attempt == _PUBLISH_ATTEMPTS:
+                    self.stats["tasks"] += size - len(batch)
+                    self.stats["failed_tasks"] += len(batch)
+                    logger.error("Could not publish Celery tasks, dropping them", extra={"tasks": len(batch), "error": str(e)})
+                    return
+                await asyncio.sleep(0.5 * attempt)
+
+    async def close(self):
+        """Publishes what is queued and stops the publisher; called on application shutdown."""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+enqueuer = TaskEnqueuer()
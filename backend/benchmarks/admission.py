@@ -0,0 +1,164 @@
+# backend/benchmarks/admission.py
+
+"""
+Replays a traffic spike against stubbed providers with admission control off and on.
+
+Each provider can serve --capacity concurrent calls (the fallbacks half as many); calls beyond
+that fail at once, as they do when every API key is out of quota. The spike is --users users
+sending --per-user chat messages each, one noisy user sending --noisy messages, and --background
+conversation summaries, all arriving within --ramp-ms.
+
+For each class the script reports calls answered by a provider, calls that got the "all of my AI
+services are unavailable" reply, calls shed with a 429, and the latency of the answered ones.
+Without admission control the spike overruns the providers, their circuits open and most callers
+get the unavailable reply; with it, calls beyond the cap queue by priority or are shed up front,
+and the regular users' messages are answered ahead of the noisy user's and the summaries.
+
+In production the summaries run in the Celery worker, whose admission controller is not the API's.
+The last two runs model that with a second controller for the summaries: once without Redis, where
+nothing stops the worker from taking its own share of slots on top of the API's, and once with
+(fake) Redis, where the shared slot leases make the summaries wait for the chat traffic.
+
+Run from the backend directory:
+    python -m benchmarks.admission --capacity 8 --users 40 --per-user 3 --noisy 60 --background 40
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import time
+
+# Dummy settings so the app modules import without a .env file.
+for _name, _value in {
+    "DATABASE_URL": "mongodb://localhost:27017", "SECRET_KEY": "bench", "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "GEMINI_API_KEYS": "bench-key", "COHERE_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "MAIL_PORT": "465", "MAIL_SERVER": "localhost", "MAIL_STARTTLS": "false", "MAIL_SSL_TLS": "true",
+    "LOG_LEVEL": "ERROR",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import fakeredis
+from app.config import settings
+from app.services import admission, ai_service, dispatcher, redis_cache
+
+class QuotaExceeded(Exception):
+    pass
+
+def _stub_provider(capacity: int, latency: float):
+    in_flight = [0]
+    async def _call(prompt: str) -> str:
+        if in_flight[0] >= capacity:
+            raise QuotaExceeded("429: quota exceeded")
+        in_flight[0] += 1
+        try:
+            await asyncio.sleep(latency * random.uniform(0.8, 1.2))
+            return f"answer to {prompt}"
+        finally:
+            in_flight[0] -= 1
+    return _call
+
+async def _call(label: str, prompt: str, user, priority: str, delay: float, outcomes: dict):
+    await asyncio.sleep(delay)
+    start = time.perf_counter()
+    try:
+        response = await ai_service.generate_ai_response(prompt, user=user, priority=priority)
+    except admission.Rejected:
+        outcomes[label]["shed"] += 1
+        return
+    if response == ai_service.ALL_SERVICES_UNAVAILABLE_MESSAGE:
+        outcomes[label]["unavailable"] += 1
+    else:
+        outcomes[label]["ok"] += 1
+        outcomes[label]["latencies"].append(time.perf_counter() - start)
+
+async def _worker_call(worker: admission.AdmissionController, prompt: str, delay: float, outcomes: dict):
+    """A summary in the Celery worker: the worker's own controller, then the same providers."""
+    await asyncio.sleep(delay)
+    start = time.perf_counter()
+    try:
+        slot = await worker.acquire(admission.BACKGROUND)
+    except admission.Rejected:
+        outcomes["background"]["shed"] += 1
+        return
+    try:
+        await dispatcher.dispatch(prompt, [("gemini", ai_service._try_gemini), ("cohere", ai_service._try_cohere), ("anthropic", ai_service._try_anthropic)])
+    except Exception:
+        outcomes["background"]["unavailable"] += 1
+        return
+    finally:
+        slot.release()
+    outcomes["background"]["ok"] += 1
+    outcomes["background"]["latencies"].append(time.perf_counter() - start)
+
+async def _spike(label: str, enabled: bool, args, worker_process: bool = False, shared=None) -> dict:
+    settings.ADMISSION_ENABLED = enabled
+    settings.ADMISSION_MAX_CONCURRENT = args.capacity
+    admission.controller = admission.AdmissionController(args.capacity, settings.ADMISSION_QUEUE_MAX, settings.ADMISSION_BACKGROUND_MAX_SHARE)
+    worker = admission.AdmissionController(args.capacity, settings.ADMISSION_QUEUE_MAX, settings.ADMISSION_BACKGROUND_MAX_SHARE)
+    redis_cache.redis_client = shared
+    admission._local_buckets.clear()
+    admission.user_stats.update(allowed=0, shed=0, redis_errors=0)
+    dispatcher._providers.clear()
+    latency = args.llm_ms / 1000
+    ai_service._try_gemini = _stub_provider(args.capacity, latency)
+    ai_service._try_cohere = _stub_provider(max(args.capacity // 2, 1), latency)
+    ai_service._try_anthropic = _stub_provider(max(args.capacity // 2, 1), latency)
+
+    ramp = args.ramp_ms / 1000
+    outcomes = {label: {"ok": 0, "unavailable": 0, "shed": 0, "latencies": []} for label in ("users", "noisy user", "background")}
+    calls = [("users", f"user {u} message {m}", f"user{u}@example.com", admission.INTERACTIVE) for u in range(args.users) for m in range(args.per_user)]
+    calls += [("noisy user", f"noisy message {m}", "noisy@example.com", admission.INTERACTIVE) for m in range(args.noisy)]
+    summaries = [f"summary {s}" for s in range(args.background)]
+    if not worker_process:
+        calls += [("background", prompt, None, admission.BACKGROUND) for prompt in summaries]
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(_call(label, prompt, user, priority, random.uniform(0, ramp), outcomes) for label, prompt, user, priority in calls),
+        *(_worker_call(worker, prompt, random.uniform(0, ramp), outcomes) for prompt in summaries if worker_process),
+    )
+    elapsed = time.perf_counter() - start
+
+    print(f"{label}: {len(calls) + (len(summaries) if worker_process else 0)} calls in {elapsed:.1f}s")
+    for label, outcome in outcomes.items():
+        latencies = sorted(outcome["latencies"])
+        timing = (f"p50 {statistics.median(latencies) * 1000:6.0f}ms  p99 {latencies[int(0.99 * (len(latencies) - 1))] * 1000:6.0f}ms"
+                  if latencies else "")
+        print(f"  {label:<11} answered {outcome['ok']:>4}  unavailable {outcome['unavailable']:>4}  shed {outcome['shed']:>4}  {timing}")
+    if enabled:
+        print("  admission:", admission.get_stats())
+    if worker_process:
+        print("  worker admission:", worker.get_stats())
+    return outcomes
+
+async def main(args):
+    random.seed(args.seed)
+    # Opened circuits and failed keys are the point of the "off" run; their warnings are not needed.
+    logging.getLogger("app").setLevel(logging.ERROR)
+    # Distinct prompts and no cache, so every call needs a provider.
+    settings.RESPONSE_CACHE_ENABLED = False
+    settings.SINGLE_FLIGHT_ENABLED = False
+    await _spike("admission control off", False, args)
+    await asyncio.sleep(0.1)
+    await _spike("admission control on", True, args)
+    await asyncio.sleep(0.1)
+    await _spike("on, summaries in the worker, no Redis", True, args, worker_process=True)
+    await asyncio.sleep(0.1)
+    await _spike("on, summaries in the worker, shared leases", True, args, worker_process=True,
+                 shared=fakeredis.aioredis.FakeRedis(decode_responses=True))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capacity", type=int, default=8, help="Concurrent calls the primary provider accepts.")
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--per-user", type=int, default=3)
+    parser.add_argument("--noisy", type=int, default=60, help="Messages from one user sending far more than the rest.")
+    parser.add_argument("--background", type=int, default=40, help="Conversation summaries queued during the spike.")
+    parser.add_argument("--llm-ms", type=float, default=300.0)
+    parser.add_argument("--ramp-ms", type=float, default=2000.0, help="The spike's calls arrive spread over this long.")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
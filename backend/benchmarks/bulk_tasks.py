@@ -0,0 +1,186 @@
+# backend/benchmarks/bulk_tasks.py
+
+"""
+Compares syncing a task list one request per task against the bulk endpoints.
+
+A client creates --tasks tasks, updates all of them and marks them done, first with the
+per-task endpoints (POST /chat/tasks, PUT /chat/tasks/{id}, PUT /chat/tasks/{id}/done), then
+with one POST /chat/tasks/bulk per step. It then exports the tasks as NDJSON and imports them
+again. Each HTTP request costs --rtt-ms, like the client's network round trip, and each Mongo
+round trip costs --mongo-ms; the script reports requests, Mongo round trips and wall time per
+step, and checks that both paths leave the same tasks and reminders behind.
+
+The app runs in-process against mongomock and fakeredis unless --mongo-url is given.
+
+Run from the backend directory:
+    python -m benchmarks.bulk_tasks --tasks 200 --rtt-ms 20 --mongo-ms 1
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+# Dummy settings so the app modules import without a .env file.
+for _name, _value in {
+    "DATABASE_URL": "mongodb://localhost:27017", "SECRET_KEY": "bench", "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "GEMINI_API_KEYS": "bench-key", "COHERE_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "MAIL_PORT": "465", "MAIL_SERVER": "localhost", "MAIL_STARTTLS": "false", "MAIL_SSL_TLS": "true",
+    "LOG_LEVEL": "ERROR",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import fakeredis
+import httpx
+from app import security
+from app.database import db_client, get_tasks_collection
+from app.main import app
+from app.routers import chat
+from app.services import redis_cache, reminder_scheduler
+
+class LatencyCollection:
+    """Wraps a collection so every round trip costs `latency` seconds and is counted."""
+    def __init__(self, collection, latency: float):
+        self._collection = collection
+        self.latency = latency
+        self.round_trips = 0
+
+    async def _trip(self):
+        self.round_trips += 1
+        await asyncio.sleep(self.latency)
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+        async def call(*args, **kwargs):
+            await self._trip()
+            return await method(*args, **kwargs)
+        return call
+
+    def find(self, *args, **kwargs):
+        return LatencyCursor(self, self._collection.find(*args, **kwargs))
+
+class LatencyCursor:
+    """Charges one round trip per batch, as a driver cursor does."""
+    def __init__(self, owner: LatencyCollection, cursor):
+        self._owner = owner
+        self._cursor = cursor
+        self._batch_size = 101
+        self._served = 0
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def batch_size(self, size: int):
+        self._batch_size = size
+        self._cursor = self._cursor.batch_size(size)
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._served % self._batch_size == 0:
+            await self._owner._trip()
+        self._served += 1
+        return await self._cursor.__anext__()
+
+class RoundTripTransport(httpx.AsyncBaseTransport):
+    """ASGI transport that adds a network round trip to every request and counts them."""
+    def __init__(self, rtt: float):
+        self._inner = httpx.ASGITransport(app=app)
+        self.rtt = rtt
+        self.requests = 0
+
+    async def handle_async_request(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.rtt)
+        return await self._inner.handle_async_request(request)
+
+async def _step(label: str, transport: RoundTripTransport, tasks: LatencyCollection, work):
+    requests, trips = transport.requests, tasks.round_trips
+    start = time.perf_counter()
+    result = await work()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<22} {transport.requests - requests:>5} requests  {tasks.round_trips - trips:>5} Mongo round trips  {elapsed * 1000:8.0f}ms")
+    return result
+
+async def _tasks(client: httpx.AsyncClient) -> list:
+    response = await client.get("/chat/tasks/export")
+    return sorted((task["content"], task["due_date"], task["status"]) for task in map(json.loads, response.text.splitlines()))
+
+async def _per_task(client: httpx.AsyncClient, count: int):
+    ids = []
+    for i in range(count):
+        response = await client.post("/chat/tasks", json={"content": f"task {i}", "due_date": f"2099-01-01 {i % 24:02d}:00"})
+        ids.append(response.json()["task_id"])
+    return ids
+
+async def _one_by_one(requests):
+    # One request after another, as a client working through its list does.
+    return [await request for request in requests]
+
+async def run(args):
+    if args.mongo_url:
+        from app.config import settings
+        settings.DATABASE_URL = args.mongo_url
+    else:
+        import mongomock.collection
+        from mongomock_motor import AsyncMongoMockClient
+        db_client._client = AsyncMongoMockClient()
+        # mongomock does not accept the `sort` option newer pymongo versions pass for UpdateOne.
+        add_update = mongomock.collection.BulkOperationBuilder.add_update
+        mongomock.collection.BulkOperationBuilder.add_update = lambda self, *a, sort=None, **k: add_update(self, *a, **k)
+    redis_cache.redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    logging.getLogger("app").setLevel(logging.ERROR)
+
+    tasks = LatencyCollection(db_client.get_tasks_collection(), args.mongo_ms / 1000)
+    app.dependency_overrides[get_tasks_collection] = lambda: tasks
+    transport = RoundTripTransport(args.rtt_ms / 1000)
+    outcomes = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for label in ("per task", "bulk"):
+            user = f"{label.replace(' ', '-')}-{time.time_ns()}@example.com"
+            app.dependency_overrides[chat.get_current_user] = lambda user=user: security.TokenData(username=user)
+            reminders = await reminder_scheduler.scheduled_count()
+            print(label)
+            if label == "per task":
+                ids = await _step("create", transport, tasks, lambda: _per_task(client, args.tasks))
+                await _step("update", transport, tasks, lambda: _one_by_one(
+                    [client.put(f"/chat/tasks/{task_id}", json={"content": f"task {i} (edited)"}) for i, task_id in enumerate(ids)]))
+                await _step("done", transport, tasks, lambda: _one_by_one([client.put(f"/chat/tasks/{task_id}/done") for task_id in ids[: args.tasks // 2]]))
+            else:
+                async def bulk(operations):
+                    response = await client.post("/chat/tasks/bulk", json={"operations": operations})
+                    return [result["id"] for result in response.json()["results"]]
+                ids = await _step("create", transport, tasks, lambda: bulk(
+                    [{"op": "create", "content": f"task {i}", "due_date": f"2099-01-01 {i % 24:02d}:00"} for i in range(args.tasks)]))
+                await _step("update", transport, tasks, lambda: bulk(
+                    [{"op": "update", "id": task_id, "content": f"task {i} (edited)"} for i, task_id in enumerate(ids)]))
+                await _step("done", transport, tasks, lambda: bulk([{"op": "done", "id": task_id} for task_id in ids[: args.tasks // 2]]))
+            outcomes.append((await _tasks(client), await reminder_scheduler.scheduled_count() - reminders))
+
+        exported = await _step("export", transport, tasks, lambda: client.get("/chat/tasks/export"))
+        importer = security.TokenData(username=f"import-{time.time_ns()}@example.com")
+        app.dependency_overrides[chat.get_current_user] = lambda: importer
+        imported = await _step("import", transport, tasks, lambda: client.post("/chat/tasks/import", content=exported.content))
+        outcomes.append((await _tasks(client), None))
+    app.dependency_overrides.clear()
+
+    (per_task, per_task_reminders), (bulk_tasks, bulk_reminders), (imported_tasks, _) = outcomes
+    print(f"reminders left scheduled: per task {per_task_reminders}, bulk {bulk_reminders}; imported {imported.json()['imported']} lines")
+    ok = per_task == bulk_tasks == imported_tasks and per_task_reminders == bulk_reminders
+    print("check:", "ok" if ok else "FAILED")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=float, default=20.0, help="Client network round trip per HTTP request.")
+    parser.add_argument("--mongo-ms", type=float, default=1.0, help="Latency of each Mongo round trip.")
+    parser.add_argument("--mongo-url", help="A real MongoDB to run against instead of mongomock.")
+    raise SystemExit(asyncio.run(run(parser.parse_args())))
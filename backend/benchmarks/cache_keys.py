@@ -0,0 +1,73 @@
+# backend/benchmarks/cache_keys.py
+
+"""
+Checks how the response cache keys NLU prompts, which carry the current time to the second.
+Sends messages through nlu.get_structured_intent and nlu.get_intent_and_reply with a stub LLM
+that counts its calls and answers with the date in the user's message:
+
+  same message, later clock     must be answered from the cache (one provider call)
+  different dates in messages   must each reach the provider and get their own answer
+
+The clock is moved by swapping nlu's `datetime` for one that returns a fixed time.
+
+Run from the backend directory:
+    python -m benchmarks.cache_keys
+"""
+
+import asyncio
+import os
+import re
+from datetime import datetime
+
+# Dummy settings so the app modules import without a .env file.
+for _name, _value in {
+    "DATABASE_URL": "mongodb://localhost:27017", "SECRET_KEY": "bench", "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "GEMINI_API_KEYS": "bench-key", "COHERE_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "MAIL_PORT": "465", "MAIL_SERVER": "localhost", "MAIL_STARTTLS": "false", "MAIL_SSL_TLS": "true",
+    "LOG_LEVEL": "ERROR", "ADMISSION_ENABLED": "false",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from app.services import ai_service, nlu, redis_cache
+
+_USER_DATE = re.compile(r'User\'s message: "is (\d{4}-\d{2}-\d{2} \d{2}:\d{2}) free\?"')
+
+class _Clock(datetime):
+    now_value = datetime(2026, 10, 18, 14, 0, 5)
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.now_value
+
+async def main() -> int:
+    redis_cache.redis_client = None
+    calls = []
+    async def stub(prompt: str) -> str:
+        calls.append(prompt)
+        return f'{{"action": "general_chat", "reply": "{_USER_DATE.search(prompt).group(1)} is free"}}'
+    ai_service._try_gemini = stub
+    nlu.datetime = _Clock
+
+    ok = True
+    for label, ask in (
+        ("intent", lambda message: nlu.get_structured_intent(message)),
+        ("intent+reply", lambda message: nlu.get_intent_and_reply(message, "", "", "bench@example.com")),
+    ):
+        calls.clear()
+        _Clock.now_value = datetime(2026, 10, 18, 14, 0, 5)
+        first = await ask("is 2026-10-20 10:00 free?")
+        _Clock.now_value = datetime(2026, 10, 18, 14, 0, 47)
+        again = await ask("is 2026-10-20 10:00 free?")
+        reused = first == again and len(calls) == 1
+        other = await ask("is 2026-10-25 10:00 free?")
+        separate = len(calls) == 2 and other.get("reply", "").startswith("2026-10-25")
+        ok &= reused and separate
+        print(f"{label:<13} later clock: {'cache hit' if reused else 'WRONG'}; "
+              f"different user date: {'own answer' if separate else 'WRONG'}; provider calls {len(calls)}")
+    print("check:", "ok" if ok else "FAILED")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
@@ -0,0 +1,68 @@
+# backend/benchmarks/chat_concurrency.py
+
+"""
+Compares concurrent chat throughput of the old blocking provider calls against
+the async provider path, with every provider stubbed out so no network is used.
+
+Run from the backend directory:
+    python -m benchmarks.chat_concurrency --requests 200 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+# Dummy settings so the app modules import without a .env file.
+for _name, _value in {
+    "DATABASE_URL": "mongodb://localhost:27017", "SECRET_KEY": "bench", "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "GEMINI_API_KEYS": "bench-key", "COHERE_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "MAIL_PORT": "465", "MAIL_SERVER": "localhost", "MAIL_STARTTLS": "false", "MAIL_SSL_TLS": "true",
+    # Both runs send the same messages, so every call must reach the stubbed provider.
+    "RESPONSE_CACHE_ENABLED": "false", "SINGLE_FLIGHT_ENABLED": "false",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from app.services import ai_service, nlu
+
+def _blocking_stub(latency: float):
+    """Simulates the old synchronous SDK call, which held the event loop for the whole request."""
+    async def _call(prompt: str) -> str:
+        time.sleep(latency)
+        return '{"action": "general_chat"}'
+    return _call
+
+def _async_stub(latency: float):
+    """Simulates an async SDK call, which yields to other requests while waiting on the network."""
+    async def _call(prompt: str) -> str:
+        await asyncio.sleep(latency)
+        return '{"action": "general_chat"}'
+    return _call
+
+async def _one_chat(message: str):
+    # The general-chat path: one NLU call followed by one generation call.
+    await nlu.get_structured_intent(message)
+    await ai_service.generate_ai_response(prompt=message)
+
+async def _run(label: str, stub, requests: int) -> float:
+    ai_service._try_gemini = stub
+    start = time.perf_counter()
+    await asyncio.gather(*(_one_chat(f"hello {i}") for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {requests} chats in {elapsed:7.2f}s  ->  {requests / elapsed:8.1f} chats/s")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Concurrent chat messages to send.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stubbed provider latency in seconds.")
+    args = parser.parse_args()
+
+    before = asyncio.run(_run("blocking", _blocking_stub(args.latency), args.requests))
+    after = asyncio.run(_run("async", _async_stub(args.latency), args.requests))
+    print(f"speedup: {before / after:.1f}x")
+
+if __name__ == "__main__":
+    main()
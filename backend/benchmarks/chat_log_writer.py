@@ -0,0 +1,104 @@
+# backend/benchmarks/chat_log_writer.py
+
+"""
+Measures what the write-behind chat log writer saves on the request path.
+A stand-in collection charges a fixed latency per Mongo round trip and counts the write
+operations. Chat turns are persisted concurrently, once with the old two insert_one calls
+per turn and once through chat_log_writer, and the script reports the write operations, the
+time each turn spends persisting, and checks that every record was written in order.
+
+Run from the backend directory:
+    python -m benchmarks.chat_log_writer --turns 5000 --concurrency 200 --latency-ms 2
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from datetime import datetime
+
+# Dummy settings so the app modules import without a .env file.
+for _name, _value in {
+    "DATABASE_URL": "mongodb://localhost:27017", "SECRET_KEY": "bench", "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "GEMINI_API_KEYS": "bench-key", "COHERE_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "MAIL_PORT": "465", "MAIL_SERVER": "localhost", "MAIL_STARTTLS": "false", "MAIL_SSL_TLS": "true",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from app.services import chat_log_writer
+
+class StandInCollection:
+    """Counts write round trips; each one costs `latency` seconds, like a network hop to Mongo."""
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.operations = 0
+        self.documents = []
+
+    async def insert_one(self, document):
+        self.operations += 1
+        await asyncio.sleep(self.latency)
+        self.documents.append(document)
+
+    async def insert_many(self, documents, ordered=True):
+        self.operations += 1
+        await asyncio.sleep(self.latency)
+        self.documents.extend(documents)
+
+async def old_persist(collection: StandInCollection, user: str, turn: int):
+    await collection.insert_one({"email": user, "sender": "user", "text": f"q{turn}", "timestamp": datetime.utcnow()})
+    await collection.insert_one({"email": user, "sender": "assistant", "text": f"a{turn}", "timestamp": datetime.utcnow()})
+
+async def new_persist(collection: StandInCollection, user: str, turn: int):
+    await chat_log_writer.writer.write({"email": user, "sender": "user", "text": f"q{turn}"}, {"email": user, "sender": "assistant", "text": f"a{turn}"})
+
+async def _run(label: str, persist, collection: StandInCollection, turns: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+
+    async def one(turn: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await persist(collection, f"user{turn % 100}", turn)
+            durations.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(turn) for turn in range(turns)))
+    # The writer's shutdown flush is part of the cost of getting everything stored.
+    await chat_log_writer.writer.close()
+    elapsed = time.perf_counter() - start
+    durations.sort()
+    print(f"{label:<13} {collection.operations:>6} write ops  "
+          f"persist mean {statistics.mean(durations) * 1000:7.3f}ms  p99 {durations[int(0.99 * (len(durations) - 1))] * 1000:7.3f}ms  "
+          f"total {elapsed:6.2f}s")
+
+def _check(collection: StandInCollection, turns: int) -> bool:
+    records = sorted(collection.documents, key=lambda record: record["timestamp"])
+    complete = len(records) == turns * 2
+    # Within each user's log, every question must be directly followed by its answer.
+    in_order = True
+    for user in {record["email"] for record in records}:
+        log = [record["text"] for record in records if record["email"] == user]
+        in_order &= all(log[i][0] == "q" and log[i + 1] == "a" + log[i][1:] for i in range(0, len(log), 2))
+    print(f"write-behind: {len(records)} of {turns * 2} records stored, turns {'in order' if in_order else 'OUT OF ORDER'}")
+    return complete and in_order
+
+async def main(turns: int, concurrency: int, latency: float):
+    collection = StandInCollection(latency)
+    await _run("insert_one x2", old_persist, collection, turns, concurrency)
+
+    collection = StandInCollection(latency)
+    chat_log_writer.get_chat_log_collection = lambda: collection
+    chat_log_writer.writer.start()
+    await _run("write-behind", new_persist, collection, turns, concurrency)
+    raise SystemExit(0 if _check(collection, turns) else 1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.concurrency, args.latency_ms / 1000))
@@ -0,0 +1,152 @@
+# backend/benchmarks/conversation_context.py
+
+"""
+Compares the two ways of recording a chat turn in the Redis conversation context:
+the old read-modify-write of a JSON string (GET + SET per message, two messages per turn)
+and the list-based append (one RPUSH + LTRIM + EXPIRE transaction per turn).
+
+The benchmark reports Redis round trips and time per turn. The concurrency check then
+records many turns for the same user at once with the trim disabled and counts the
+messages that survived: read-modify-write loses updates, the list append must not, and
+every user message must still be followed by its own assistant reply.
+
+Run from the backend directory (needs a Redis server, or fakeredis with --fake):
+    python -m benchmarks.conversation_context --turns 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+# Dummy settings so the app modules import without a .env file.
+for _name, _value in {
+    "DATABASE_URL": "mongodb://localhost:27017", "SECRET_KEY": "bench", "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "GEMINI_API_KEYS": "bench-key", "COHERE_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "MAIL_PORT": "465", "MAIL_SERVER": "localhost", "MAIL_STARTTLS": "false", "MAIL_SSL_TLS": "true",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+from app.services import redis_cache
+
+round_trips = 0
+
+def _count_round_trips():
+    # Every command sent on its own, and every pipeline, is one round trip to Redis.
+    execute_command, execute = redis.Redis.execute_command, Pipeline.execute
+
+    async def counted_command(self, *args, **kwargs):
+        global round_trips
+        if not isinstance(self, Pipeline):
+            round_trips += 1
+        return await execute_command(self, *args, **kwargs)
+
+    async def counted_execute(self, *args, **kwargs):
+        global round_trips
+        round_trips += 1
+        return await execute(self, *args, **kwargs)
+
+    redis.Redis.execute_command = counted_command
+    Pipeline.execute = counted_execute
+
+async def _read_modify_write(session_id: str, message: dict):
+    # The previous set_conversation_context, kept here for comparison.
+    client = redis_cache.redis_client
+    context_json = await client.get(session_id)
+    context = json.loads(context_json) if context_json else []
+    context.append(message)
+    await client.set(session_id, json.dumps(context[-redis_cache.CONTEXT_MAX_MESSAGES:]), ex=redis_cache.CONTEXT_EXPIRATION_SECONDS)
+
+async def old_turn(session_id: str, turn: int):
+    await _read_modify_write(session_id, {"role": "user", "content": f"question {turn}"})
+    await _read_modify_write(session_id, {"role": "assistant", "content": f"answer {turn}"})
+
+async def old_read(session_id: str):
+    context_json = await redis_cache.redis_client.get(session_id)
+    return json.loads(context_json) if context_json else []
+
+async def new_turn(session_id: str, turn: int):
+    await redis_cache.append_conversation_context(
+        session_id, {"role": "user", "content": f"question {turn}"}, {"role": "assistant", "content": f"answer {turn}"})
+
+async def _record(turn_func, session_id: str, turns: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(turn: int):
+        async with semaphore:
+            await turn_func(session_id, turn)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(turn) for turn in range(turns)))
+    return time.perf_counter() - start
+
+async def benchmark(turns: int, concurrency: int):
+    global round_trips
+    print(f"{'':<20} {'round trips/turn':>16} {'ms/turn':>8} {'turns/s':>9}")
+    for label, turn_func, session_id in (("read-modify-write", old_turn, "bench-old"), ("list append", new_turn, "bench-new")):
+        await redis_cache.clear_conversation_context(session_id)
+        round_trips = 0
+        # One session per simulated user, so no turns race on the same key here.
+        elapsed = await _record(lambda _, turn: turn_func(f"{session_id}-{turn % concurrency}", turn), session_id, turns, concurrency)
+        print(f"{label:<20} {round_trips / turns:>16.1f} {elapsed / turns * 1000:>8.3f} {turns / elapsed:>9.0f}")
+        for user in range(concurrency):
+            await redis_cache.clear_conversation_context(f"{session_id}-{user}")
+
+async def concurrency_check(turns: int, concurrency: int) -> bool:
+    # Disable the trim so every message that was written can be counted.
+    max_messages, redis_cache.CONTEXT_MAX_MESSAGES = redis_cache.CONTEXT_MAX_MESSAGES, turns * 2
+    try:
+        await redis_cache.clear_conversation_context("check-old")
+        await _record(old_turn, "check-old", turns, concurrency)
+        old = await old_read("check-old")
+        print(f"read-modify-write: {len(old)} of {turns * 2} messages kept ({turns * 2 - len(old)} lost)")
+
+        await redis_cache.clear_conversation_context("check-new")
+        await _record(new_turn, "check-new", turns, concurrency)
+        new = await redis_cache.get_conversation_context("check-new")
+        pairs_intact = all(
+            new[i]["role"] == "user" and new[i + 1]["content"] == new[i]["content"].replace("question", "answer")
+            for i in range(0, len(new), 2)
+        )
+        print(f"list append:       {len(new)} of {turns * 2} messages kept ({turns * 2 - len(new)} lost), "
+              f"turns {'kept together' if pairs_intact else 'INTERLEAVED'}")
+    finally:
+        redis_cache.CONTEXT_MAX_MESSAGES = max_messages
+        await redis_cache.redis_client.delete("check-old")
+        await redis_cache.clear_conversation_context("check-new")
+
+    # With the normal trim, only the latest messages remain.
+    for turn in range(turns):
+        await new_turn("check-trim", turn)
+    trimmed = await redis_cache.get_conversation_context("check-trim")
+    await redis_cache.clear_conversation_context("check-trim")
+    trim_ok = len(trimmed) == redis_cache.CONTEXT_MAX_MESSAGES and trimmed[-1]["content"] == f"answer {turns - 1}"
+    print(f"trim: {len(trimmed)} messages kept, newest last: {'yes' if trim_ok else 'NO'}")
+    return len(new) == turns * 2 and pairs_intact and trim_ok
+
+async def main(turns: int, concurrency: int, redis_url: str, fake: bool):
+    if fake:
+        import fakeredis
+        redis_cache.redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    else:
+        redis_cache.redis_client = redis.Redis.from_url(redis_url, decode_responses=True)
+    _count_round_trips()
+    await benchmark(turns, concurrency)
+    print()
+    ok = await concurrency_check(min(turns, 500), concurrency)
+    await redis_cache.redis_client.aclose()
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/0")
+    parser.add_argument("--fake", action="store_true", help="use fakeredis instead of a Redis server")
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.concurrency, args.redis_url, args.fake))
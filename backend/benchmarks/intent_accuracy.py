@@ -0,0 +1,131 @@
+# backend/benchmarks/intent_accuracy.py
+
+"""
+Measures the offline intent engine against the labelled corpus in intent_corpus.jsonl.
+Every local answer is checked against the JSON schema the LLM NLU prompt produces,
+and its fields are compared with the label. Relative dates resolve against a fixed
+clock (Monday 2024-05-06 09:00) so the corpus stays reproducible.
+
+Run from the backend directory:
+    python -m benchmarks.intent_accuracy
+    python -m benchmarks.intent_accuracy --classifier model.pkl
+    python -m benchmarks.intent_accuracy --llm    # also asks the configured LLM providers
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+# Dummy settings so the app modules import without a .env file.
+for _name, _value in {
+    "DATABASE_URL": "mongodb://localhost:27017", "SECRET_KEY": "bench", "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "GEMINI_API_KEYS": "bench-key", "COHERE_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "MAIL_PORT": "465", "MAIL_SERVER": "localhost", "MAIL_STARTTLS": "false", "MAIL_SSL_TLS": "true",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from app.services import intent_engine
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "intent_corpus.jsonl")
+FIXED_NOW = datetime(2024, 5, 6, 9, 0)
+_DATETIME_FORMAT = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}$")
+
+def schema_errors(result: dict) -> list:
+    """Returns the ways a result deviates from the LLM NLU prompt's output schema."""
+    errors = []
+    action = result.get("action")
+    if action not in ("create_task", "fetch_tasks", "save_fact", "general_chat"):
+        return [f"unknown action {action!r}"]
+    data = result.get("data")
+    if action == "create_task":
+        if not isinstance(data, dict):
+            return ["create_task without data"]
+        for field in ("title", "datetime", "priority", "category", "notes"):
+            if field not in data:
+                errors.append(f"missing data.{field}")
+        if not _DATETIME_FORMAT.match(str(data.get("datetime"))):
+            errors.append("datetime is not YYYY-MM-DD HH:MM")
+        if data.get("priority") not in ("high", "medium", "low"):
+            errors.append("invalid priority")
+        if data.get("category") not in ("work", "personal", "general"):
+            errors.append("invalid category")
+    elif action == "save_fact":
+        if not isinstance(data, dict) or not data.get("key") or not data.get("value"):
+            errors.append("save_fact needs data.key and data.value")
+    return errors
+
+def matches(result: dict, expected: dict) -> bool:
+    if result.get("action") != expected["action"]:
+        return False
+    for field, value in expected.get("data", {}).items():
+        got = (result.get("data") or {}).get(field)
+        if str(got).strip().lower() != str(value).strip().lower():
+            return False
+    return True
+
+def load_corpus():
+    with open(CORPUS_PATH) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def run_local(corpus, verbose: bool):
+    answered = correct = schema_failures = 0
+    start = time.perf_counter()
+    for item in corpus:
+        result = intent_engine.classify(item["message"], now=FIXED_NOW)
+        if result is None:
+            if verbose:
+                print(f"  deferred  {item['message']!r}")
+            continue
+        answered += 1
+        errors = schema_errors(result)
+        schema_failures += bool(errors)
+        ok = matches(result, item["expected"]) and not errors
+        correct += ok
+        if verbose and not ok:
+            print(f"  MISMATCH  {item['message']!r}\n            got {result} {errors or ''}\n            expected {item['expected']}")
+    elapsed = time.perf_counter() - start
+
+    stats = intent_engine.get_stats()
+    print(f"corpus size:          {len(corpus)}")
+    print(f"answered locally:     {answered} ({answered / len(corpus):.0%} hit rate)")
+    print(f"local accuracy:       {correct}/{answered} ({(correct / answered if answered else 0):.1%})")
+    print(f"schema violations:    {schema_failures}")
+    print(f"mean latency:         {elapsed / len(corpus) * 1000:.2f} ms/message")
+    for stage, value in stats["mean_latency_ms"].items():
+        print(f"  {stage:<10} {value:.3f} ms")
+
+async def run_llm(corpus):
+    """Compares the local answers with what the LLM prompt returns for the same messages."""
+    from app.services import nlu
+    agree = compared = 0
+    for item in corpus:
+        local = intent_engine.classify(item["message"], now=FIXED_NOW)
+        if local is None:
+            continue
+        remote = await nlu.get_structured_intent(item["message"])
+        compared += 1
+        agree += remote.get("action") == local["action"]
+    print(f"LLM action agreement: {agree}/{compared}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--classifier", help="Path to a pickled scikit-style classifier to enable stage 2.")
+    parser.add_argument("--llm", action="store_true", help="Also compare local answers with the live LLM prompt.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print every deferred or mismatched message.")
+    args = parser.parse_args()
+
+    if args.classifier:
+        intent_engine.load_classifier(args.classifier)
+    corpus = load_corpus()
+    run_local(corpus, args.verbose)
+    if args.llm:
+        asyncio.run(run_llm(corpus))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+# backend/benchmarks/load_test.py
+
+"""
+Load test of the whole API against local stand-ins for every external dependency, with
+machine-readable results so regressions in the chat pipeline can be caught numerically.
+
+  Mongo    mongomock-motor, or a real mongod with --mongo-url
+  Redis    fakeredis, or a real server with --redis-url
+  LLMs     an in-process HTTP server that plays Gemini, Cohere and Anthropic. It answers after
+           --llm-ms (+/- 50% jitter) and returns 429 for a --llm-429 fraction of calls, so key
+           cooldowns, provider fallbacks and hedging all run. Cohere and Anthropic are the real
+           SDK clients pointed at it; Gemini is a thin client that raises ResourceExhausted on 429.
+  Celery   Kombu's in-memory broker, drained by a stand-in worker thread that runs the reminder
+           email tasks (other tasks are only counted)
+  SMTP     an aiosmtpd server that accepts every message
+
+The app runs in-process with its lifespan (reminder poller, write-behind chat log, task enqueuer)
+behind httpx's ASGI transport. For each --concurrency level, that many virtual users run closed
+loops of mixed traffic for --duration seconds: LLM chat, rule-handled chat, task create / list /
+update / done, and logins, weighted by --mix. Some created tasks are due a few seconds later, so
+their reminders go through the scheduler, the broker and the stand-in worker to the SMTP server.
+
+For every level the JSON report holds throughput and p50/p95/p99/max latency per operation,
+error counts, event-loop lag (overshoot of a 10ms ticker) and the app's own counters. With
+--baseline, the run is compared with an earlier report and the script exits with status 1 if
+any operation's p95 grew, or its throughput fell, by more than --tolerance.
+
+Requires fakeredis, mongomock-motor and aiosmtpd. Run from the backend directory:
+    python -m benchmarks.load_test --concurrency 1,8,32 --duration 10 --output load.json
+    python -m benchmarks.load_test --concurrency 1,8,32 --duration 10 --baseline load.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+# Dummy settings so the app modules import without a .env file. Mail and the broker always go to
+# the stand-ins; logs are kept to errors so they do not drown the report. Virtual users log in and
+# chat far faster than people do, so the per-user limits are lifted unless set in the environment.
+for _name, _value in {
+    "DATABASE_URL": "mongodb://localhost:27017", "SECRET_KEY": "bench", "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "GEMINI_API_KEYS": "bench-key-1,bench-key-2,bench-key-3", "COHERE_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "maya@example.com",
+    "LOGIN_RATE_LIMIT_PER_ACCOUNT": "1000000", "LOGIN_RATE_LIMIT_PER_IP": "1000000", "ADMISSION_USER_RATE_PER_MINUTE": "0",
+    "LOG_LEVEL": "ERROR",
+}.items():
+    os.environ.setdefault(_name, _value)
+os.environ.update({
+    "MAIL_SERVER": "127.0.0.1", "MAIL_PORT": str(_free_port()), "MAIL_STARTTLS": "false", "MAIL_SSL_TLS": "false",
+    "CELERY_BROKER_URL": "memory://", "CELERY_RESULT_BACKEND": "cache+memory://",
+})
+
+import anthropic
+import cohere
+import fakeredis
+import httpx
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+from google.api_core import exceptions
+from mongomock_motor import AsyncMongoMockClient
+from app.celery_worker import celery_app
+from app.config import settings
+from app.database import db_client
+from app.main import app
+from app.services import (
+    admission, ai_service, chat_log_writer, dispatcher, key_scheduler, profile_cache, provider_pool,
+    redis_cache, reminder_scheduler, response_cache, single_flight, task_queue,
+)
+
+PASSWORD = "correct horse battery staple"
+DEFAULT_MIX = "chat=40,chat_rule=10,task_create=15,task_list=15,task_update=8,task_done=7,login=5"
+# Share of created tasks due --reminder-delay seconds later, so their reminders are sent during the run.
+DUE_SOON_FRACTION = 0.2
+
+# --- Stand-ins ---
+
+class StubLLMServer:
+    """
+    A keep-alive HTTP/1.1 server for all three providers: /gemini (the thin client below),
+    /v1/chat (Cohere) and /v1/messages (Anthropic). NLU prompts get a general_chat JSON object.
+    """
+    def __init__(self, latency: float, rate_limited_fraction: float, seed: int):
+        self.latency = latency
+        self.rate_limited_fraction = rate_limited_fraction
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.rate_limited = Counter()
+
+    @staticmethod
+    def _text(prompt: str) -> str:
+        if "JSON Response:" not in prompt:
+            return "This is the stand-in model's reply."
+        if '"reply"' in prompt:
+            return json.dumps({"action": "general_chat", "reply": "This is the stand-in model's reply."})
+        return json.dumps({"action": "general_chat"})
+
+    def _respond(self, path: str, request: dict):
+        if path.endswith("/messages"):
+            provider, prompt = "anthropic", request["messages"][0]["content"]
+        elif path.endswith("/chat"):
+            provider, prompt = "cohere", request["message"]
+        else:
+            provider, prompt = f"gemini:{request['key']}", request["prompt"]
+        self.calls[provider] += 1
+        if self.random.random() < self.rate_limited_fraction:
+            self.rate_limited[provider] += 1
+            return 429, {"type": "error", "error": {"type": "rate_limit_error", "message": "stand-in rate limit"}, "message": "stand-in rate limit"}
+        text = self._text(prompt)
+        if provider == "anthropic":
+            return 200, {
+                "id": "msg_bench", "type": "message", "role": "assistant", "model": request["model"],
+                "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+                "usage": {"input_tokens": 1, "output_tokens": 1},
+            }
+        if provider == "cohere":
+            return 200, {"text": text, "generation_id": "bench", "finish_reason": "COMPLETE"}
+        return 200, {"text": text}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                length = 0
+                for line in header_lines:
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                body = json.loads(await reader.readexactly(length) or b"{}")
+                await asyncio.sleep(self.latency * self.random.uniform(0.5, 1.5))
+                status, payload = self._respond(request_line.split(" ")[1].split("?")[0], body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Too Many Requests'}\r\n"
+                    f"Content-Type: application/json\r\nConnection: keep-alive\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError, asyncio.CancelledError):
+            # Clients hang up, or the benchmark ends with keep-alive connections still open.
+            pass
+        finally:
+            writer.close()
+
+class StubGeminiModel:
+    """Stands in for genai.GenerativeModel: one POST per call, with the key, over a shared pool."""
+    def __init__(self, client: httpx.AsyncClient, api_key: str):
+        self.client = client
+        self.api_key = api_key
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        response = await self.client.post("/gemini", json={"key": self.api_key, "prompt": prompt})
+        if response.status_code == 429:
+            raise exceptions.ResourceExhausted("stand-in rate limit")
+        response.raise_for_status()
+        return SimpleNamespace(text=response.json()["text"])
+
+class StandInSMTPHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+class StandInWorker(threading.Thread):
+    """Drains the in-memory broker and runs the reminder email tasks, as the Celery worker would."""
+    EMAIL_TASKS = ("send_reminder_email", "send_reminder_emails")
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.stop = threading.Event()
+        self.received = Counter()
+
+    def run(self):
+        with celery_app.connection_for_read() as connection:
+            queue = connection.SimpleQueue("celery", no_ack=True)
+            while not self.stop.is_set():
+                try:
+                    message = queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                name = message.headers["task"]
+                self.received[name] += 1
+                if name in self.EMAIL_TASKS:
+                    celery_app.tasks[name].apply(args=message.payload[0])
+
+# --- Traffic ---
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, email: str, rng: random.Random, reminder_delay: float):
+        self.client = client
+        self.email = email
+        self.random = rng
+        self.reminder_delay = reminder_delay
+        self.headers = {}
+        self.task_ids = []
+        self.sent = 0
+        self.reminders_due = 0
+
+    async def login(self):
+        response = await self.client.post("/auth/login", data={"username": self.email, "password": PASSWORD})
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+    async def chat(self):
+        self.sent += 1
+        # Distinct messages, so the response cache does not answer them without the LLM.
+        return await self.client.post("/chat/", json={"message": f"tell me something interesting, take {self.sent} from {self.email}"}, headers=self.headers)
+
+    async def chat_rule(self):
+        # Handled by the offline intent engine, without an LLM call.
+        return await self.client.post("/chat/", json={"message": "what are my tasks"}, headers=self.headers)
+
+    async def task_create(self):
+        self.sent += 1
+        due_soon = self.random.random() < DUE_SOON_FRACTION
+        due = datetime.now() + (timedelta(seconds=self.reminder_delay) if due_soon else timedelta(days=self.random.randint(1, 30)))
+        response = await self.client.post("/chat/tasks", json={"content": f"load test task {self.sent}", "due_date": due.strftime("%Y-%m-%d %H:%M:%S")}, headers=self.headers)
+        if response.status_code < 400:
+            # Due-soon tasks are left alone, so every one of their reminders should arrive.
+            if due_soon:
+                self.reminders_due += 1
+            else:
+                self.task_ids.append(response.json()["task_id"])
+        return response
+
+    async def task_list(self):
+        return await self.client.get("/chat/tasks", headers=self.headers)
+
+    async def task_update(self):
+        if not self.task_ids:
+            return await self.task_create()
+        due = datetime.now() + timedelta(days=self.random.randint(1, 30))
+        return await self.client.put(f"/chat/tasks/{self.random.choice(self.task_ids)}", json={"due_date": due.strftime("%Y-%m-%d %H:%M")}, headers=self.headers)
+
+    async def task_done(self):
+        if not self.task_ids:
+            return await self.task_create()
+        return await self.client.put(f"/chat/tasks/{self.task_ids.pop(self.random.randrange(len(self.task_ids)))}/done", headers=self.headers)
+
+def _parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if not hasattr(VirtualUser, name.strip()):
+            raise SystemExit(f"unknown operation in --mix: {name}")
+        weights[name.strip()] = float(weight)
+    return weights
+
+def _percentiles(values: list) -> dict:
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    values = sorted(values)
+    pick = lambda fraction: round(values[int(fraction * (len(values) - 1))] * 1000, 3)
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": round(values[-1] * 1000, 3)}
+
+async def _ticker(lags: list, stop: asyncio.Event, interval: float = 0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(time.perf_counter() - start - interval, 0.0))
+
+def _app_stats() -> dict:
+    return {
+        "dispatcher": dispatcher.get_stats(),
+        "key_scheduler": key_scheduler.get_stats(),
+        "response_cache": response_cache.get_stats(),
+        "single_flight": single_flight.get_stats(),
+        "admission": admission.get_stats(),
+        "profile_cache": dict(profile_cache.stats),
+        "chat_log_writer": dict(chat_log_writer.writer.stats),
+        "task_enqueuer": dict(task_queue.enqueuer.stats),
+        "reminder_scheduler": dict(reminder_scheduler.stats),
+    }
+
+async def _run_level(users: list, concurrency: int, duration: float, warmup: float, weights: dict) -> dict:
+    names, cumulative = list(weights), list(weights.values())
+    latencies, errors = defaultdict(list), Counter()
+    lags, stop = [], asyncio.Event()
+    measuring = False
+
+    async def loop(user: VirtualUser):
+        while not stop.is_set():
+            name = user.random.choices(names, cumulative)[0]
+            start = time.perf_counter()
+            try:
+                response = await getattr(user, name)()
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            if measuring:
+                latencies[name].append(time.perf_counter() - start)
+                if failed:
+                    errors[name] += 1
+
+    loops = [asyncio.create_task(loop(user)) for user in users[:concurrency]]
+    await asyncio.sleep(warmup)
+    measuring = True
+    ticker = asyncio.create_task(_ticker(lags, stop))
+    start = time.perf_counter()
+    await asyncio.sleep(duration)
+    measuring = False
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(ticker, *loops)
+
+    operations = {
+        name: {"count": len(values), "errors": errors[name], "throughput_rps": round(len(values) / elapsed, 2), **_percentiles(values)}
+        for name, values in sorted(latencies.items())
+    }
+    every = [value for values in latencies.values() for value in values]
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests": len(every),
+        "errors": sum(errors.values()),
+        "throughput_rps": round(len(every) / elapsed, 2),
+        "latency": _percentiles(every),
+        "operations": operations,
+        "event_loop_lag": {**_percentiles(lags), "mean_ms": round(statistics.mean(lags) * 1000, 3) if lags else None},
+    }
+
+def _compare(report: dict, baseline: dict, tolerance: float, min_samples: int) -> list:
+    """
+    Returns a line for every operation whose p95 or throughput is more than `tolerance` worse than
+    the baseline. Operations with fewer than `min_samples` requests in either run are too noisy to judge.
+    """
+    regressions = []
+    before = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in report["levels"]:
+        old = before.get(level["concurrency"])
+        if old is None:
+            continue
+        overall = lambda run: {**run["latency"], "count": run["requests"], "throughput_rps": run["throughput_rps"]}
+        for name, now in {"all": overall(level), **level["operations"]}.items():
+            then = overall(old) if name == "all" else old["operations"].get(name)
+            if not then or min(now["count"], then["count"]) < min_samples:
+                continue
+            if now["p95_ms"] > then["p95_ms"] * (1 + tolerance):
+                regressions.append(f"c={level['concurrency']} {name}: p95 {then['p95_ms']}ms -> {now['p95_ms']}ms")
+            if now["throughput_rps"] < then["throughput_rps"] * (1 - tolerance):
+                regressions.append(f"c={level['concurrency']} {name}: throughput {then['throughput_rps']} -> {now['throughput_rps']} req/s")
+    return regressions
+
+async def main(args) -> int:
+    weights = _parse_mix(args.mix)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    rng = random.Random(args.seed)
+
+    # Mongo and Redis.
+    if args.mongo_url:
+        settings.DATABASE_URL = args.mongo_url
+    else:
+        db_client._client = AsyncMongoMockClient()
+    redis_cache.redis_client = (
+        redis_cache.redis.Redis.from_url(args.redis_url, decode_responses=True) if args.redis_url
+        else fakeredis.aioredis.FakeRedis(decode_responses=True)
+    )
+
+    # LLM providers.
+    llm = StubLLMServer(args.llm_ms / 1000, args.llm_429, args.seed)
+    llm_listener = await asyncio.start_server(llm.handle, "127.0.0.1", 0)
+    llm_url = f"http://127.0.0.1:{llm_listener.sockets[0].getsockname()[1]}"
+    gemini_http = httpx.AsyncClient(base_url=llm_url, limits=httpx.Limits(max_connections=None, max_keepalive_connections=100))
+    gemini_models = {key: StubGeminiModel(gemini_http, key) for key in key_scheduler.gemini_scheduler.keys}
+    provider_pool.get_gemini_model = gemini_models.__getitem__
+    ai_service.cohere_client = cohere.AsyncClient("bench", base_url=llm_url)
+    ai_service.anthropic_client = anthropic.AsyncAnthropic(api_key="bench", base_url=llm_url)
+
+    # Mail and the Celery worker.
+    smtp = StandInSMTPHandler()
+    smtp_server = Controller(smtp, hostname=settings.MAIL_SERVER, port=settings.MAIL_PORT, authenticator=lambda *a: AuthResult(success=True), auth_require_tls=False)
+    smtp_server.start()
+    worker = StandInWorker()
+    worker.start()
+
+    report = {
+        "benchmark": "load_test",
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {
+            "concurrency": levels, "duration_s": args.duration, "warmup_s": args.warmup, "mix": weights,
+            "llm_ms": args.llm_ms, "llm_429": args.llm_429, "seed": args.seed,
+            "mongo": args.mongo_url or "mongomock", "redis": args.redis_url or "fakeredis",
+            "combined_nlu": settings.NLU_COMBINED_MODE, "hedging": settings.HEDGE_ENABLED,
+        },
+        "levels": [],
+    }
+    try:
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+                # Accounts are new for every run, so a real mongod or Redis can be reused without cleaning it.
+                run = f"{int(time.time())}{rng.randrange(1000):03d}"
+                users = [VirtualUser(client, f"load{i}.{run}@example.com", random.Random(rng.random()), args.reminder_delay) for i in range(max(levels))]
+                for user in users:
+                    (await client.post("/auth/register", json={"email": user.email, "password": PASSWORD})).raise_for_status()
+                    await user.login()
+                for concurrency in levels:
+                    level = await _run_level(users, concurrency, args.duration, args.warmup, weights)
+                    level["app_stats"] = _app_stats()
+                    report["levels"].append(level)
+                    print(f"c={concurrency:<4} {level['throughput_rps']:8.1f} req/s  p50 {level['latency']['p50_ms']}ms  "
+                          f"p95 {level['latency']['p95_ms']}ms  p99 {level['latency']['p99_ms']}ms  errors {level['errors']}  "
+                          f"loop lag p99 {level['event_loop_lag']['p99_ms']}ms max {level['event_loop_lag']['max_ms']}ms", file=sys.stderr)
+
+                # Reminders due during the run are sent by the poller, the stand-in worker and SMTP.
+                expected = sum(user.reminders_due for user in users)
+                deadline = time.monotonic() + args.reminder_delay + 10
+                while smtp.received < expected and time.monotonic() < deadline:
+                    await asyncio.sleep(0.2)
+    finally:
+        worker.stop.set()
+        worker.join()
+        smtp_server.stop()
+        await gemini_http.aclose()
+        await ai_service.anthropic_client.close()
+        llm_listener.close()
+
+    report["stand_ins"] = {
+        "llm_calls": dict(llm.calls), "llm_rate_limited": dict(llm.rate_limited),
+        "tasks_consumed": dict(worker.received), "emails_received": smtp.received,
+        "reminders_due_during_run": expected,
+    }
+    print(f"reminders: {smtp.received} emails received for {expected} reminders due during the run; "
+          f"LLM calls {sum(llm.calls.values())}, {sum(llm.rate_limited.values())} answered 429", file=sys.stderr)
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = _compare(report, json.load(f), args.tolerance, args.min_samples)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        print(f"baseline: {len(regressions)} regressions beyond {args.tolerance:.0%}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated virtual user counts to sweep.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per concurrency level.")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each level.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Operation weights, e.g. chat=1,login=1.")
+    parser.add_argument("--llm-ms", type=float, default=200.0, help="Mean stand-in LLM latency.")
+    parser.add_argument("--llm-429", type=float, default=0.05, help="Fraction of LLM calls answered with 429.")
+    parser.add_argument("--reminder-delay", type=float, default=3.0, help="Seconds until a due-soon task's reminder.")
+    parser.add_argument("--mongo-url", help="Use this mongod instead of mongomock.")
+    parser.add_argument("--redis-url", help="Use this Redis instead of fakeredis.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    parser.add_argument("--baseline", help="An earlier JSON report to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression against --baseline.")
+    parser.add_argument("--min-samples", type=int, default=50, help="Operations with fewer requests are not compared.")
+    raise SystemExit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,126 @@
+# backend/benchmarks/login_load.py
+
+"""
+Measures how login traffic affects chat latency.
+A stream of chat requests runs against the app while a batch of concurrent logins arrives,
+once with bcrypt called inline on the event loop (the previous login handler) and once on the
+password hashing pool. The script reports chat p50/p99 latency, the slowest chat request, login
+throughput and the hashing pool's queue metrics.
+
+Redis and Mongo are in-process stand-ins (fakeredis, mongomock-motor) and the LLM is a stub that
+answers after --llm-ms, so the chat latency measured is almost entirely time spent waiting for
+the event loop. Login rate limits are raised for the run so that every attempt reaches bcrypt.
+
+Run from the backend directory:
+    python -m benchmarks.login_load --logins 40 --chats 400 --rounds 12
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+# Dummy settings so the app modules import without a .env file.
+for _name, _value in {
+    "DATABASE_URL": "mongodb://localhost:27017", "SECRET_KEY": "bench", "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "GEMINI_API_KEYS": "bench-key", "COHERE_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "MAIL_PORT": "465", "MAIL_SERVER": "localhost", "MAIL_STARTTLS": "false", "MAIL_SSL_TLS": "true",
+    "LOGIN_RATE_LIMIT_PER_ACCOUNT": "1000000", "LOGIN_RATE_LIMIT_PER_IP": "1000000",
+    "ADMISSION_USER_RATE_PER_MINUTE": "0",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import fakeredis
+import httpx
+from mongomock_motor import AsyncMongoMockClient
+from passlib.context import CryptContext
+from app import security
+from app.database import db_client
+from app.main import app
+from app.services import ai_service, redis_cache
+
+PASSWORD = "correct horse battery staple"
+
+async def inline_check_password(plain_password, hashed_password):
+    """The previous behaviour: bcrypt runs on the event loop and blocks it."""
+    return security.pwd_context.verify_and_update(plain_password, hashed_password)
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[int(fraction * (len(values) - 1))]
+
+async def _run(label: str, client: httpx.AsyncClient, headers, logins: int, chats: int, chat_interval: float):
+    chat_latencies = []
+
+    async def chat(n: int):
+        start = time.perf_counter()
+        # Distinct messages, so the response cache does not answer them without the LLM.
+        response = await client.post("/chat/", json={"message": f"{label} question number {n}"}, headers=headers)
+        response.raise_for_status()
+        chat_latencies.append(time.perf_counter() - start)
+
+    async def chat_stream():
+        tasks = []
+        for n in range(chats):
+            tasks.append(asyncio.create_task(chat(n)))
+            await asyncio.sleep(chat_interval)
+        await asyncio.gather(*tasks)
+
+    async def login(i: int):
+        response = await client.post("/auth/login", data={"username": f"user{i}@example.com", "password": PASSWORD})
+        return response.status_code
+
+    async def login_burst():
+        # Let the chat stream settle first, so the logins land in the middle of it.
+        await asyncio.sleep(chats * chat_interval / 4)
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(login(i) for i in range(logins)))
+        return time.perf_counter() - start, statuses
+
+    _, (login_elapsed, statuses) = await asyncio.gather(chat_stream(), login_burst())
+    ok = statuses.count(200)
+    print(f"{label:<12} chat p50 {_percentile(chat_latencies, 0.5) * 1000:7.1f}ms  p99 {_percentile(chat_latencies, 0.99) * 1000:7.1f}ms  "
+          f"max {max(chat_latencies) * 1000:7.1f}ms  |  logins {ok}/{logins} ok, {ok / login_elapsed:6.1f}/s")
+    return ok == logins
+
+async def main(logins: int, chats: int, rounds: int, llm_ms: float, chat_interval: float) -> int:
+    db_client._client = AsyncMongoMockClient()
+    redis_cache.redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+    async def stub_llm(prompt, *args, **kwargs):
+        await asyncio.sleep(llm_ms / 1000)
+        return '{"action":"general_chat","reply":"hi"}' if "NLU" in prompt else "hi"
+    ai_service._try_gemini = stub_llm
+    from app.celery_worker import celery_app
+    celery_app.send_task = lambda *args, **kwargs: None
+
+    security.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+    hashed = security.pwd_context.hash(PASSWORD)
+    await db_client.get_user_collection().insert_many(
+        [{"email": f"user{i}@example.com", "hashed_password": hashed} for i in range(logins)] + [{"email": "chat@example.com", "hashed_password": hashed}])
+    headers = {"Authorization": f"Bearer {security.create_access_token({'sub': 'chat@example.com'})}"}
+    print(f"bcrypt rounds {rounds}, {logins} concurrent logins, {chats} chats every {chat_interval * 1000:.0f}ms, "
+          f"hashing pool of {security.password_hasher.workers}")
+
+    pooled_check_password = security.check_password
+    succeeded = True
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        security.check_password = inline_check_password
+        succeeded &= await _run("inline", client, headers, logins, chats, chat_interval)
+        security.check_password = pooled_check_password
+        succeeded &= await _run("pooled", client, headers, logins, chats, chat_interval)
+    print(f"hashing pool: {security.password_hasher.get_stats()}")
+    security.password_hasher.close()
+    return 0 if succeeded else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--chats", type=int, default=400)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--llm-ms", type=float, default=20.0)
+    parser.add_argument("--chat-interval-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(main(args.logins, args.chats, args.rounds, args.llm_ms, args.chat_interval_ms / 1000)))
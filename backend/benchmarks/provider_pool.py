@@ -0,0 +1,108 @@
+# backend/benchmarks/provider_pool.py
+
+"""
+Shows the connection handshakes saved by reusing pooled provider clients.
+A local HTTP stand-in for the OpenAI chat completions API counts every TCP
+connection it accepts. The same requests are sent once with a fresh client per
+request (the old behaviour) and once through provider_pool. Against the real API
+each of those connections would also pay a TLS handshake.
+
+Run from the backend directory:
+    python -m benchmarks.provider_pool --requests 200 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+# Dummy settings so the app modules import without a .env file.
+for _name, _value in {
+    "DATABASE_URL": "mongodb://localhost:27017", "SECRET_KEY": "bench", "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "GEMINI_API_KEYS": "bench-key", "COHERE_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "MAIL_PORT": "465", "MAIL_SERVER": "localhost", "MAIL_STARTTLS": "false", "MAIL_SSL_TLS": "true",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from openai import AsyncOpenAI
+from app.services import provider_pool
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-bench", "object": "chat.completion", "created": 0, "model": "gpt-3.5-turbo",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "Hello from the stand-in."}}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 5, "total_tokens": 6},
+}).encode()
+
+class StandInServer:
+    """A minimal keep-alive HTTP/1.1 server answering every request with a chat completion."""
+    def __init__(self):
+        self.connections = 0
+        self.requests = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                await reader.readexactly(length)
+                self.requests += 1
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: keep-alive\r\n"
+                    + f"Content-Length: {len(COMPLETION)}\r\n\r\n".encode() + COMPLETION
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+async def _complete(client: AsyncOpenAI):
+    await client.chat.completions.create(model="gpt-3.5-turbo", messages=[{"role": "user", "content": "hi"}])
+
+async def _fresh_client(base_url: str):
+    # The old openai_service behaviour: a new client, and so a new connection pool, per request.
+    client = AsyncOpenAI(api_key="bench-key", base_url=base_url)
+    try:
+        await _complete(client)
+    finally:
+        await client.close()
+
+async def _pooled_client(base_url: str):
+    await _complete(provider_pool.get_openai_client("bench-key", base_url=base_url))
+
+async def _run(label: str, call, base_url: str, server: StandInServer, requests: int, concurrency: int):
+    server.connections = server.requests = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await call(base_url)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {server.requests} requests over {server.connections:>4} connections "
+          f"in {elapsed:6.2f}s  ({requests / elapsed:7.1f} req/s)")
+
+async def main(requests: int, concurrency: int):
+    server = StandInServer()
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    base_url = f"http://127.0.0.1:{listener.sockets[0].getsockname()[1]}/v1"
+    async with listener:
+        await _run("per-request", _fresh_client, base_url, server, requests, concurrency)
+        await _run("pooled", _pooled_client, base_url, server, requests, concurrency)
+        await provider_pool.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
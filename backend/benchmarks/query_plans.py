@@ -0,0 +1,154 @@
+# backend/benchmarks/query_plans.py
+
+"""
+Checks that every MongoDB query the app runs is served by an index.
+Seeds a scratch database with a few users' tasks, chat logs and profiles, creates the
+indexes declared in app.database.INDEXES, then explain()s each query shape used by the
+routers and services. Any collection scan or in-memory sort is reported and makes the
+script exit non-zero, so it can gate CI. Pass --no-indexes to see the plans without them.
+
+With --static no database is needed: each query shape is matched against the index keys in
+INDEXES by the rules the query planner follows (equality fields first, then the sort keys in
+order and in one direction, then range fields), so a query or index change that loses its index
+fails without a running mongod.
+
+Run from the backend directory against a disposable MongoDB, or offline:
+    python -m benchmarks.query_plans --database-url mongodb://localhost:27017
+    python -m benchmarks.query_plans --static
+"""
+
+import argparse
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta
+
+# Dummy settings so the app modules import without a .env file.
+for _name, _value in {
+    "DATABASE_URL": "mongodb://localhost:27017", "SECRET_KEY": "bench", "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "GEMINI_API_KEYS": "bench-key", "COHERE_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "MAIL_PORT": "465", "MAIL_SERVER": "localhost", "MAIL_STARTTLS": "false", "MAIL_SSL_TLS": "true",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from app import query_audit
+from app.database import INDEXES
+from app.services import pagination
+
+EMAIL = "user0@example.com"
+CURSOR = pagination.encode_cursor({"_id": ObjectId(), "timestamp": datetime.utcnow() - timedelta(seconds=20)}, "timestamp")
+
+# (collection, filter, sort) for each query in routers/ and services/.
+QUERIES = [
+    ("users", {"email": EMAIL}, None),
+    ("user_profiles", {"email": EMAIL}, None),
+    ("tasks", {"email": EMAIL, "status": "pending"}, [("created_at", 1)]),
+    ("tasks", {"email": EMAIL, "status": "pending"}, [("created_at", -1), ("_id", -1)]),
+    ("tasks", {"email": EMAIL, "status": "done", **pagination.seek_filter("created_at", CURSOR, "$lt")}, [("created_at", -1), ("_id", -1)]),
+    ("tasks", {"_id": ObjectId(), "email": EMAIL}, None),
+    ("chat_logs", {"email": EMAIL}, [("timestamp", -1), ("_id", -1)]),
+    ("chat_logs", {"email": EMAIL, **pagination.seek_filter("timestamp", CURSOR, "$lt")}, [("timestamp", -1), ("_id", -1)]),
+    ("chat_logs", {"email": EMAIL, **pagination.seek_filter("timestamp", CURSOR, "$gt")}, [("timestamp", 1), ("_id", 1)]),
+    ("chat_logs", {"email": EMAIL, "timestamp": {"$gt": datetime(2024, 1, 1)}}, [("timestamp", 1)]),
+    ("tasks", {"_id": {"$in": [ObjectId(), ObjectId()]}, "email": EMAIL}, None),
+    ("tasks", {"email": EMAIL}, [("status", 1), ("created_at", 1), ("_id", 1)]),
+    ("chat_logs", {"email": EMAIL}, [("timestamp", 1), ("_id", 1)]),
+]
+
+def _filter_fields(query: dict):
+    """Splits a filter into (equality fields, other fields), looking inside $or clauses."""
+    equality, other = set(), set()
+    for field, condition in query.items():
+        if field == "$or":
+            for clause in condition:
+                other |= set().union(*_filter_fields(clause))
+        elif isinstance(condition, dict) and set(condition) != {"$eq"}:
+            other.add(field)
+        else:
+            equality.add(field)
+    return equality, other
+
+def covering_index(collection: str, query: dict, sort):
+    """Returns the name of an index in INDEXES that serves the query and its sort, or None."""
+    equality, other = _filter_fields(query)
+    if "_id" in equality | {field for field, condition in query.items() if isinstance(condition, dict)}:
+        return "_id_"
+    # Sorting on a field pinned by equality is free.
+    sort = [(field, direction) for field, direction in sort or [] if field not in equality]
+    for index in INDEXES.get(collection, []):
+        keys = list(index.document["key"].items())
+        fields = [field for field, _ in keys]
+        if set(fields[:len(equality)]) != equality:
+            continue
+        following = keys[len(equality):len(equality) + len(sort)]
+        if [field for field, _ in following] != [field for field, _ in sort]:
+            continue
+        flips = {direction == index_direction for (_, direction), (_, index_direction) in zip(sort, following)}
+        if len(flips) > 1 or not other <= set(fields):
+            continue
+        return index.document["name"]
+    return None
+
+def static_check() -> int:
+    failures = 0
+    for collection, query, sort in QUERIES:
+        index = covering_index(collection, query, sort)
+        failures += index is None
+        print(f"{'ok  ' if index else 'FAIL'} {collection:<14} {str(query):<70} sort={sort}  [{index or 'no index'}]")
+    print(f"\n{failures} of {len(QUERIES)} queries have no index in INDEXES that serves them.")
+    return 1 if failures else 0
+
+async def seed(db, users: int):
+    now = datetime.utcnow()
+    for i in range(users):
+        email = f"user{i}@example.com"
+        await db.users.insert_one({"email": email, "hashed_password": "x"})
+        await db.user_profiles.insert_one({"email": email, "facts": [{"key": "name", "value": f"User {i}"}]})
+        await db.tasks.insert_many([
+            {"email": email, "content": f"task {n}", "status": random.choice(["pending", "done"]), "created_at": now - timedelta(minutes=n)}
+            for n in range(20)
+        ])
+        await db.chat_logs.insert_many([
+            {"email": email, "sender": "user" if n % 2 == 0 else "assistant", "text": f"message {n}", "timestamp": now - timedelta(seconds=n)}
+            for n in range(50)
+        ])
+
+async def main(database_url: str, users: int, create_indexes: bool) -> int:
+    client = AsyncIOMotorClient(database_url)
+    db_name = f"query_plans_{os.getpid()}"
+    db = client[db_name]
+    try:
+        await seed(db, users)
+        if create_indexes:
+            for collection_name, indexes in INDEXES.items():
+                await db[collection_name].create_indexes(indexes)
+        failures = 0
+        for collection, query, sort in QUERIES:
+            cursor = db[collection].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            plan = await cursor.explain()
+            problems = query_audit.find_problems(plan)
+            failures += bool(problems)
+            stages = ", ".join(sorted(query_audit.plan_stages(plan)))
+            print(f"{'FAIL' if problems else 'ok  '} {collection:<14} {str(query):<70} sort={sort}  [{stages}]")
+        print(f"\n{failures} of {len(QUERIES)} queries need a collection scan or an in-memory sort.")
+        return 1 if failures else 0
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="mongodb://localhost:27017")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--no-indexes", action="store_true")
+    parser.add_argument("--static", action="store_true", help="Check the query shapes against INDEXES without a database.")
+    args = parser.parse_args()
+    if args.static:
+        raise SystemExit(static_check())
+    raise SystemExit(asyncio.run(main(args.database_url, args.users, not args.no_indexes)))
@@ -0,0 +1,163 @@
+# backend/benchmarks/single_flight.py
+
+"""
+Measures how many provider calls single-flight coalescing saves when identical prompts arrive
+together, as in a burst of users sending the same message or clients retrying.
+
+  in-process      --callers concurrent calls spread over --unique prompts, in one worker
+  retries         the same prompts again, shortly after the first results came back; their
+                  results are marked uncacheable (like create_task NLU results), so only the
+                  coalescing window can answer them
+  across workers  --workers processes, each sending the same burst at the same moment, sharing a
+                  Redis server (--redis-url, or fakeredis over TCP)
+
+Each scenario runs with coalescing off and on. The LLM is a stub that answers after --llm-ms and
+counts its calls. The script reports provider calls, caller latency and the coalescing stats, and
+checks that every caller got the answer to its own prompt. fakeredis over TCP takes ~40ms per
+round trip, so coalesced callers in other workers look slower than against a real Redis.
+
+Run from the backend directory:
+    python -m benchmarks.single_flight --callers 200 --unique 5 --workers 4 --llm-ms 300
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import threading
+import time
+
+# Dummy settings so the app modules import without a .env file.
+for _name, _value in {
+    "DATABASE_URL": "mongodb://localhost:27017", "SECRET_KEY": "bench", "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "GEMINI_API_KEYS": "bench-key", "COHERE_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "MAIL_PORT": "465", "MAIL_SERVER": "localhost", "MAIL_STARTTLS": "false", "MAIL_SSL_TLS": "true",
+    "LOG_LEVEL": "ERROR",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import fakeredis
+from app.config import settings
+from app.services import ai_service, redis_cache, single_flight
+
+def _stub_llm(latency: float, calls):
+    async def _call(prompt: str) -> str:
+        with calls.get_lock():
+            calls.value += 1
+        await asyncio.sleep(latency)
+        return f"answer to {prompt}"
+    return _call
+
+def _reset(enabled: bool):
+    settings.SINGLE_FLIGHT_ENABLED = enabled
+    single_flight._recent.clear()
+    single_flight.stats.update(dict.fromkeys(single_flight.stats, 0))
+
+async def _burst(callers: int, unique: int, cacheable: bool = True) -> tuple:
+    """Sends `callers` concurrent calls over `unique` prompts; returns (latencies, wrong answers)."""
+    async def one(i: int):
+        prompt = f"what is the weather like today #{i % unique}"
+        start = time.perf_counter()
+        response = await ai_service.generate_ai_response(prompt, should_cache=None if cacheable else (lambda response: False))
+        return time.perf_counter() - start, response != f"answer to {prompt}"
+    results = await asyncio.gather(*(one(i) for i in range(callers)))
+    return [latency for latency, _ in results], sum(wrong for _, wrong in results)
+
+def _report(label: str, calls: int, latencies: list, wrong: int, stats: dict = None):
+    latencies = sorted(latencies)
+    print(f"{label:<26} {calls:>5} provider calls for {len(latencies):>5} callers  "
+          f"p50 {statistics.median(latencies) * 1000:6.0f}ms  p99 {latencies[int(0.99 * (len(latencies) - 1))] * 1000:6.0f}ms"
+          + (f"  wrong {wrong}" if wrong else "") + (f"  {stats}" if stats else ""))
+
+async def in_process(callers: int, unique: int, latency: float) -> bool:
+    calls = multiprocessing.Value("i", 0)
+    ai_service._try_gemini = _stub_llm(latency, calls)
+    # The response cache would answer the retries on its own; the window is what is measured here.
+    settings.RESPONSE_CACHE_ENABLED = False
+    settings.SINGLE_FLIGHT_DISTRIBUTED = False
+    ok = True
+    for enabled in (False, True):
+        _reset(enabled)
+        calls.value = 0
+        latencies, wrong = await _burst(callers, unique)
+        _report(f"in-process, coalescing {'on' if enabled else 'off'}", calls.value, latencies, wrong, single_flight.get_stats() if enabled else None)
+        ok &= wrong == 0 and (not enabled or calls.value == unique)
+
+        calls.value = 0
+        await asyncio.sleep(min(settings.SINGLE_FLIGHT_WINDOW_SECONDS / 2, 0.5))
+        latencies, wrong = await _burst(unique * 2, unique, cacheable=False)
+        _report(f"retries, coalescing {'on' if enabled else 'off'}", calls.value, latencies, wrong, single_flight.get_stats() if enabled else None)
+        ok &= wrong == 0 and (not enabled or calls.value == 0)
+    return ok
+
+async def _release_without_lua(client, lock_key: str, token: str):
+    # fakeredis's TCP server cannot run Lua scripts, so the stand-in releases the lock in two steps.
+    if await client.get(lock_key) == token:
+        await client.delete(lock_key)
+
+def _worker(redis_url: str, lua: bool, enabled: bool, callers: int, unique: int, latency: float, calls, start_at: float, results):
+    async def run():
+        redis_cache.redis_client = redis_cache.redis.Redis.from_url(redis_url, decode_responses=True)
+        if not lua:
+            single_flight._release = _release_without_lua
+        ai_service._try_gemini = _stub_llm(latency, calls)
+        settings.RESPONSE_CACHE_ENABLED = False
+        settings.SINGLE_FLIGHT_DISTRIBUTED = True
+        _reset(enabled)
+        await asyncio.sleep(max(start_at - time.time(), 0))
+        latencies, wrong = await _burst(callers, unique)
+        results.put((latencies, wrong, single_flight.get_stats()))
+        await redis_cache.redis_client.aclose()
+    asyncio.run(run())
+
+def across_workers(workers: int, callers: int, unique: int, latency: float, redis_url: str) -> bool:
+    server = None
+    if not redis_url:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        server = fakeredis.TcpFakeServer(("127.0.0.1", port), server_type="redis")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        redis_url = f"redis://127.0.0.1:{port}/0"
+    context = multiprocessing.get_context("spawn")
+    ok = True
+    for enabled in (False, True):
+        calls, results = context.Value("i", 0), context.Queue()
+        # Every worker starts its burst at the same moment, after all of them have imported the app.
+        start_at = time.time() + 5
+        processes = [context.Process(target=_worker, args=(redis_url, server is None, enabled, callers // workers, unique, latency, calls, start_at, results))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        outcomes = [results.get(timeout=60) for _ in processes]
+        for process in processes:
+            process.join()
+        latencies = [latency for outcome in outcomes for latency in outcome[0]]
+        wrong = sum(outcome[1] for outcome in outcomes)
+        remote = sum(outcome[2]["remote_hits"] for outcome in outcomes)
+        _report(f"{workers} workers, coalescing {'on' if enabled else 'off'}", calls.value, latencies, wrong,
+                {"remote_hits": remote} if enabled else None)
+        ok &= wrong == 0 and (not enabled or calls.value == unique)
+    if server is not None:
+        server.shutdown()
+    return ok
+
+def main(callers: int, unique: int, workers: int, latency: float, redis_url: str) -> int:
+    ok = asyncio.run(in_process(callers, unique, latency))
+    ok &= across_workers(workers, callers, unique, latency, redis_url)
+    print("check:", "ok" if ok else "FAILED")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, default=200)
+    parser.add_argument("--unique", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--llm-ms", type=float, default=300.0)
+    parser.add_argument("--redis-url", help="A real Redis for the across-workers runs; its keys are left to expire.")
+    args = parser.parse_args()
+    raise SystemExit(main(args.callers, args.unique, args.workers, args.llm_ms / 1000, args.redis_url))
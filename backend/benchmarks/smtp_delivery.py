@@ -0,0 +1,149 @@
+# backend/benchmarks/smtp_delivery.py
+
+"""
+Measures reminder email throughput against a local stand-in SMTP server (aiosmtpd) and checks the
+pooled session's recovery:
+  per-email connect   the previous send_reminder_email: connect, log in, send, quit for each email
+  pooled              send_reminder_email over the worker's shared SMTP session
+  batched             send_reminder_emails with per-domain throttling, over the same session
+The stand-in adds --handshake-ms to every new connection, standing in for the TCP + TLS handshake
+and AUTH exchange of a real provider. After the runs the server is restarted, which drops the
+session, and the script checks that the next batch still gets through (NOOP check, reconnect).
+It also checks that the throttle spaces emails to one domain without holding up other domains.
+
+Requires aiosmtpd (pip install aiosmtpd). Run from the backend directory:
+    python -m benchmarks.smtp_delivery --emails 200 --handshake-ms 50
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import socket
+import time
+from collections import defaultdict
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+# Dummy settings so the app modules import without a .env file.
+for _name, _value in {
+    "DATABASE_URL": "mongodb://localhost:27017", "SECRET_KEY": "bench", "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "GEMINI_API_KEYS": "bench-key", "COHERE_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "maya@example.com",
+}.items():
+    os.environ.setdefault(_name, _value)
+# Mail always goes to the stand-in server.
+os.environ.update({"MAIL_SERVER": "127.0.0.1", "MAIL_PORT": str(_free_port()), "MAIL_STARTTLS": "false", "MAIL_SSL_TLS": "false"})
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+from app.celery_worker import _build_reminder_message, send_reminder_email, send_reminder_emails
+from app.config import settings
+from app.services import smtp_pool
+
+class StandInHandler:
+    """Accepts every message and records when it arrived; every new session costs `handshake` seconds."""
+    def __init__(self, handshake: float):
+        self.handshake = handshake
+        self.received = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.handshake)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.append((time.monotonic(), envelope.rcpt_tos[0]))
+        return "250 OK"
+
+class RecordingThrottle(smtp_pool.DomainThrottle):
+    """A DomainThrottle that records when it releases each email, per domain."""
+    releases = defaultdict(list)
+
+    def drain(self, items):
+        for domain, item in super().drain(items):
+            self.releases[domain].append(self.clock())
+            yield domain, item
+
+def _start_server(handler: StandInHandler) -> Controller:
+    controller = Controller(
+        handler, hostname=settings.MAIL_SERVER, port=settings.MAIL_PORT,
+        authenticator=lambda *args: AuthResult(success=True), auth_require_tls=False)
+    controller.start()
+    return controller
+
+def _per_email_connect(recipient: str, content: str):
+    session = smtp_pool.from_settings()
+    try:
+        session.send(_build_reminder_message(recipient, content))
+    finally:
+        session.close()
+
+def _measure(label: str, handler: StandInHandler, run, emails: int) -> float:
+    before = len(handler.received)
+    start = time.perf_counter()
+    # The tasks log every email; keep the report readable.
+    with contextlib.redirect_stdout(io.StringIO()):
+        run()
+    elapsed = time.perf_counter() - start
+    delivered = len(handler.received) - before
+    print(f"{label:<19} {delivered:>5}/{emails} delivered in {elapsed:6.2f}s  {delivered / elapsed:8.1f} emails/s")
+    return delivered / elapsed
+
+def main(emails: int, handshake: float, domains: int) -> int:
+    logging.getLogger("mail.log").setLevel(logging.ERROR)
+    handler = StandInHandler(handshake)
+    controller = _start_server(handler)
+    # Unthrottled for the throughput runs; the throttle is checked separately below.
+    settings.MAIL_DOMAIN_MAX_PER_SECOND = 0
+    reminders = [[f"user{i}@domain{i % domains}.example", f"reminder {i}"] for i in range(emails)]
+    ok = True
+    try:
+        before = _measure("per-email connect", handler, lambda: [_per_email_connect(*r) for r in reminders], emails)
+        pooled = _measure("pooled", handler, lambda: [send_reminder_email.apply(args=r) for r in reminders], emails)
+        batched = _measure("batched", handler, lambda: send_reminder_emails.apply(args=[reminders]), emails)
+        print(f"speed-up: pooled x{pooled / before:.1f}, batched x{batched / before:.1f}; session stats {smtp_pool.get_session().stats}")
+
+        # The server goes away and comes back: the idle session must be noticed and replaced.
+        send_reminder_emails.apply(args=[reminders[:1]])
+        controller.stop()
+        controller = _start_server(handler)
+        smtp_pool.get_session().idle_check_seconds = 0
+        count = len(handler.received)
+        send_reminder_emails.apply(args=[reminders[:10]])
+        recovered = len(handler.received) - count == 10
+        ok &= recovered
+        print(f"reconnect: {'ok' if recovered else 'FAILED'} after a server restart; session stats {smtp_pool.get_session().stats}")
+
+        # Two domains at 20 emails/s each: 20 emails per domain should take about one second, not two.
+        # Gaps are measured where the throttle releases each email; arrival times at the server also
+        # carry the send's own jitter, which is not the throttle's doing. 1ms covers clock reads.
+        settings.MAIL_DOMAIN_MAX_PER_SECOND = 20
+        smtp_pool.DomainThrottle = RecordingThrottle
+        start = time.perf_counter()
+        send_reminder_emails.apply(args=[[[f"u{i}@{'a' if i % 2 else 'b'}.example", "x"] for i in range(40)]])
+        elapsed = time.perf_counter() - start
+        releases = RecordingThrottle.releases
+        closest = min(later - earlier for times in releases.values() for earlier, later in zip(times, times[1:]))
+        throttled = closest >= 1 / settings.MAIL_DOMAIN_MAX_PER_SECOND - 0.001 and elapsed < 1.5 and sum(map(len, releases.values())) == 40
+        ok &= throttled
+        print(f"throttle: {'ok' if throttled else 'WRONG'}: 40 emails to 2 domains in {elapsed:.2f}s, "
+              f"closest same-domain gap {closest * 1000:.0f}ms")
+    finally:
+        smtp_pool.close_session()
+        controller.stop()
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--handshake-ms", type=float, default=50.0)
+    parser.add_argument("--domains", type=int, default=5)
+    args = parser.parse_args()
+    raise SystemExit(main(args.emails, args.handshake_ms / 1000, args.domains))
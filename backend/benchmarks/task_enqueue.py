@@ -0,0 +1,106 @@
+# backend/benchmarks/task_enqueue.py
+
+"""
+Measures what publishing Celery tasks costs the event loop.
+Chat turns that each queue a task run concurrently, once with send_task called inline on the
+event loop (the previous chat handler) and once through task_queue.enqueuer. The broker is Kombu's
+in-memory transport, and every publish is charged --broker-ms of blocking time, which stands in
+for the network round trip to Redis. The script reports the time each turn spends queueing its
+task, the worst event-loop stall seen by a 1ms ticker, and how many broker connection checkouts
+were needed. It also checks that every task reached the broker.
+
+Run from the backend directory:
+    python -m benchmarks.task_enqueue --turns 2000 --concurrency 100 --broker-ms 1
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+# Dummy settings so the app modules import without a .env file; the broker lives in memory.
+for _name, _value in {
+    "DATABASE_URL": "mongodb://localhost:27017", "SECRET_KEY": "bench", "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "GEMINI_API_KEYS": "bench-key", "COHERE_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "MAIL_PORT": "465", "MAIL_SERVER": "localhost", "MAIL_STARTTLS": "false", "MAIL_SSL_TLS": "true",
+    "CELERY_BROKER_URL": "memory://", "CELERY_RESULT_BACKEND": "cache+memory://",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import kombu
+from app.celery_worker import celery_app
+from app.services import task_queue
+
+counters = {"publishes": 0, "checkouts": 0}
+
+def _instrument(broker_latency: float):
+    publish = kombu.Producer.publish
+    def slow_publish(self, *args, **kwargs):
+        counters["publishes"] += 1
+        time.sleep(broker_latency)
+        return publish(self, *args, **kwargs)
+    kombu.Producer.publish = slow_publish
+
+    producer_or_acquire = celery_app.producer_or_acquire
+    def counted_producer_or_acquire(producer=None):
+        if producer is None:
+            counters["checkouts"] += 1
+        return producer_or_acquire(producer)
+    celery_app.producer_or_acquire = counted_producer_or_acquire
+
+async def inline_enqueue(user: str):
+    celery_app.send_task("refresh_conversation_summary", args=[user])
+
+async def queued_enqueue(user: str):
+    await task_queue.enqueuer.enqueue("refresh_conversation_summary", [user])
+
+async def _ticker(stalls: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        stalls.append(time.perf_counter() - start - 0.001)
+
+async def _run(label: str, enqueue, turns: int, concurrency: int):
+    counters.update(publishes=0, checkouts=0)
+    semaphore = asyncio.Semaphore(concurrency)
+    durations, stalls, stop = [], [], asyncio.Event()
+
+    async def turn(i: int):
+        async with semaphore:
+            # The rest of the turn (LLM call, persistence) is awaited I/O.
+            await asyncio.sleep(0.005)
+            start = time.perf_counter()
+            await enqueue(f"user{i}@example.com")
+            durations.append(time.perf_counter() - start)
+
+    ticker = asyncio.create_task(_ticker(stalls, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(turn(i) for i in range(turns)))
+    await task_queue.enqueuer.close()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    durations.sort()
+    print(f"{label:<8} enqueue mean {statistics.mean(durations) * 1000:7.3f}ms  p99 {durations[int(0.99 * (len(durations) - 1))] * 1000:7.3f}ms  "
+          f"loop stall max {max(stalls) * 1000:6.1f}ms  total {elapsed:5.2f}s  "
+          f"{counters['publishes']} published over {counters['checkouts']} connection checkouts")
+    return counters["publishes"] == turns
+
+async def main(turns: int, concurrency: int, broker_latency: float) -> int:
+    _instrument(broker_latency)
+    ok = await _run("inline", inline_enqueue, turns, concurrency)
+    task_queue.enqueuer.start()
+    ok &= await _run("queued", queued_enqueue, turns, concurrency)
+    print(f"enqueuer stats: {task_queue.enqueuer.stats}")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--broker-ms", type=float, default=1.0)
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(main(args.turns, args.concurrency, args.broker_ms / 1000)))
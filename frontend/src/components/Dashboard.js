@@ -94,6 +94,10 @@ const Dashboard = () => {
     const [taskToEdit, setTaskToEdit] = useState(null);
 
     const chatWindowRef = useRef(null);
+    const streamControllerRef = useRef(null);
+
+    // Abort an in-flight reply when leaving the page so the server stops generating it.
+    useEffect(() => () => streamControllerRef.current && streamControllerRef.current.abort(), []);
 
     const loadInitialData = useCallback(async () => {
         setIsPageLoading(true);
@@ -153,16 +157,23 @@ const Dashboard = () => {
         const currentInput = input;
         setInput('');
         setIsLoading(true);
+        // Append an empty assistant message and grow it as tokens stream in.
+        const appendToReply = (token) => setMessages(prev => {
+            const last = prev[prev.length - 1];
+            return [...prev.slice(0, -1), { ...last, text: last.text + token }];
+        });
+        setMessages(prev => [...prev, { sender: 'assistant', text: '' }]);
+        const controller = new AbortController();
+        streamControllerRef.current = controller;
         try {
-            const response = await chatService.sendMessage(currentInput);
-            const assistantMessage = { sender: 'assistant', text: response.data.response };
-            setMessages(prev => [...prev, assistantMessage]);
+            await chatService.streamMessage(currentInput, appendToReply, controller.signal);
             await fetchAllTasks();
         } catch (error) {
+            if (error.name === 'AbortError') return;
             console.error("Error sending message:", error);
-            const errorMessage = { sender: 'assistant', text: 'Sorry, I encountered an error. Please try again.' };
-            setMessages(prev => [...prev, errorMessage]);
+            setMessages(prev => [...prev.slice(0, -1), { sender: 'assistant', text: 'Sorry, I encountered an error. Please try again.' }]);
         } finally {
+            streamControllerRef.current = null;
             setIsLoading(false);
         }
     };
@@ -26,4 +26,24 @@ apiClient.interceptors.request.use(
   }
 );
 
+// When the access token has expired, renew it with the refresh token and retry the request once
+apiClient.interceptors.response.use(
+  (response) => response,
+  async (error) => {
+    const config = error.config;
+    const user = authService.getCurrentUser();
+    if (error.response && error.response.status === 401 && !config._retried && user && user.refresh_token) {
+      config._retried = true;
+      try {
+        const tokens = await authService.refresh();
+        config.headers['Authorization'] = 'Bearer ' + tokens.access_token;
+        return apiClient(config);
+      } catch (refreshError) {
+        return Promise.reject(error);
+      }
+    }
+    return Promise.reject(error);
+  }
+);
+
 export default apiClient;
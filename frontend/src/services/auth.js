@@ -41,6 +41,28 @@ const authService = {
     });
   },
 
+  /**
+   * Exchanges the stored refresh token for new tokens and stores them.
+   * Each refresh token works once, so concurrent callers share one request.
+   * @returns {Promise<object>} - The new token object.
+   */
+  refresh() {
+    if (!this.refreshing) {
+      const user = this.getCurrentUser();
+      this.refreshing = axios.post(API_URL + 'refresh', {
+        refresh_token: user && user.refresh_token,
+      })
+        .then((response) => {
+          this.storeTokens(response.data);
+          return response.data;
+        })
+        .finally(() => {
+          this.refreshing = null;
+        });
+    }
+    return this.refreshing;
+  },
+
   /**
    * Stores the user's tokens in localStorage.
    * @param {object} tokens - The token object from the API response.
@@ -58,9 +80,16 @@ const authService = {
   },
 
   /**
-   * Removes the user's tokens from localStorage.
+   * Revokes the access token on the server and removes the user's tokens from localStorage.
+   * The local logout does not wait for the server, so it also works offline.
    */
   logout() {
+    const user = this.getCurrentUser();
+    if (user && user.access_token) {
+      axios.post(API_URL + 'logout', null, {
+        headers: { Authorization: 'Bearer ' + user.access_token },
+      }).catch(() => {});
+    }
     localStorage.removeItem('user');
   },
 };
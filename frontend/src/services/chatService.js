@@ -1,12 +1,76 @@
 // frontend/src/services/chatService.js
 
 import apiClient from './api';
+import authService from './auth';
 
 const chatService = {
   sendMessage(message) {
     return apiClient.post('/chat/', { message });
   },
 
+  /**
+   * Sends a message to the streaming endpoint and reports the reply token by token.
+   * Uses fetch because Axios cannot read a response body incrementally in the browser.
+   * Aborting the signal closes the connection, which also stops generation on the server.
+   * @param {string} message - The user's message.
+   * @param {function} onToken - Called with each text chunk as it arrives.
+   * @param {AbortSignal} [signal] - Optional signal to cancel the stream.
+   * @returns {Promise<string>} - The complete response once the stream ends.
+   */
+  async streamMessage(message, onToken, signal) {
+    const send = (accessToken) => fetch(`${apiClient.defaults.baseURL}/chat/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...(accessToken ? { Authorization: 'Bearer ' + accessToken } : {}),
+      },
+      body: JSON.stringify({ message }),
+      signal,
+    });
+    const user = authService.getCurrentUser();
+    let response = await send(user && user.access_token);
+    // Like the Axios interceptor in api.js: renew an expired access token once and retry.
+    // authService.refresh() shares one in-flight request with any Axios calls refreshing at the same time.
+    if (response.status === 401 && user && user.refresh_token) {
+      let tokens = null;
+      try {
+        tokens = await authService.refresh();
+      } catch (refreshError) {
+        // Fall through and report the original 401.
+      }
+      if (tokens) {
+        response = await send(tokens.access_token);
+      }
+    }
+    if (!response.ok) {
+      throw new Error(`Streaming request failed with status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let fullResponse = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      // Server-Sent Events are separated by a blank line.
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const event of events) {
+        const dataLine = event.split('\n').find((line) => line.startsWith('data: '));
+        if (!dataLine) continue;
+        const payload = JSON.parse(dataLine.slice('data: '.length));
+        if (event.startsWith('event: done')) {
+          fullResponse = payload.response;
+        } else {
+          onToken(payload.token);
+        }
+      }
+    }
+    return fullResponse;
+  },
+
   getHistory() {
     return apiClient.get('/chat/history');
   },